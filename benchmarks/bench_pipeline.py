@@ -0,0 +1,331 @@
+# bench_pipeline.py
+"""
+Benchmarks the Nearfield generation pipeline.
+
+Times every stage function of `src/image_generator.py`, the full
+`generate_nearfield_image_impl` for typical and extreme parameter sets, the
+startup cost of a run (interpreter plus imports, and a warmed worker pool)
+and the end-to-end throughput of `main.main()` for several worker counts.
+Results are written as JSON; `--compare` flags regressions against a stored
+baseline and exits with status 1 if any case got slower than the threshold,
+or if a startup case exceeds `--startup-budget`.
+
+Usage:
+    python -m benchmarks.bench_pipeline --sizes 256 1024 --output bench.json
+    python -m benchmarks.bench_pipeline --compare baseline.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from src import image_generator as ig  # noqa: E402
+
+# Parameter sets covering the typical case and the extremes of the ranges
+TYPICAL = {
+    "major_axis": 350, "minor_axis": 320, "angle_rotation": 30,
+    "erf_rolloff": 0.05, "gaussian_noise": 0.04,
+    "asymmetry_x": 0.2, "asymmetry_y": -0.1,
+    "perlin_scale": 50, "perlin_octaves": 3, "perlin_persistence": 0.5,
+    "perlin_lacunarity": 2.0, "perlin_amplitude": 0.5,
+}
+EXTREMES = {
+    "typical": {},
+    # Most octaves at the smallest scale: the costliest Perlin noise
+    "max_octaves_min_scale": {"perlin_octaves": 5, "perlin_scale": 10,
+                              "perlin_lacunarity": 3.0},
+    "min_octaves_max_scale": {"perlin_octaves": 1, "perlin_scale": 100},
+    # Softest roll-off: the widest erf band around the edge
+    "min_rolloff": {"erf_rolloff": 0.01},
+}
+
+
+def scaled_params(overrides, canvas_size):
+    """
+    Returns a parameter set with the ellipse scaled to the canvas, so that
+    every size renders the same relative geometry as the 1024 default.
+    """
+    params = dict(TYPICAL, **overrides)
+    factor = min(canvas_size) / 1024
+    params["major_axis"] *= factor
+    params["minor_axis"] *= factor
+    return params
+
+
+def time_call(function, repeat):
+    """
+    Calls `function` `repeat` times (after one warm-up call).
+
+    Returns:
+    - dict: min, median and mean wall time in seconds.
+    """
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times),
+            "mean": statistics.fmean(times), "repeat": repeat}
+
+
+def stage_cases(size):
+    """
+    Yields (name, callable) pairs for the stage functions at one size.
+    """
+    canvas_size = (size, size)
+    params = scaled_params({}, canvas_size)
+    geometry = (params["major_axis"], params["minor_axis"],
+                params["angle_rotation"])
+    mask = ig.create_elliptical_mask(canvas_size, *geometry)
+    image = np.full((size, size), 0.5)
+
+    yield "create_elliptical_mask", \
+        lambda: ig.create_elliptical_mask(canvas_size, *geometry)
+    yield "elliptical_signed_distance", \
+        lambda: ig.elliptical_signed_distance(canvas_size, *geometry)
+    yield "apply_erf_rolloff_edt", \
+        lambda: ig.apply_erf_rolloff(mask, params["erf_rolloff"])
+    yield "create_elliptical_rolloff_analytic", \
+        lambda: ig.create_elliptical_rolloff(
+            canvas_size, *geometry, params["erf_rolloff"], band=4.0)
+    yield "apply_asymmetry", \
+        lambda: ig.apply_asymmetry(image, 0.1, -0.1)
+    yield "apply_gaussian_noise", \
+        lambda: ig.apply_gaussian_noise(image.copy(), 0.04)
+    for name, overrides in EXTREMES.items():
+        p = scaled_params(overrides, canvas_size)
+        yield f"generate_perlin_noise[{name}]", \
+            lambda p=p: ig.generate_perlin_noise(
+                canvas_size, p["perlin_scale"], p["perlin_octaves"],
+                p["perlin_persistence"], p["perlin_lacunarity"],
+                p["perlin_amplitude"])
+        yield f"generate_nearfield_image_impl[{name}]", \
+            lambda p=p: ig.generate_nearfield_image_impl(
+                p, canvas_size, **ig.render_options())
+    yield "generate_nearfield_image_impl[fused_float32]", \
+        lambda: ig.generate_nearfield_image_impl(
+            params, canvas_size, **dict(ig.render_options(),
+                                        compute_dtype="float32", fused=True))
+    if size <= 256:
+        # The per-pixel reference path is far too slow for larger canvases
+        yield "generate_perlin_noise[pnoise2]", \
+            lambda: ig.generate_perlin_noise(
+                canvas_size, params["perlin_scale"], params["perlin_octaves"],
+                params["perlin_persistence"], params["perlin_lacunarity"],
+                params["perlin_amplitude"], method="pnoise2")
+
+
+def _worker_pid(_):
+    # No-op task; the pool has started once every worker has answered
+    return os.getpid()
+
+
+def time_import(module, repeat):
+    """
+    Times a fresh interpreter importing `module` (None: just starting up).
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-c",
+               f"import {module}" if module else "pass"]
+    return time_call(lambda: subprocess.run(command, cwd=root, check=True),
+                     repeat)
+
+
+def time_pool_startup(workers, start_method, repeat):
+    """
+    Times starting a pool the way `main.main()` does (with the worker
+    initializer) until every worker has answered a task.
+    """
+    import main as main_module
+
+    context = multiprocessing.get_context(start_method)
+    snapshot = main_module._config_snapshot()
+
+    def start_pool():
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=main_module.init_worker,
+                                 initargs=(snapshot,)) as executor:
+            pids = set()
+            while len(pids) < workers:
+                pids.update(executor.map(_worker_pid, range(4 * workers)))
+    return time_call(start_pool, repeat)
+
+
+def startup_cases(args):
+    """
+    Yields (name, callable) pairs for the startup measurements.
+    """
+    yield "startup[interpreter]", lambda: time_import(None, args.repeat)
+    yield "startup[import_main]", lambda: time_import("main", args.repeat)
+    for start_method in args.start_methods:
+        for workers in args.workers:
+            yield f"startup[pool_{start_method}]@{workers}w", \
+                lambda m=start_method, w=workers: time_pool_startup(
+                    w, m, args.repeat)
+
+
+def bench_main(size, workers, num_images, write_mode="worker"):
+    """
+    Runs `main.main()` in a scratch directory and returns images/second.
+    """
+    import main as main_module
+
+    saved = dict(config)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        try:
+            os.chdir(folder)
+            config.update(canvas_size=(size, size), num_images=num_images,
+                          num_workers=workers, write_mode=write_mode)
+            start = time.perf_counter()
+            main_module.main([])
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+            config.clear()
+            config.update(saved)
+    return {"seconds": elapsed, "images_per_second": num_images / elapsed}
+
+
+def run(args):
+    results = {}
+    for size in args.sizes:
+        for name, function in stage_cases(size):
+            key = f"{name}@{size}"
+            results[key] = time_call(function, args.repeat)
+            print(f"{key:60s} {results[key]['median'] * 1e3:10.2f} ms",
+                  flush=True)
+
+    over_budget = []
+    if not args.skip_startup:
+        for key, measure in startup_cases(args):
+            results[key] = measure()
+            median = results[key]["median"]
+            print(f"{key:60s} {median * 1e3:10.2f} ms", flush=True)
+            if median > args.startup_budget:
+                over_budget.append(f"{key}: {median:.3f} s > "
+                                   f"{args.startup_budget:.3f} s budget")
+
+    if not args.skip_main:
+        for size in args.main_sizes:
+            for workers in args.workers:
+                for write_mode in args.write_modes:
+                    # The default mode keeps the keys of older baselines
+                    key = f"main@{size}x{workers}w" if write_mode == "worker" \
+                        else f"main[{write_mode}]@{size}x{workers}w"
+                    results[key] = bench_main(size, workers, args.num_images,
+                                              write_mode)
+                    print(f"{key:60s} "
+                          f"{results[key]['images_per_second']:10.2f} "
+                          f"images/s", flush=True)
+
+    return {
+        "meta": {"python": platform.python_version(),
+                 "numpy": np.__version__, "machine": platform.machine(),
+                 "cpu_count": os.cpu_count(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+        "over_budget": over_budget,
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Compares two result files case by case.
+
+    Returns:
+    - list of str: Descriptions of the cases slower than baseline by more
+    than `threshold` (a fraction, e.g. 0.1 for 10%).
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        reference = baseline["results"].get(key)
+        if reference is None:
+            continue
+        if "median" in result:
+            ratio = result["median"] / reference["median"]
+        else:
+            ratio = reference["images_per_second"] / \
+                result["images_per_second"]
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"{key:60s} {ratio:6.2f}x time  {status}")
+        if status != "ok":
+            regressions.append(f"{key}: {ratio:.2f}x slower")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[256, 512, 1024, 2048, 4096],
+                        help="Canvas sizes for the stage benchmarks.")
+    parser.add_argument("--main-sizes", type=int, nargs="+", default=[256],
+                        help="Canvas sizes for the end-to-end runs.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4],
+                        help="Worker counts for the end-to-end runs.")
+    parser.add_argument("--write-modes", nargs="+", default=["worker"],
+                        choices=["worker", "parent", "pipelined"],
+                        help="Write modes for the end-to-end runs.")
+    parser.add_argument("--num-images", type=int, default=32,
+                        help="Images per end-to-end run.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timed repetitions per stage case.")
+    parser.add_argument("--skip-main", action="store_true",
+                        help="Skip the end-to-end runs.")
+    parser.add_argument("--skip-startup", action="store_true",
+                        help="Skip the startup measurements.")
+    parser.add_argument("--start-methods", nargs="+",
+                        default=[multiprocessing.get_start_method()],
+                        choices=multiprocessing.get_all_start_methods(),
+                        help="Process start methods for the pool startup "
+                             "measurements (default: the platform's).")
+    parser.add_argument("--startup-budget", type=float, default=1.0,
+                        help="Maximum median seconds of each startup case "
+                             "(default 1.0).")
+    parser.add_argument("--output", default="bench_results.json",
+                        help="Where to write the JSON results.")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Baseline JSON to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed slowdown before flagging, as a "
+                             "fraction (default 0.15).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    current = run(args)
+    with open(args.output, "w") as file:
+        json.dump(current, file, indent=2)
+    print(f"Results written to {args.output}")
+    failed = False
+    if current["over_budget"]:
+        print("Over the startup budget:\n  "
+              + "\n  ".join(current["over_budget"]))
+        failed = True
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
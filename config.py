@@ -6,8 +6,83 @@ config = {
     "canvas_size": (1024, 1024),   # Size of the canvas (width, height) for
     # all images
     "num_images": 100,            # Number of images to generate
-    "sampling_method": "LHS",    # Sampling method: "LHS" or "random"
+    "num_workers": None,         # Worker processes (None uses CPU count)
+    "batch_size": 1,             # Most images rendered per worker task;
+    # values above 1 use the batched (N, H, W) pipeline
+    "schedule": "cost",          # "cost": most expensive images first (by
+    # octaves and roll-off band), in chunks that shrink towards the end of
+    # the run; "index": runs of batch_size consecutive images in order
+    "max_in_flight": None,       # Tasks pending in the pool at once in
+    # "worker" write mode (None: 2 x workers)
+    "max_tasks_per_child": None,  # Replace each worker after this many tasks
+    # (None: never); needs Python 3.11 and uses "spawn" workers
+    "pyramid_sizes": None,       # Downsampled copies stored with every
+    # image, e.g. [512, 256] (widths) or [(512, 512)]; each must divide the
+    # canvas. Area-averaged from the one full-resolution render
+    "tile_size": None,           # Render each image in tiles of this edge
+    # length (a multiple of 16), in parallel, streamed to tiled TIFFs or the
+    # memmap store; bounds memory for 8k/16k canvases. None renders whole
+    "output_format": "tiff",     # "tiff": one file per image; "memmap":
+    # one (N, H, W) uint16 images.npy store plus parameters_log.npy
+    "tiff_compression": None,    # TIFF codec: None (uncompressed), "zlib",
+    # "lzma", or "zstd"/"lzw" (need the imagecodecs package)
+    "tiff_compression_level": None,  # Codec level (None: codec default)
+    "tiff_predictor": False,     # Horizontal differencing before compressing
+    "tiff_layout": "strip",      # "strip" or "tile" (tiff_tile_size tiles);
+    # tiled rendering always stores its own tiles
+    "tiff_tile_size": 256,       # TIFF tile edge length, a multiple of 16
+    "tiff_rowsperstrip": None,   # Rows per strip (None: tifffile default)
+    "tiff_stack_size": 1,        # Images per multi-page BigTIFF file; above
+    # 1 needs the "parent" or "pipelined" write mode
+    "write_mode": "worker",      # "worker": each worker writes its TIFFs;
+    # "parent": workers render into shared memory and the parent writes;
+    # "pipelined": like "parent", with writes in a thread pool so rendering
+    # and disk I/O overlap
+    "io_workers": 4,             # Concurrent writes in "pipelined" mode
+    "profile": False,            # Record per-stage timings into profile.json
+    "profile_memory": False,     # Also trace peak allocations (slow)
+    "shared_slots": None,        # Shared-memory slots for "parent" and
+    # "pipelined" modes (None uses 2 x CPU count, plus io_workers when
+    # pipelined); bounds the images rendered but not yet written
+    "seed": None,                # Run seed; image i draws its noise from
+    # SeedSequence(seed, spawn_key=(i,)). None picks a fresh seed, which is
+    # recorded in the run manifest either way
+    "sampling_method": "LHS",    # Sampling method: "LHS", "random", "Sobol"
+    # or "Halton" (scipy.stats.qmc low-discrepancy sequences)
+    "parameter_log_format": "csv",  # "csv", "npz" or "parquet" (needs
+    # pandas with pyarrow)
+    "parameter_log_flush": 256,  # Rows buffered per parameter log write
+    "parameter_log_reorder": 256,  # Rows held back waiting for an earlier
+    # image; past this, rows are logged out of index order
     "DC_OFFSET": 0.5,            # Baseline offset to keep values positive
+    "perlin_method": "vectorized",  # "vectorized" (NumPy), "pnoise2"
+    # (per-pixel reference loop) or "bank" (random crops, flips and
+    # rotations of precomputed textures; approximate but much cheaper)
+    "noise_bank": "output/noise_bank.npy",  # Memory-mapped noise bank of
+    # the "bank" method; built on first use, reused while its settings match
+    "noise_bank_bins": {"perlin_scale": 4, "perlin_persistence": 2,
+                        "perlin_lacunarity": 2},  # Bins per noise parameter;
+    # one texture per bin combination and octave count
+    "noise_bank_texture_size": None,  # Texture edge length (None: twice the
+    # canvas edge, shrunk to fit noise_bank_max_bytes)
+    "noise_bank_max_bytes": 1 << 30,  # Cap on the size of the noise bank
+    "rolloff_method": "analytic",  # "analytic" (closed-form ellipse
+    # distance) or "edt" (distance transforms of the rasterised mask)
+    "rolloff_band": 4.0,         # Evaluate erf only where |d * rolloff| < band
+    # (None evaluates the whole canvas)
+    "compute_dtype": "float64",  # Dtype of intermediate canvases: "float64"
+    # or "float32" (half the memory traffic, within a few uint16 counts)
+    "fused": False,              # Run all stages in place in per-worker
+    # scratch buffers (much lower peak memory per worker)
+    "rolloff_cache_bytes": 0,    # Per-worker LRU cache of roll-off masks,
+    # in bytes (0 disables it); cached masks use the quantized geometry below
+    "rolloff_cache_quantization": {"major_axis": 0.5, "minor_axis": 0.5,
+                                   "angle_rotation": 0.1,
+                                   "erf_rolloff": 1e-4},  # Rounding step per
+    # geometry parameter while caching (0 keeps exact values); coarser steps
+    # let more images share a mask
+    "rolloff_cache_store": None,  # Directory masks evicted from the cache
+    # are spilled to, memory-mapped and shared by all pool workers
 
     # Parameter ranges for sampling
     "parameter_ranges": {
@@ -1,72 +1,682 @@
 # main.py
 
+import argparse
+import itertools
+import json
+import multiprocessing
 import os
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+from collections import deque
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                wait, FIRST_COMPLETED)
+from contextlib import nullcontext
+from functools import partial
+from multiprocessing import resource_tracker
 from config import config
-from src.parameter_sampler import get_sampled_parameters
-from src.output_manager import create_output_folder, save_image, log_parameters
-from src.image_generator import generate_nearfield_image
+from src.parameter_sampler import get_sampled_parameter_table, ParameterTable
+from src.output_manager import (create_output_folder, create_image_writer,
+                                ParameterLogger, CompletionLog, RunRecorder,
+                                image_checksum, read_completion_log,
+                                verify_outputs, write_manifest, read_manifest,
+                                write_parameter_table, read_parameter_table,
+                                tiff_options, get_timestamp)
+from src.image_generator import (generate_nearfield_image,
+                                 generate_nearfield_image_impl,
+                                 generate_nearfield_batch,
+                                 generate_nearfield_tile, render_options,
+                                 prepare_worker, pyramid_sizes)
+from src.noise_bank import build_configured_bank
+from src.rolloff_cache import (COUNTERS, rolloff_cache_info,
+                               share_rolloff_counters)
+from src.scheduler import plan_chunks
+from src.seeding import resolve_run_seed, image_rng, tile_rng, sampler_rng
+from src.tiling import tile_windows
+from src.shared_buffers import SharedImagePool, attach_slot
+from src.profiling import make_timer, merge_records, ProfileCollector
 from tqdm import tqdm
 
 
-def generate_and_save_image(params, index, output_folder_path, csv_path):
+def init_worker(config_snapshot, rolloff_counters=None):
     """
-    Generates a Nearfield image and saves it along with its parameters.
+    Initializer of the pool workers. Installs the parent's configuration,
+    which spawned workers would otherwise re-import from `config.py`, and
+    warms the per-process caches once, before the first task.
+
+    Parameters:
+    - config_snapshot (dict): Configuration of the run, see
+    `_config_snapshot`.
+    - rolloff_counters (multiprocessing Array or None): Roll-off cache
+    counters of the run, see `src.rolloff_cache.share_rolloff_counters`.
+    """
+    _restore_config(config_snapshot)
+    if rolloff_counters is not None:
+        share_rolloff_counters(rolloff_counters)
+    prepare_worker(config["canvas_size"], render_options())
+
+
+def _make_worker_timer(images=1):
+    """
+    Returns the stage timer configured for a worker task.
+    """
+    return make_timer(config.get("profile", False), images=images,
+                      trace_memory=config.get("profile_memory", False))
+
+
+def _with_profile(result, timer):
+    """
+    Attaches the timer record to a task result when profiling is enabled.
+    """
+    return (result, timer.record()) if timer.enabled else result
+
+
+def _timed_write(writer, index, image):
+    """
+    Stores one image through `writer`.
+
+    Returns:
+    - tuple: (filename, pixel checksum, seconds spent encoding and writing).
+    """
+    write_start = time.perf_counter()
+    filename = writer.write(index, image)
+    write_seconds = time.perf_counter() - write_start
+    return filename, image_checksum(image), write_seconds
+
+
+def generate_and_save_image(params, index, writer, run_seed):
+    """
+    Generates a Nearfield image and saves it. Its parameters are logged by
+    the parent process.
 
     Parameters:
     - params (dict): Parameter set for the image generation.
-    - index (int): Index of the image (for naming).
-    - output_folder_path (str): Path to the folder where images will be saved.
-    - csv_path (str): Path to the CSV file where parameters will be logged.
+    - index (int): Index of the image (for naming and seeding).
+    - writer (ImageWriter): Output backend the image is saved through.
+    - run_seed (int): Seed of the run the image noise is derived from.
 
     Returns:
-    - str: Filename of the generated image.
+    - tuple: (filename, pixel checksum, write seconds) of the generated
+    image, paired with the stage timings if profiling is enabled.
     """
+    timer = _make_worker_timer()
+
     # Generate the Nearfield image
-    image = generate_nearfield_image(params)
+    image = generate_nearfield_image(params, timer=timer,
+                                     rng=image_rng(run_seed, index))
 
-    # Define the image filename
-    filename = f"nearfield_image_{index + 1:03}.tiff"
+    # Save the image
+    with timer.stage("write"):
+        stored = _timed_write(writer, index, image)
 
-    # Save the image and log parameters
-    save_image(image, filename, output_folder_path)
-    log_parameters(csv_path, filename, params)
+    return _with_profile(stored, timer)
 
-    return filename
 
+def generate_and_save_batch(param_list, indices, writer, run_seed):
+    """
+    Generates a batch of Nearfield images in one call and saves each of them.
+    Their parameters are logged by the parent process.
 
-def main():
-    num_images = config["num_images"]
-    output_folder = "output/images"
+    Parameters:
+    - param_list (list of dicts): Parameter sets of the images.
+    - indices (tuple of int): Indices of the images (for naming and seeding).
+    - writer (ImageWriter): Output backend the images are saved through.
+    - run_seed (int): Seed of the run the image noise is derived from.
 
-    # Step 2: Create the output folder
-    output_folder_path = create_output_folder(output_folder)
-    csv_path = os.path.join(output_folder_path, "parameters_log.csv")
+    Returns:
+    - list of tuples: (filename, pixel checksum, write seconds) of the
+    generated images, paired with the stage timings if profiling is enabled.
+    """
+    timer = _make_worker_timer(images=len(param_list))
+    rngs = [image_rng(run_seed, index) for index in indices]
+    images = generate_nearfield_batch(param_list, config["canvas_size"],
+                                      **render_options(), rng=rngs,
+                                      timer=timer)
 
-    # Step 3: Generate parameter sets for each image
-    parameter_sets = get_sampled_parameters()
+    with timer.stage("write"):
+        stored = [_timed_write(writer, index, image)
+                  for index, image in zip(indices, images)]
 
-    # Step 4: Use ProcessPoolExecutor to parallelize image generation with a
-    # progress bar
-    with ProcessPoolExecutor() as executor, \
-         tqdm(total=num_images, desc="Generating Images",
-              unit="image") as pbar:
-        futures = {
-            executor.submit(generate_and_save_image,
-                            params, i, output_folder_path, csv_path): i
-            for i, params in enumerate(parameter_sets)
-        }
-
-        # Collect results and update progress bar as tasks complete
-        for future in as_completed(futures):
+    return _with_profile(stored, timer)
+
+
+def generate_into_slot(param_list, indices, slot_name, slot_shape, run_seed):
+    """
+    Generates Nearfield images directly into a shared-memory slot, so that
+    the parent can write them without the pixels being pickled.
+
+    Parameters:
+    - param_list (list of dicts): Parameter sets of the images.
+    - indices (tuple of int): Indices of the images (for seeding).
+    - slot_name (str): Name of the shared-memory slot to render into.
+    - slot_shape (tuple): Shape of the slot, (batch_size, width, height).
+    - run_seed (int): Seed of the run the image noise is derived from.
+
+    Returns:
+    - int: Number of images written to the slot, paired with the stage
+    timings if profiling is enabled.
+    """
+    timer = _make_worker_timer(images=len(param_list))
+    images = attach_slot(slot_name, slot_shape)
+    canvas_size = config["canvas_size"]
+    rngs = [image_rng(run_seed, index) for index in indices]
+    if len(param_list) == 1:
+        generate_nearfield_image_impl(param_list[0], canvas_size,
+                                      **render_options(), rng=rngs[0],
+                                      out=images[0], timer=timer)
+    else:
+        generate_nearfield_batch(param_list, canvas_size, **render_options(),
+                                 rng=rngs, out=images[:len(param_list)],
+                                 timer=timer)
+    return _with_profile(len(param_list), timer)
+
+
+def generate_tile(params, index, tile_number, window, run_seed):
+    """
+    Generates one tile of a Nearfield image for the parent to write.
+
+    Parameters:
+    - params (dict): Parameter set for the image generation.
+    - index (int): Index of the image (for seeding).
+    - tile_number (int): Position of the tile (for seeding).
+    - window (tuple): (rows, columns) slices of the tile in the image.
+    - run_seed (int): Seed of the run the tile noise is derived from.
+
+    Returns:
+    - numpy array: uint16 tile, paired with the stage timings if profiling
+    is enabled (counted as the tile's fraction of an image).
+    """
+    canvas_size = config["canvas_size"]
+    rows, columns = window
+    fraction = ((rows.stop - rows.start) * (columns.stop - columns.start)
+                / (canvas_size[0] * canvas_size[1]))
+    timer = _make_worker_timer(images=fraction)
+    tile = generate_nearfield_tile(params, canvas_size, window,
+                                   **render_options(),
+                                   rng=tile_rng(run_seed, index, tile_number),
+                                   timer=timer)
+    return _with_profile(tile, timer)
+
+
+def _ordered_results(executor, tasks, max_in_flight):
+    """
+    Submits `(function, *args)` tasks to the executor, keeping at most
+    `max_in_flight` of them pending, and yields their results in
+    submission order. Pending tasks are cancelled if the consumer stops.
+    """
+    pending = deque()
+    try:
+        for function, *args in tasks:
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+            pending.append(executor.submit(function, *args))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _checksummed(tiles, state):
+    """
+    Passes `tiles` through while accumulating in the dict `state` their
+    pixel checksum ("checksum") and the seconds spent waiting for them to
+    be rendered ("wait").
+    """
+    tiles = iter(tiles)
+    while True:
+        wait_start = time.perf_counter()
+        tile = next(tiles, None)
+        state["wait"] += time.perf_counter() - wait_start
+        if tile is None:
+            return
+        state["checksum"] = image_checksum(tile, value=state["checksum"])
+        yield tile
+
+
+def run_tiled(executor, parameter_sets, indices, writer, recorder, pbar,
+              run_seed, tile_size, max_in_flight, profiler=None):
+    """
+    Runs the generation one image at a time, with the tiles of each image
+    rendered in parallel by the pool and streamed to `writer` in order.
+
+    At most `max_in_flight` tiles are pending or waiting to be written, so
+    peak memory depends on the tile size rather than the canvas size.
+    """
+    canvas_size = config["canvas_size"]
+    windows = tile_windows(canvas_size, tile_size)
+    for index in indices:
+        params = parameter_sets[index]
+        results = _ordered_results(
+            executor, ((generate_tile, params, index, number, window, run_seed)
+                       for number, window in enumerate(windows)),
+            max_in_flight)
+        records = []
+        tiles = results if profiler is None else \
+            (_collect_record(result, records) for result in results)
+        state = {"checksum": 0, "wait": 0.0}
+        try:
+            write_start = time.perf_counter()
+            filename = writer.write_tiles(index, _checksummed(tiles, state),
+                                          canvas_size, tile_size)
+            # Only the encoding and writing, not the wait for the tiles
+            write_seconds = time.perf_counter() - write_start - state["wait"]
+            recorder.record(index, filename, state["checksum"], write_seconds)
+            pbar.set_postfix_str(f"Last saved: {filename}")
+            if profiler is not None:
+                # One record per image: its tiles plus the write
+                record = merge_records(records)
+                record["seconds"]["write"] = write_seconds
+                profiler.add(record)
+        except Exception as e:
+            print(f"Error generating image: {e}")
+            recorder.skip([index])
+        finally:
+            results.close()
+            pbar.update(1)
+
+
+def _collect_record(result, records):
+    """
+    Appends the timer record of a profiled task result to the list
+    `records` and returns the bare result.
+    """
+    result, record = result
+    records.append(record)
+    return result
+
+
+def run_with_worker_writes(executor, parameter_sets, chunks, writer,
+                           recorder, pbar, run_seed, max_in_flight,
+                           profiler=None):
+    """
+    Runs the generation with every worker saving its own images through
+    `writer`; the parent only logs parameters and tracks progress.
+
+    Chunks are submitted in order with at most `max_in_flight` of them
+    pending, so the parent holds a bounded number of futures and parameter
+    sets however many images the run has.
+    """
+    remaining = iter(chunks)
+    futures = {}
+
+    def submit(chunk):
+        if len(chunk) > 1:
+            future = executor.submit(generate_and_save_batch,
+                                     [parameter_sets[i] for i in chunk],
+                                     chunk, writer, run_seed)
+        else:
+            future = executor.submit(generate_and_save_image,
+                                     parameter_sets[chunk[0]], chunk[0],
+                                     writer, run_seed)
+        futures[future] = chunk
+
+    for chunk in itertools.islice(remaining, max_in_flight):
+        submit(chunk)
+
+    # Collect results, top up the pool and update the progress bar as tasks
+    # complete
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk = futures.pop(future)
+            for next_chunk in itertools.islice(remaining, 1):
+                submit(next_chunk)
             try:
-                filename = future.result()
-                pbar.set_postfix_str(f"Last saved: {filename}")
+                result = future.result()
+                if profiler is not None:
+                    result, record = result
+                    profiler.add(record)
+                stored = result if isinstance(result, list) else [result]
+                for index, (filename, checksum, write_seconds) in \
+                        zip(chunk, stored):
+                    recorder.record(index, filename, checksum, write_seconds)
+                pbar.set_postfix_str(f"Last saved: {stored[-1][0]}")
             except Exception as e:
                 print(f"Error generating image: {e}")
+                recorder.skip(chunk)
             finally:
-                pbar.update(1)  # Increment progress bar by 1 for each =
-                # completed task
+                pbar.update(len(chunk))  # Increment progress bar by the
+                # number of images in the completed task
+
+
+def write_slot(writer, images, indices):
+    """
+    Writes the first `len(indices)` images of a shared-memory slot.
+
+    Returns:
+    - tuple: List of (filename, pixel checksum, write seconds) triples and
+    the seconds spent in total.
+    """
+    write_start = time.perf_counter()
+    stored = [_timed_write(writer, index, images[offset])
+              for offset, index in enumerate(indices)]
+    return stored, time.perf_counter() - write_start
+
+
+def run_with_shared_memory(executor, parameter_sets, chunks, writer,
+                           recorder, pbar, run_seed, profiler=None,
+                           io_executor=None):
+    """
+    Runs the generation with workers rendering into a bounded pool of
+    shared-memory slots while the parent writes the images and parameters.
+
+    At most `shared_slots` tasks are in flight; a slot is recycled as soon
+    as its images have been written, which caps peak memory independently
+    of `num_images`.
+
+    With an `io_executor` (a thread pool), writes are handed off to it
+    instead of blocking the parent, so rendering and encoding/disk I/O
+    overlap and throughput is bound by the slower of the two. Slots stay
+    taken until their images are written, so a slow disk throttles the
+    compute workers instead of growing a queue (backpressure).
+    """
+    if not chunks:
+        return
+    width, height = config["canvas_size"]
+    num_slots = config.get("shared_slots") or 2 * (os.cpu_count() or 1)
+    if io_executor is not None and not config.get("shared_slots"):
+        # Room for every concurrent write on top of the rendering slots
+        num_slots += config.get("io_workers", 4)
+    slot_shape = (max(len(chunk) for chunk in chunks), width, height)
+    remaining = iter(chunks)
+
+    def finish(slot, chunk, result, write):
+        try:
+            stored, write_seconds = write()
+            for index, (filename, checksum, seconds) in zip(chunk, stored):
+                recorder.record(index, filename, checksum, seconds)
+            if profiler is not None:
+                _, record = result
+                record["seconds"]["write"] = write_seconds
+                profiler.add(record)
+            pbar.set_postfix_str(f"Last saved: {stored[-1][0]}")
+        except Exception as e:
+            print(f"Error generating image: {e}")
+            recorder.skip(chunk)
+        finally:
+            pool.release(slot)
+            pbar.update(len(chunk))
+
+    with SharedImagePool(num_slots, slot_shape) as pool:
+        rendering = {}
+        writing = {}
+        next_chunk = next(remaining, None)
+        while rendering or writing or next_chunk is not None:
+            # Keep every free slot busy
+            while next_chunk is not None and pool.num_free:
+                slot = pool.acquire()
+                future = executor.submit(
+                    generate_into_slot,
+                    [parameter_sets[i] for i in next_chunk], next_chunk,
+                    pool.name(slot), slot_shape, run_seed)
+                rendering[future] = (slot, next_chunk)
+                next_chunk = next(remaining, None)
+
+            done, _ = wait([*rendering, *writing],
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in writing:
+                    slot, chunk, result = writing.pop(future)
+                    finish(slot, chunk, result, future.result)
+                    continue
+                slot, chunk = rendering.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error generating image: {e}")
+                    recorder.skip(chunk)
+                    pool.release(slot)
+                    pbar.update(len(chunk))
+                    continue
+                write = partial(write_slot, writer, pool.view(slot), chunk)
+                if io_executor is None:
+                    finish(slot, chunk, result, write)
+                else:
+                    writing[io_executor.submit(write)] = (slot, chunk,
+                                                          result)
+
+
+def prepare_noise_bank(executor, path):
+    """
+    Builds the noise bank of the "bank" Perlin method in the pool, or
+    reuses the one at `path` if it has the configured settings.
+    """
+    _, built = build_configured_bank(dict(config, noise_bank=path), executor)
+    print(f"{'Built' if built else 'Reusing'} noise bank {path}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generates a set of Nearfield images.")
+    parser.add_argument("--resume", metavar="FOLDER",
+                        help="Output folder of an interrupted run; only the "
+                             "missing or corrupt images are generated.")
+    parser.add_argument("--verify", choices=("size", "checksum"),
+                        default="size",
+                        help="How completed images are checked on resume: "
+                             "stored size only (default) or also the pixel "
+                             "checksum, which reads every image back.")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes (overrides num_workers).")
+    parser.add_argument("--chunk-size", type=int,
+                        help="Maximum images per worker task (overrides "
+                             "batch_size).")
+    parser.add_argument("--max-tasks-per-child", type=int,
+                        help="Tasks after which a worker process is replaced "
+                             "(overrides max_tasks_per_child).")
+    parser.add_argument("--max-in-flight", type=int,
+                        help="Tasks pending in the pool at once in "
+                             "write_mode 'worker' (overrides max_in_flight); "
+                             "the 'parent' and 'pipelined' modes are bounded "
+                             "by shared_slots instead.")
+    parser.add_argument("--schedule", choices=("cost", "index"),
+                        help="Dispatch order of the images (overrides "
+                             "schedule).")
+    return parser.parse_args(argv)
+
+
+def _apply_overrides(args):
+    """
+    Applies the scheduling options given on the command line to the config.
+    """
+    overrides = {"num_workers": args.workers, "batch_size": args.chunk_size,
+                 "max_tasks_per_child": args.max_tasks_per_child,
+                 "max_in_flight": args.max_in_flight,
+                 "schedule": args.schedule}
+    config.update({key: value for key, value in overrides.items()
+                   if value is not None})
+
+
+def _config_snapshot():
+    """
+    Returns the current configuration as JSON-serializable data.
+    """
+    return json.loads(json.dumps(config))
+
+
+def _restore_config(snapshot):
+    """
+    Restores the configuration of a run from its manifest snapshot.
+    """
+    config.clear()
+    config.update(snapshot)
+    config["canvas_size"] = tuple(config["canvas_size"])
+
+
+def start_run(output_folder):
+    """
+    Creates the folder of a new run and persists, before anything is
+    generated, its manifest and the parameter set of every image.
+
+    Returns:
+    - tuple: (output folder path, manifest, parameter sets).
+    """
+    output_folder_path = create_output_folder(output_folder)
+    output_format = config.get("output_format", "tiff")
+    # The memmap store keeps its parameters as a structured array
+    log_format = "npy" if output_format == "memmap" else \
+        config.get("parameter_log_format", "csv")
+
+    # Everything needed to resume the run or regenerate any image. The
+    # parameters are sampled from the run seed too, so the seed alone
+    # reproduces the whole run.
+    run_seed = resolve_run_seed(config.get("seed"))
+    table = get_sampled_parameter_table(seed=sampler_rng(run_seed))
+    write_parameter_table(os.path.join(output_folder_path, "parameters.npy"),
+                          table)
+    manifest = {
+        "created": get_timestamp(),
+        "seed": run_seed,
+        "num_images": len(table),
+        "canvas_size": list(config["canvas_size"]),
+        "render_options": render_options(),
+        "tile_size": config.get("tile_size"),
+        "pyramid_sizes": pyramid_sizes(config["canvas_size"],
+                                       config.get("pyramid_sizes")),
+        "output_format": output_format,
+        "parameter_table": "parameters.npy",
+        "parameter_log": f"parameters_log.{log_format}",
+        "completion_log": "completed.csv",
+        "config": _config_snapshot(),
+    }
+    write_manifest(output_folder_path, manifest)
+    return output_folder_path, manifest, ParameterTable(table)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_folder = "output/images"
+
+    # Step 2-3: Create the output folder and persist the parameter sets, or
+    # reopen an interrupted run
+    if args.resume:
+        output_folder_path = args.resume
+        manifest = read_manifest(output_folder_path)
+        _restore_config(manifest["config"])
+        _apply_overrides(args)
+        parameter_sets = read_parameter_table(
+            os.path.join(output_folder_path, manifest["parameter_table"]))
+    else:
+        _apply_overrides(args)
+        output_folder_path, manifest, parameter_sets = \
+            start_run(output_folder)
+
+    num_images = manifest["num_images"]
+    num_workers = config.get("num_workers")
+    batch_size = config.get("batch_size", 1)
+    tile_size = manifest["tile_size"]
+    write_mode = config.get("write_mode", "worker")
+    run_seed = manifest["seed"]
+    profiler = ProfileCollector() if config.get("profile", False) else None
+    output_format = manifest["output_format"]
+    levels = [tuple(size) for size in manifest.get("pyramid_sizes") or ()]
+    if levels and tile_size:
+        raise ValueError("pyramid_sizes needs whole images; unset tile_size")
+    stack_size = config.get("tiff_stack_size", 1)
+    if output_format == "tiff" and stack_size > 1 and \
+            (tile_size or write_mode == "worker"):
+        # Stacks are assembled by the one writer in the parent process
+        raise ValueError("tiff_stack_size > 1 needs write_mode 'parent' or "
+                         "'pipelined' and no tile_size")
+    options = tiff_options(config.get("tiff_compression"),
+                           config.get("tiff_predictor", False),
+                           config.get("tiff_compression_level"),
+                           config.get("tiff_layout", "strip"),
+                           config.get("tiff_tile_size", 256),
+                           config.get("tiff_rowsperstrip")) \
+        if output_format == "tiff" else None
+    writer = create_image_writer(output_format, output_folder_path,
+                                 num_images, config["canvas_size"],
+                                 resume=bool(args.resume), options=options,
+                                 stack_size=stack_size, levels=levels)
+    log_path = os.path.join(output_folder_path, manifest["parameter_log"])
+    log_format = os.path.splitext(log_path)[1].lstrip(".")
+    completion_path = os.path.join(output_folder_path,
+                                   manifest["completion_log"])
+
+    # Only images without an intact output are generated
+    records = read_completion_log(completion_path)
+    done = verify_outputs(writer, records,
+                          checksum=args.verify == "checksum",
+                          tile_size=tile_size)
+    indices = [index for index in range(num_images) if index not in done]
+    worker_count = num_workers or os.cpu_count() or 1
+    chunks = [] if tile_size else plan_chunks(
+        parameter_sets, indices, config["canvas_size"],
+        manifest["render_options"], worker_count, batch_size,
+        schedule=config.get("schedule", "cost"), group=writer.group)
+
+    # Step 4: Use ProcessPoolExecutor to parallelize image generation with a
+    # progress bar. Parameters are logged here, by a single writer.
+    # Cache statistics are counted across all workers
+    rolloff_counters = multiprocessing.Array("q", len(COUNTERS)) \
+        if manifest["render_options"].get("rolloff_cache") else None
+    # Worker recycling needs Python 3.11 and a "spawn" or "forkserver" pool,
+    # which ProcessPoolExecutor then picks by default
+    recycling = {"max_tasks_per_child": config["max_tasks_per_child"]} \
+        if config.get("max_tasks_per_child") else {}
+    # Workers started before the parent's shared-memory resource tracker
+    # (e.g. to build the noise bank) would start trackers of their own,
+    # which report the slots they attach to as leaked
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=num_workers,
+                             initializer=init_worker,
+                             initargs=(_config_snapshot(), rolloff_counters),
+                             **recycling) as executor:
+        noise_bank = manifest["render_options"].get("noise_bank")
+        if noise_bank and indices:
+            prepare_noise_bank(executor, noise_bank)
+
+        with ParameterLogger(log_path, fmt=log_format,
+                             flush_every=config.get("parameter_log_flush",
+                                                    256),
+                             max_pending=config.get("parameter_log_reorder",
+                                                    256)) as logger, \
+             CompletionLog(completion_path) as completion_log, \
+             tqdm(total=num_images, initial=len(done),
+                  desc="Generating Images", unit="image") as pbar:
+            recorder = RunRecorder(parameter_sets, logger, completion_log,
+                                   writer)
+            for index in sorted(done):
+                recorder.restore(index, records[index]["name"])
+            if tile_size:
+                run_tiled(executor, parameter_sets, indices, writer, recorder,
+                          pbar, run_seed, tile_size, 2 * worker_count,
+                          profiler)
+            elif write_mode in ("parent", "pipelined"):
+                io_workers = config.get("io_workers", 4)
+                with (ThreadPoolExecutor(max_workers=io_workers)
+                      if write_mode == "pipelined" else nullcontext()) as io:
+                    run_with_shared_memory(executor, parameter_sets, chunks,
+                                           writer, recorder, pbar, run_seed,
+                                           profiler, io_executor=io)
+            else:
+                run_with_worker_writes(
+                    executor, parameter_sets, chunks, writer, recorder, pbar,
+                    run_seed, config.get("max_in_flight") or 2 * worker_count,
+                    profiler)
+    writer.close()
+
+    # Step 5: Summarize the storage and the per-stage timings
+    output = recorder.summary(2 * sum(width * height for width, height
+                                      in [config["canvas_size"], *levels]))
+    ratio = output["compression_ratio"]
+    print(f"{output['bytes_stored'] / 2**20:.1f} MiB stored"
+          + (f", compression ratio {ratio:.2f}" if ratio else "")
+          + f", {output['write_seconds']:.2f} s encoding and writing")
+    if rolloff_counters is not None:
+        output["rolloff_cache"] = rolloff_cache_info(rolloff_counters)
+        cache = output["rolloff_cache"]
+        print(f"Roll-off cache: {cache['hits']} hits, {cache['store_hits']} "
+              f"store hits, {cache['misses']} misses "
+              f"(hit rate {cache['hit_rate']:.0%}), {cache['spills']} "
+              f"masks spilled")
+    if profiler is not None:
+        profiler.extra["output"] = output
+        profile_path = os.path.join(output_folder_path, "profile.json")
+        summary = profiler.write(profile_path)
+        print(f"{summary['images_per_second']:.2f} images/s, "
+              f"profile written to {profile_path}")
+    return output_folder_path
 
 
 if __name__ == "__main__":
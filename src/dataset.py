@@ -0,0 +1,109 @@
+# dataset.py
+
+import os
+import numpy as np
+from src.image_generator import generate_nearfield_image_impl, render_options
+from src.output_manager import read_manifest, read_parameter_table
+from src.parameter_sampler import ParameterTable
+from src.seeding import image_rng
+from src.tiling import iter_nearfield_tiles, tile_windows
+from src.utils import LRUCache
+
+# Number of regenerated images kept by a dataset (2 MiB each at 1024x1024)
+DATASET_CACHE_SIZE = 32
+
+
+class NearfieldDataset:
+    """
+    Indexable collection of Nearfield images that are regenerated on demand
+    from their parameters and the run seed instead of being read from disk.
+
+    Image `i` is rendered with `image_rng(run_seed, i)` and is therefore
+    identical to the image `main.main()` produced for index `i` with the
+    same rendering options (compute dtype and fused included), whatever
+    worker or batch rendered it. Recently used images are kept in an LRU
+    cache, so a run only needs to store its manifest and parameter table.
+
+    Parameters:
+    - parameter_sets (list of dicts or ParameterTable): Parameter set of
+    every image, by index.
+    - run_seed (int): Seed of the run, see `src.seeding`.
+    - canvas_size (tuple): Size of the images (width, height).
+    - options (dict or None): Rendering options, see
+    `src.image_generator.render_options`; defaults to the current config.
+    - cache_size (int): Number of regenerated images kept in memory.
+    - tile_size (int or None): Tile size the run was rendered with, see
+    `src.tiling`; tiled images are regenerated tile by tile.
+    """
+
+    def __init__(self, parameter_sets, run_seed, canvas_size, options=None,
+                 cache_size=DATASET_CACHE_SIZE, tile_size=None):
+        self.parameter_sets = parameter_sets \
+            if isinstance(parameter_sets, ParameterTable) \
+            else list(parameter_sets)
+        self.run_seed = int(run_seed)
+        self.canvas_size = tuple(canvas_size)
+        self.options = render_options() if options is None else dict(options)
+        self.tile_size = tile_size
+        self._cache = LRUCache(max_items=cache_size)
+
+    @classmethod
+    def from_folder(cls, output_folder, cache_size=DATASET_CACHE_SIZE):
+        """
+        Opens the output folder of a run written by `main.main()`.
+
+        Parameters:
+        - output_folder (str): Folder holding `manifest.json` and the
+        parameter table; the images themselves are not needed.
+        - cache_size (int): Number of regenerated images kept in memory.
+
+        Returns:
+        - NearfieldDataset: Dataset over every logged image of the run.
+        """
+        manifest = read_manifest(output_folder)
+        parameter_sets = read_parameter_table(
+            os.path.join(output_folder, manifest["parameter_table"]))
+        return cls(parameter_sets, manifest["seed"], manifest["canvas_size"],
+                   options=manifest["render_options"], cache_size=cache_size,
+                   tile_size=manifest.get("tile_size"))
+
+    def __len__(self):
+        return len(self.parameter_sets)
+
+    def __getitem__(self, index):
+        """
+        Returns image `index` as a read-only (width, height) uint16 array.
+        """
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"Image index {index} out of range")
+        index %= len(self)
+        image = self._cache.get(index)
+        if image is None:
+            image = self._generate(index)
+            image.flags.writeable = False  # Cached arrays are shared
+            self._cache.put(index, image)
+        return image
+
+    def _generate(self, index):
+        params = self.parameter_sets[index]
+        if not self.tile_size:
+            return generate_nearfield_image_impl(
+                params, self.canvas_size, **self.options,
+                rng=image_rng(self.run_seed, index))
+        image = np.empty(self.canvas_size, dtype=np.uint16)
+        tiles = iter_nearfield_tiles(params, self.canvas_size, self.tile_size,
+                                     self.run_seed, index, **self.options)
+        for window, tile in zip(tile_windows(self.canvas_size,
+                                             self.tile_size), tiles):
+            image[window] = tile
+        return image
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def cache_info(self):
+        """
+        Returns the hit/miss counters and occupancy of the image cache.
+        """
+        return self._cache.stats()
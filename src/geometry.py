@@ -0,0 +1,89 @@
+# geometry.py
+
+from collections import namedtuple
+import numpy as np
+from src.utils import LRUCache
+
+# Number of distinct (canvas_size, dtype) geometries kept per process
+GEOMETRY_CACHE_SIZE = 4
+
+# Broadcastable coordinate vectors of a canvas. The ellipse stages work on
+# image rows/columns, i.e. (height, width); the Perlin and asymmetry stages
+# index the canvas as (width, height). Both layouts coincide for the square
+# canvases used in practice.
+CanvasGeometry = namedtuple("CanvasGeometry", [
+    "x_centered",  # (1, width): column coordinate minus width / 2
+    "y_centered",  # (height, 1): row coordinate minus height / 2
+    "x_index",     # (width, 1): integer x coordinate for Perlin sampling
+    "y_index",     # (1, height): integer y coordinate for Perlin sampling
+    "x_ramp",      # (width, 1): linspace(-1, 1) asymmetry ramp along x
+    "y_ramp",      # (1, height): linspace(-1, 1) asymmetry ramp along y
+])
+
+_geometry_cache = LRUCache(max_items=GEOMETRY_CACHE_SIZE)
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+def _build_geometry(canvas_size, dtype):
+    width, height = canvas_size
+    return CanvasGeometry(
+        x_centered=_read_only(
+            (np.arange(width) - width / 2).astype(dtype).reshape(1, -1)),
+        y_centered=_read_only(
+            (np.arange(height) - height / 2).astype(dtype).reshape(-1, 1)),
+        x_index=_read_only(np.arange(width, dtype=dtype).reshape(-1, 1)),
+        y_index=_read_only(np.arange(height, dtype=dtype).reshape(1, -1)),
+        x_ramp=_read_only(
+            np.linspace(-1, 1, width, dtype=dtype).reshape(-1, 1)),
+        y_ramp=_read_only(
+            np.linspace(-1, 1, height, dtype=dtype).reshape(1, -1)),
+    )
+
+
+def get_canvas_geometry(canvas_size, dtype=np.float64):
+    """
+    Returns the cached, read-only coordinate vectors of a canvas.
+
+    Geometry is built once per (canvas_size, dtype) and process and shared
+    by the mask, roll-off, asymmetry and noise stages. The cache keeps the
+    `GEOMETRY_CACHE_SIZE` most recently used geometries.
+
+    Parameters:
+    - canvas_size (tuple): Size of the canvas (width, height).
+    - dtype (numpy dtype): Floating point type of the coordinates.
+
+    Returns:
+    - CanvasGeometry: Named tuple of broadcastable coordinate arrays.
+    """
+    dtype = np.dtype(dtype)
+    key = (tuple(int(n) for n in canvas_size), dtype.str)
+    geometry = _geometry_cache.get(key)
+    if geometry is None:
+        geometry = _build_geometry(key[0], dtype)
+        _geometry_cache.put(key, geometry)
+    return geometry
+
+
+def set_geometry_cache_size(max_items):
+    """
+    Changes how many geometries are kept, evicting the oldest if needed.
+    """
+    _geometry_cache.resize(max_items=max_items)
+
+
+def clear_geometry_cache():
+    """
+    Drops all cached geometries of the current process.
+    """
+    _geometry_cache.clear()
+
+
+def geometry_cache_info():
+    """
+    Returns hit/miss statistics of the geometry cache.
+    """
+    return _geometry_cache.stats()
@@ -1,17 +1,90 @@
 # image_generator.py
 
+import os
 import numpy as np
-from scipy.special import erf
-from noise import pnoise2
-from scipy.ndimage import distance_transform_edt
 from config import config
+from src.perlin import pnoise2_grid
+from src.noise_bank import bank_noise
+from src.geometry import get_canvas_geometry
+from src.profiling import NULL_TIMER
+from src.rolloff_cache import get_rolloff_cache, quantize_geometry
+from src.scratch import get_scratch_buffers
+
+# SciPy and `noise` are imported where they are first needed: scipy.special
+# and scipy.ndimage take longer to import than numpy itself, which every
+# spawned pool worker and short-lived caller would otherwise pay up front.
+
+
+def erf(x, out=None):
+    """
+    `scipy.special.erf`, imported on first use.
+    """
+    from scipy.special import erf as scipy_erf  # Deferred, see above
+    return scipy_erf(x, out=out)
+
+
+def distance_transform_edt(mask):
+    """
+    `scipy.ndimage.distance_transform_edt`, imported on first use.
+    """
+    from scipy.ndimage import distance_transform_edt as edt  # Deferred
+    return edt(mask)
+
 
 # Define a DC offset to ensure positive values
 DC_OFFSET = 0.5  # This can be adjusted as needed to keep all values positive
 
+# Rows of Perlin noise evaluated at once when rendering into a buffer
+PERLIN_BLOCK_ROWS = 128
+
+# Rows of Gaussian noise drawn at once, see `_add_gaussian_noise`
+NOISE_BLOCK_ROWS = 128
+
+# erf band used to size the halo of "edt" tiles when no band is configured
+TILE_HALO_BAND = 4.0
+
+
+def _per_image(values, dtype=float):
+    """
+    Reshapes a scalar, or an (N,) array of per-image parameters, so that it
+    broadcasts against a (H, W) canvas or an (N, H, W) batch.
+    """
+    return np.asarray(values, dtype=dtype)[..., np.newaxis, np.newaxis]
+
+
+def _rotated_coordinates(canvas_size, angle_rotation, dtype=np.float64,
+                         window=None):
+    """
+    Returns canvas coordinates rotated into the frame of the ellipse.
+
+    Parameters:
+    - canvas_size (tuple): Size of the image canvas (width, height).
+    - angle_rotation (float or array): Rotation angle of the ellipse in
+    degrees, or an (N,) array of angles.
+    - dtype (numpy dtype): Floating point type of the coordinates.
+    - window (tuple or None): (rows, columns) slices of the image array to
+    restrict the coordinates to, e.g. one tile.
+
+    Returns:
+    - tuple: (x_rot, y_rot) arrays of shape (width, height), or
+    (N, width, height) for an array of angles.
+    """
+    geometry = get_canvas_geometry(canvas_size, dtype)
+    x, y = geometry.x_centered, geometry.y_centered
+    if window is not None:
+        rows, columns = window
+        x, y = x[:, columns], y[rows]
+
+    # Rotate the coordinates by the specified angle
+    theta = np.radians(_per_image(angle_rotation, dtype))
+    x_rot = x * np.cos(theta) + y * np.sin(theta)
+    y_rot = -x * np.sin(theta) + y * np.cos(theta)
+    return x_rot, y_rot
+
 
 def create_elliptical_mask(canvas_size,
-                           major_axis, minor_axis, angle_rotation):
+                           major_axis, minor_axis, angle_rotation,
+                           window=None):
     """
     Creates a binary elliptical mask based on specified size and rotation.
 
@@ -20,27 +93,113 @@ def create_elliptical_mask(canvas_size,
     - major_axis (float): Length of the major axis.
     - minor_axis (float): Length of the minor axis.
     - angle_rotation (float): Rotation angle of the ellipse in degrees.
+    - window (tuple or None): (rows, columns) slices of the canvas to
+    rasterise instead of the whole canvas.
 
     Returns:
     - numpy array: Binary mask where the elliptical region is 1 and the
     rest is 0.
     """
-    width, height = canvas_size
-    x, y = np.meshgrid(np.arange(width), np.arange(height))
-    x_center, y_center = width / 2, height / 2
-
-    # Rotate the coordinates by the specified angle
-    theta = np.radians(angle_rotation)
-    x_rot = (x - x_center) * np.cos(theta) + (y - y_center) * np.sin(theta)
-    y_rot = -(x - x_center) * np.sin(theta) + (y - y_center) * np.cos(theta)
+    x_rot, y_rot = _rotated_coordinates(canvas_size, angle_rotation,
+                                        window=window)
+    major_axis, minor_axis = _per_image(major_axis), _per_image(minor_axis)
 
     # Define the ellipse mask
     ellipse_mask = ((x_rot / major_axis) ** 2 + (y_rot / minor_axis) ** 2) <= 1
     return ellipse_mask.astype(float)
 
 
+def elliptical_signed_distance(canvas_size,
+                               major_axis, minor_axis, angle_rotation,
+                               dtype=np.float64, window=None):
+    """
+    Approximates the signed distance to the edge of a rotated ellipse in
+    closed form, as a replacement for two Euclidean distance transforms.
+
+    Uses the first-order estimate d = k0 * (1 - k0) / k1, with k0 the
+    normalised ellipse radius and k1 its gradient magnitude, then shifts by
+    half a pixel to follow the pixel-centre convention of
+    `distance_transform_edt`. Pixels are classified inside/outside exactly
+    as in `create_elliptical_mask`; near the edge the result is within
+    about one pixel of the EDT signed distance. The ellipse parameters may
+    be (N,) arrays, in which case an (N, width, height) batch is returned.
+
+    Parameters:
+    - canvas_size (tuple): Size of the image canvas (width, height).
+    - major_axis (float): Length of the major axis.
+    - minor_axis (float): Length of the minor axis.
+    - angle_rotation (float): Rotation angle of the ellipse in degrees.
+    - dtype (numpy dtype): Floating point type of the result.
+    - window (tuple or None): (rows, columns) slices of the canvas to
+    evaluate instead of the whole canvas.
+
+    Returns:
+    - numpy array: Signed distance in pixels (positive inside, negative
+    outside).
+    """
+    x_rot, y_rot = _rotated_coordinates(canvas_size, angle_rotation, dtype,
+                                        window)
+    major_axis = _per_image(major_axis, dtype)
+    minor_axis = _per_image(minor_axis, dtype)
+    u = x_rot / major_axis
+    v = y_rot / minor_axis
+
+    k0 = np.sqrt(u * u + v * v)
+    k1 = np.hypot(u / major_axis, v / minor_axis)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance = k0 * (1 - k0) / k1
+    # The estimate is 0/0 at the exact centre of the ellipse
+    np.copyto(distance, np.minimum(major_axis, minor_axis), where=k1 == 0)
+
+    distance += np.where(k0 <= 1, 0.5, -0.5).astype(dtype)
+    return distance
+
+
+def _elliptical_signed_distance_into(canvas_size, major_axis, minor_axis,
+                                     angle_rotation, buffers):
+    """
+    Computes `elliptical_signed_distance` for a single ellipse entirely in
+    three preallocated (width, height) buffers, without full-canvas
+    temporaries. Returns the buffer holding the distance.
+    """
+    u, v, k1 = buffers
+    geometry = get_canvas_geometry(canvas_size, u.dtype)
+    x, y = geometry.x_centered, geometry.y_centered
+    theta = np.radians(angle_rotation)
+    cos, sin = np.cos(theta), np.sin(theta)
+
+    # Normalised, rotated coordinates u = x_rot / a and v = y_rot / b
+    np.multiply(x, cos / major_axis, out=u)
+    u += y * (sin / major_axis)
+    np.multiply(x, -sin / minor_axis, out=v)
+    v += y * (cos / minor_axis)
+
+    # k1^2 = (u / a)^2 + (v / b)^2 and k0^2 = u^2 + v^2
+    np.square(u, out=u)
+    np.square(v, out=v)
+    np.multiply(u, 1 / major_axis ** 2, out=k1)
+    u += v
+    v *= 1 / minor_axis ** 2
+    k1 += v
+    k0 = np.sqrt(u, out=u)
+    np.sqrt(k1, out=k1)
+
+    # d = k0 * (1 - k0) / k1, shifted by half a pixel
+    distance = np.subtract(1, k0, out=v)
+    distance *= k0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance /= k1
+    np.copyto(distance, min(major_axis, minor_axis), where=k1 == 0)
+    inside = k0 <= 1
+    np.add(distance, 0.5, out=distance, where=inside)
+    np.subtract(distance, 0.5, out=distance, where=~inside)
+    return distance
+
+
 def generate_perlin_noise(canvas_size, scale,
-                          octaves, persistence, lacunarity, amplitude):
+                          octaves, persistence, lacunarity, amplitude,
+                          method="vectorized", dtype=np.float64, out=None,
+                          window=None, bank=None):
     """
     Generates a Perlin noise canvas with a specified amplitude and DC offset.
 
@@ -51,31 +210,108 @@ def generate_perlin_noise(canvas_size, scale,
     - persistence (float): Persistence factor controlling amplitude.
     - lacunarity (float): Lacunarity controlling frequency spacing.
     - amplitude (float): Amplitude of Perlin noise.
+    - method (str): "vectorized" evaluates the whole canvas in one NumPy
+    pass; "pnoise2" calls `noise.pnoise2` per pixel (reference path). The
+    two agree to within `src.perlin.PNOISE2_TOLERANCE`. "bank" crops
+    precomputed noise of the nearest parameter bin from `bank` instead, see
+    `src.noise_bank.bank_noise`.
+    - dtype (numpy dtype): Floating point type of the returned canvas.
+    - out (numpy array or None): (width, height) array of `dtype` to write
+    the canvas into instead of allocating one.
+    - window (tuple or None): (rows, columns) slices of the canvas to
+    generate instead of the whole canvas; the noise matches the
+    corresponding part of the full canvas exactly.
+    - bank (str or None): Path of the noise bank for the "bank" method.
 
     Returns:
     - numpy array: Canvas with Perlin noise applied, offset to be positive.
     """
-    width, height = canvas_size
-    noise = np.zeros((width, height))
-
-    # Generate Perlin noise in a vectorized manner
-    for i in range(width):
-        for j in range(height):
-            noise_val = pnoise2(i / scale, j / scale, octaves=octaves,
-                                persistence=persistence, lacunarity=lacunarity)
-            noise[i, j] = noise_val * amplitude
+    geometry = get_canvas_geometry(canvas_size)
+    x_index, y_index = geometry.x_index, geometry.y_index
+    if window is not None:
+        rows, columns = window
+        x_index, y_index = x_index[rows], y_index[:, columns]
+    width, height = len(x_index), y_index.shape[1]
+
+    if method == "vectorized":
+        x = x_index / scale
+        y = y_index / scale
+        if out is not None and out.dtype == np.float32:
+            # Evaluate in row blocks so the kernel temporaries stay small
+            for start in range(0, width, PERLIN_BLOCK_ROWS):
+                rows = slice(start, start + PERLIN_BLOCK_ROWS)
+                pnoise2_grid(x[rows], y, octaves=octaves,
+                             persistence=persistence, lacunarity=lacunarity,
+                             out=out[rows])
+            noise = out
+        else:
+            noise = pnoise2_grid(x, y, octaves=octaves,
+                                 persistence=persistence,
+                                 lacunarity=lacunarity)
+            if out is None:
+                noise = noise.astype(dtype, copy=False)
+            else:
+                np.copyto(out, noise)
+                noise = out
+        noise *= amplitude
+    elif method == "bank":
+        if bank is None:
+            raise ValueError("The 'bank' Perlin method needs a noise bank")
+        crop = bank_noise(bank, canvas_size, scale, octaves, persistence,
+                          lacunarity, window=window)
+        noise = np.empty(crop.shape, dtype=dtype) if out is None else out
+        np.multiply(crop, amplitude, out=noise, dtype=noise.dtype)
+    elif method == "pnoise2":
+        from noise import pnoise2  # Reference path only
+        noise = np.zeros((width, height), dtype=dtype) if out is None else out
+        for row, i in enumerate(x_index[:, 0].astype(int)):
+            for column, j in enumerate(y_index[0].astype(int)):
+                noise_val = pnoise2(i / scale, j / scale, octaves=octaves,
+                                    persistence=persistence,
+                                    lacunarity=lacunarity)
+                noise[row, column] = noise_val * amplitude
+    else:
+        raise ValueError(f"Unknown Perlin noise method: {method}")
 
     # Add DC offset from config
-    return noise + config["DC_OFFSET"]
+    noise += config["DC_OFFSET"]
+    return noise
+
+
+def apply_erf_to_distance(distance, rolloff, band=None):
+    """
+    Maps a signed distance field to an ERF roll-off profile.
+
+    Parameters:
+    - distance (numpy array): Signed distance (positive inside), of shape
+    (H, W) or (N, H, W).
+    - rolloff (float or array): Controls edge roll-off sharpness; an (N,)
+    array applies one value per image of a batch.
+    - band (float or None): If set, `erf` is only evaluated where
+    |distance * rolloff| < band; the saturated interior is filled with 1
+    and the exterior with 0. A band of 4 keeps the error below 1e-8.
+
+    Returns:
+    - numpy array: Roll-off profile in [0, 1].
+    """
+    scaled = distance * _per_image(rolloff, distance.dtype)
+    if band is None:
+        return 0.5 * (1 + erf(scaled))
 
+    profile = (scaled > 0).astype(scaled.dtype)
+    edge = np.abs(scaled) < band
+    profile[edge] = 0.5 * (1 + erf(scaled[edge]))
+    return profile
 
-def apply_erf_rolloff(mask, rolloff):
+
+def apply_erf_rolloff(mask, rolloff, band=None):
     """
     Applies an ERF roll-off at the edges of the mask.
 
     Parameters:
     - mask (numpy array): The binary mask (1 inside the shape, 0 outside).
     - rolloff (float): Controls edge roll-off sharpness.
+    - band (float or None): Edge band for `apply_erf_to_distance`.
 
     Returns:
     - numpy array: Mask with an ERF roll-off applied at the edges.
@@ -84,90 +320,689 @@ def apply_erf_rolloff(mask, rolloff):
     distance = distance_transform_edt(mask) - distance_transform_edt(1 - mask)
 
     # Apply erf roll-off based on distance
-    return 0.5 * (1 + erf(distance * rolloff))
+    return apply_erf_to_distance(distance, rolloff, band=band)
+
+
+def _windowed_edt_distance(canvas_size, major_axis, minor_axis,
+                           angle_rotation, rolloff, band, window):
+    """
+    EDT signed distance of the ellipse mask on one window of the canvas.
+
+    The mask is rasterised on the window grown by a halo of
+    ceil(band / rolloff) + 1 pixels, so every pixel whose roll-off is not
+    saturated finds its nearest edge pixel within the halo and gets the
+    same distance as from the full-canvas transform. Distances beyond the
+    halo are clipped to it, which only affects the saturated region.
+    """
+    halo = int(np.ceil((band or TILE_HALO_BAND) / rolloff)) + 1
+    grown = tuple(slice(max(part.start - halo, 0), min(part.stop + halo, size))
+                  for part, size in zip(window, canvas_size))
+    crop = tuple(slice(part.start - grown_part.start,
+                       part.stop - grown_part.start)
+                 for part, grown_part in zip(window, grown))
+
+    mask = create_elliptical_mask(canvas_size, major_axis, minor_axis,
+                                  angle_rotation, window=grown)
+    if mask.all() or not mask.any():
+        # No edge within reach: the window is saturated on one side
+        return np.where(mask[crop] > 0, halo, -halo).astype(float)
+    distance = distance_transform_edt(mask) - distance_transform_edt(1 - mask)
+    return np.clip(distance[crop], -halo, halo)
 
 
-def apply_asymmetry(image, asymmetry_x, asymmetry_y):
+def create_elliptical_rolloff(canvas_size, major_axis, minor_axis,
+                              angle_rotation, rolloff, method="analytic",
+                              band=None, timer=NULL_TIMER, dtype=np.float64,
+                              window=None):
+    """
+    Creates the ERF roll-off mask of a rotated ellipse.
+
+    Parameters:
+    - canvas_size (tuple): Size of the image canvas (width, height).
+    - major_axis (float): Length of the major axis.
+    - minor_axis (float): Length of the minor axis.
+    - angle_rotation (float): Rotation angle of the ellipse in degrees.
+    - rolloff (float): Controls edge roll-off sharpness.
+    - method (str): "analytic" uses `elliptical_signed_distance`; "edt"
+    rasterises the mask and uses two distance transforms.
+    - band (float or None): Edge band for `apply_erf_to_distance`.
+    - timer (StageTimer): Optional stage timer, see `src.profiling`.
+    - dtype (numpy dtype): Floating point type of the result.
+    - window (tuple or None): (rows, columns) slices of the canvas to
+    evaluate, e.g. one tile. The "edt" method then works on the window plus
+    a halo sized from `band` and `rolloff`.
+
+    The "analytic" method also accepts (N,) parameter arrays and then
+    returns an (N, H, W) batch.
+
+    Returns:
+    - numpy array: Elliptical mask with an ERF roll-off applied at the edges.
+    """
+    if method == "analytic":
+        with timer.stage("signed_distance"):
+            distance = elliptical_signed_distance(canvas_size, major_axis,
+                                                  minor_axis, angle_rotation,
+                                                  dtype=dtype, window=window)
+    elif method == "edt" and window is not None:
+        with timer.stage("edt"):
+            distance = _windowed_edt_distance(
+                canvas_size, major_axis, minor_axis, angle_rotation, rolloff,
+                band, window).astype(dtype)
+    elif method == "edt":
+        with timer.stage("mask"):
+            mask = create_elliptical_mask(canvas_size, major_axis,
+                                          minor_axis, angle_rotation)
+        with timer.stage("edt"):
+            distance = (distance_transform_edt(mask)
+                        - distance_transform_edt(1 - mask)).astype(dtype)
+    else:
+        raise ValueError(f"Unknown roll-off method: {method}")
+
+    with timer.stage("erf"):
+        return apply_erf_to_distance(distance, rolloff, band=band)
+
+
+def _cached_rolloff(canvas_size, params, rolloff_cache, method, band, timer,
+                    dtype, window=None):
+    """
+    Returns the roll-off mask of an image rendered with its geometry
+    quantized as configured in `rolloff_cache` (see `render_options`), so
+    that cached and freshly rendered masks are identical. Whole-canvas masks
+    go through the per-process cache; the read-only result must not be
+    modified. Tiles are only quantized, to match the whole image.
+    """
+    geometry = quantize_geometry(params, rolloff_cache["quantization"])
+
+    def build():
+        return create_elliptical_rolloff(canvas_size, *geometry,
+                                         method=method, band=band,
+                                         timer=timer, dtype=dtype,
+                                         window=window)
+    if window is not None:
+        return build()
+    cache = get_rolloff_cache(rolloff_cache["max_bytes"],
+                              rolloff_cache["store"])
+    key = (tuple(canvas_size), np.dtype(dtype).str, method, band, geometry)
+    return cache.get(key, build)
+
+
+def apply_asymmetry(image, asymmetry_x, asymmetry_y, canvas_size=None,
+                    window=None):
     """
     Applies asymmetry to an image.
 
     Parameters:
-    - image (numpy array): The base image.
-    - asymmetry_x (float): Gradient effect in the x direction.
-    - asymmetry_y (float): Gradient effect in the y direction.
+    - image (numpy array): The base image, or an (N, width, height) batch.
+    - asymmetry_x (float or array): Gradient effect in the x direction.
+    - asymmetry_y (float or array): Gradient effect in the y direction.
+    - canvas_size (tuple or None): Size of the full canvas when `image` is
+    only the `window` part of it; defaults to the shape of `image`.
+    - window (tuple or None): (rows, columns) slices of the canvas covered
+    by `image`.
 
     Returns:
     - numpy array: Image with asymmetry applied.
     """
-    width, height = image.shape
-    x_gradient = np.linspace(-asymmetry_x, asymmetry_x, width).reshape(-1, 1)
-    y_gradient = np.linspace(-asymmetry_y, asymmetry_y, height).reshape(1, -1)
+    if canvas_size is None:
+        canvas_size = image.shape[-2:]
+    geometry = get_canvas_geometry(canvas_size, image.dtype)
+    x_ramp, y_ramp = geometry.x_ramp, geometry.y_ramp
+    if window is not None:
+        rows, columns = window
+        x_ramp, y_ramp = x_ramp[rows], y_ramp[:, columns]
+
+    # Apply gradients one axis at a time to avoid a full-canvas temporary
+    image += _per_image(asymmetry_x, image.dtype) * x_ramp
+    image += _per_image(asymmetry_y, image.dtype) * y_ramp
+    return image
+
 
-    # Apply gradients
-    image += x_gradient + y_gradient
+def _add_gaussian_noise(image, sigma, rng):
+    """
+    Adds Gaussian noise of standard deviation `sigma` from `rng` to one
+    image, in place. The noise is always drawn as float64 standard normals,
+    a block of rows at a time, so that every rendering path and compute
+    dtype gets the same noise from the same generator without a full
+    float64 canvas.
+    """
+    for start in range(0, len(image), NOISE_BLOCK_ROWS):
+        rows = image[start:start + NOISE_BLOCK_ROWS]
+        noise = rng.standard_normal(rows.shape)
+        noise *= sigma
+        rows += noise
     return image
 
 
-def apply_gaussian_noise(image, gaussian_noise):
+def apply_gaussian_noise(image, gaussian_noise, rng=None):
     """
     Applies Gaussian noise to an image.
 
     Parameters:
-    - image (numpy array): The base image.
-    - gaussian_noise (float): Standard deviation of Gaussian noise to add.
+    - image (numpy array): The base image, or an (N, H, W) batch.
+    - gaussian_noise (float or array): Standard deviation of Gaussian noise
+    to add.
+    - rng (numpy Generator, sequence of Generators or None): Source of the
+    noise. A sequence supplies one generator per image of a batch, so each
+    image gets the same noise as when rendered on its own (see
+    `src.seeding.image_rng`). None uses the global `np.random` state.
 
     Returns:
     - numpy array: Image with Gaussian noise applied.
     """
-    image += np.random.normal(0, gaussian_noise, image.shape)
+    if rng is None:
+        image += np.random.normal(0, _per_image(gaussian_noise), image.shape)
+        return np.clip(image, 0, 1)  # Clip values to stay within [0, 1]
+
+    planes = image if image.ndim == 3 else image[np.newaxis]
+    if isinstance(rng, np.random.Generator):
+        rng = [rng] * len(planes)
+    sigmas = np.broadcast_to(gaussian_noise, len(planes))
+    for plane, generator, sigma in zip(planes, rng, sigmas):
+        _add_gaussian_noise(plane, sigma, generator)
     return np.clip(image, 0, 1)  # Clip values to stay within [0, 1]
 
 
-def generate_nearfield_image(params):
+def _quantize(image, out=None):
     """
-    Generates a Nearfield image based on specified parameters.
+    Scales an image in [0, 1] to the 16-bit range, in place, and converts it
+    to uint16, writing into `out` when given.
     """
-    canvas_size = config["canvas_size"]
-    return generate_nearfield_image_impl(params, canvas_size)
+    image *= 65535
+    if out is None:
+        return image.astype(np.uint16)
+    np.copyto(out, image, casting="unsafe")
+    return out
 
 
-def generate_nearfield_image_impl(params, canvas_size):
+def render_options(cfg=None):
+    """
+    Collects the rendering options of `generate_nearfield_image_impl` and
+    `generate_nearfield_batch` from a configuration dict.
+
+    Parameters:
+    - cfg (dict or None): Configuration dict; defaults to `config.config`.
+
+    Returns:
+    - dict: Keyword arguments for the image generation functions.
+    """
+    cfg = config if cfg is None else cfg
+    return {
+        "perlin_method": cfg.get("perlin_method", "vectorized"),
+        "rolloff_method": cfg.get("rolloff_method", "analytic"),
+        "rolloff_band": cfg.get("rolloff_band"),
+        "compute_dtype": cfg.get("compute_dtype", "float64"),
+        "fused": cfg.get("fused", False),
+        # Absolute, so datasets can regenerate images from any directory
+        "noise_bank": os.path.abspath(cfg["noise_bank"])
+        if cfg.get("perlin_method") == "bank" else None,
+        "rolloff_cache": {
+            "quantization": cfg.get("rolloff_cache_quantization") or {},
+            "max_bytes": cfg["rolloff_cache_bytes"],
+            "store": os.path.abspath(cfg["rolloff_cache_store"])
+            if cfg.get("rolloff_cache_store") else None,
+        } if cfg.get("rolloff_cache_bytes") else None,
+    }
+
+
+def prepare_worker(canvas_size, options):
+    """
+    Builds the per-process caches and loads the modules a rendering setup
+    needs, so that the first image a pool worker renders is not slower
+    than the others. Meant to run once per worker, from the pool
+    initializer.
+
+    Parameters:
+    - canvas_size (tuple): Size of the images (width, height).
+    - options (dict): Rendering options, see `render_options`.
+    """
+    dtype = np.dtype(options.get("compute_dtype", "float64"))
+    for geometry_dtype in {np.dtype(np.float64), dtype}:
+        get_canvas_geometry(canvas_size, geometry_dtype)
+    if options.get("fused"):
+        get_scratch_buffers(tuple(canvas_size), dtype, 4)
+    erf(np.zeros(1))
+    if options.get("rolloff_method") == "edt":
+        distance_transform_edt(np.ones((1, 1)))
+    if options.get("perlin_method") == "pnoise2":
+        import noise  # noqa: F401  Reference path only
+    if options.get("rolloff_cache"):
+        get_rolloff_cache(options["rolloff_cache"]["max_bytes"],
+                          options["rolloff_cache"]["store"])
+
+
+def generate_nearfield_image(params, timer=NULL_TIMER, rng=None):
+    """
+    Generates a Nearfield image based on specified parameters.
+    """
+    canvas_size = config["canvas_size"]
+    return generate_nearfield_image_impl(params, canvas_size,
+                                         **render_options(), rng=rng,
+                                         timer=timer)
+
+
+def generate_nearfield_image_impl(params, canvas_size,
+                                  perlin_method="vectorized",
+                                  rolloff_method="analytic",
+                                  rolloff_band=None, compute_dtype="float64",
+                                  fused=False, noise_bank=None,
+                                  rolloff_cache=None, rng=None, out=None,
+                                  timer=NULL_TIMER):
     """
     Generates a Nearfield image based on specified parameters.
 
     Parameters:
     - params (dict): Dictionary of parameters for the Nearfield image.
     - canvas_size (tuple): Size of the output image (width, height).
+    - perlin_method (str): Perlin noise backend, see `generate_perlin_noise`.
+    - rolloff_method (str): Roll-off backend, see `create_elliptical_rolloff`.
+    - rolloff_band (float or None): Edge band, see `apply_erf_to_distance`.
+    - compute_dtype (str): Floating point type of the intermediate canvases,
+    "float64" or "float32". float32 halves memory traffic; the difference
+    after uint16 quantization is at most a few counts.
+    - fused (bool): Run all stages in place in a few per-process scratch
+    buffers instead of allocating fresh canvases per stage.
+    - noise_bank (str or None): Noise bank of the "bank" Perlin method.
+    - rolloff_cache (dict or None): Roll-off mask cache settings, see
+    `render_options`; the geometry is then quantized.
+    - rng (numpy Generator or None): Source of the Gaussian noise, normally
+    `src.seeding.image_rng(run_seed, index)` so that the image can be
+    regenerated exactly. None uses the global `np.random` state.
+    - out (numpy array or None): uint16 array to quantize the result into,
+    e.g. a shared-memory slot. A new array is allocated if None.
+    - timer (StageTimer): Optional per-stage timer, see `src.profiling`.
 
     Returns:
     - numpy array: Generated Nearfield image.
     """
+    dtype = np.dtype(compute_dtype)
+    if fused:
+        return _generate_nearfield_fused(params, canvas_size, perlin_method,
+                                         rolloff_method, rolloff_band, dtype,
+                                         noise_bank, rolloff_cache, rng, out,
+                                         timer)
+
     # Step 1: Generate Perlin noise with DC offset
-    perlin_noise = generate_perlin_noise(canvas_size, params["perlin_scale"],
-                                         params["perlin_octaves"],
-                                         params["perlin_persistence"],
-                                         params["perlin_lacunarity"],
-                                         params["perlin_amplitude"])
+    with timer.stage("perlin"):
+        perlin_noise = generate_perlin_noise(canvas_size,
+                                             params["perlin_scale"],
+                                             params["perlin_octaves"],
+                                             params["perlin_persistence"],
+                                             params["perlin_lacunarity"],
+                                             params["perlin_amplitude"],
+                                             method=perlin_method,
+                                             dtype=dtype, bank=noise_bank)
 
     # Step 2: Apply asymmetry
-    perlin_noise = apply_asymmetry(perlin_noise,
-                                   params["asymmetry_x"],
-                                   params["asymmetry_y"])
-
-    # Step 3: Create elliptical mask
-    ellipse_mask = create_elliptical_mask(canvas_size, params["major_axis"],
-                                          params["minor_axis"],
-                                          params["angle_rotation"])
-
-    # Step 4: Apply ERF roll-off to the ellipse mask
-    ellipse_with_rolloff = apply_erf_rolloff(
-        ellipse_mask, params["erf_rolloff"])
+    with timer.stage("asymmetry"):
+        perlin_noise = apply_asymmetry(perlin_noise,
+                                       params["asymmetry_x"],
+                                       params["asymmetry_y"])
+
+    # Steps 3-4: Create elliptical mask with ERF roll-off at the edges
+    if rolloff_cache:
+        ellipse_with_rolloff = _cached_rolloff(
+            canvas_size, params, rolloff_cache, rolloff_method, rolloff_band,
+            timer, dtype)
+    else:
+        ellipse_with_rolloff = create_elliptical_rolloff(
+            canvas_size, params["major_axis"], params["minor_axis"],
+            params["angle_rotation"], params["erf_rolloff"],
+            method=rolloff_method, band=rolloff_band, timer=timer,
+            dtype=dtype)
 
     # Step 5: Apply the mask with roll-off to the image
-    masked_image = perlin_noise * ellipse_with_rolloff
+    with timer.stage("masking"):
+        masked_image = perlin_noise * ellipse_with_rolloff
 
     # Step 6: Apply Gaussian noise
-    final_image = apply_gaussian_noise(masked_image, params["gaussian_noise"])
+    with timer.stage("gaussian_noise"):
+        final_image = apply_gaussian_noise(masked_image,
+                                           params["gaussian_noise"], rng=rng)
+
+    # Scale the final image to 16-bit range and return
+    with timer.stage("quantize"):
+        return _quantize(final_image, out)
+
+
+def generate_nearfield_tile(params, canvas_size, window,
+                            perlin_method="vectorized",
+                            rolloff_method="analytic", rolloff_band=None,
+                            compute_dtype="float64", fused=False,
+                            noise_bank=None, rolloff_cache=None, rng=None,
+                            timer=NULL_TIMER):
+    """
+    Generates one tile of a Nearfield image.
+
+    Every stage is evaluated on the tile only, so memory scales with the
+    tile rather than the canvas; the "edt" roll-off adds a halo around the
+    tile, see `create_elliptical_rolloff`. Apart from the Gaussian noise,
+    which each tile draws from its own generator (see
+    `src.seeding.tile_rng`), a tile equals the same window of the image
+    from `generate_nearfield_image_impl`.
+
+    Parameters:
+    - params (dict): Dictionary of parameters for the Nearfield image.
+    - canvas_size (tuple): Size of the full image (width, height).
+    - window (tuple): (rows, columns) slices of the image array, see
+    `src.tiling.tile_windows`.
+    - perlin_method (str): Perlin noise backend, see `generate_perlin_noise`.
+    - rolloff_method (str): Roll-off backend, see `create_elliptical_rolloff`.
+    - rolloff_band (float or None): Edge band, see `apply_erf_to_distance`.
+    - compute_dtype (str): Floating point type of the tile canvases.
+    - fused (bool): Accepted for symmetry with
+    `generate_nearfield_image_impl`; tiles are small enough not to need it.
+    - noise_bank (str or None): Noise bank of the "bank" Perlin method.
+    - rolloff_cache (dict or None): Roll-off mask cache settings; tiles are
+    not cached, but quantize their geometry like the whole image.
+    - rng (numpy Generator or None): Source of the Gaussian noise.
+    - timer (StageTimer): Optional per-stage timer, see `src.profiling`.
+
+    Returns:
+    - numpy array: uint16 tile of the image.
+    """
+    dtype = np.dtype(compute_dtype)
+
+    # Step 1: Perlin noise with DC offset on the tile
+    with timer.stage("perlin"):
+        tile = generate_perlin_noise(canvas_size, params["perlin_scale"],
+                                     params["perlin_octaves"],
+                                     params["perlin_persistence"],
+                                     params["perlin_lacunarity"],
+                                     params["perlin_amplitude"],
+                                     method=perlin_method, dtype=dtype,
+                                     window=window, bank=noise_bank)
+
+    # Step 2: Asymmetry ramps restricted to the tile
+    with timer.stage("asymmetry"):
+        apply_asymmetry(tile, params["asymmetry_x"], params["asymmetry_y"],
+                        canvas_size=canvas_size, window=window)
+
+    # Steps 3-4: Elliptical roll-off on the tile (plus halo for "edt")
+    if rolloff_cache:
+        rolloff = _cached_rolloff(canvas_size, params, rolloff_cache,
+                                  rolloff_method, rolloff_band, timer, dtype,
+                                  window=window)
+    else:
+        rolloff = create_elliptical_rolloff(
+            canvas_size, params["major_axis"], params["minor_axis"],
+            params["angle_rotation"], params["erf_rolloff"],
+            method=rolloff_method, band=rolloff_band, timer=timer,
+            dtype=dtype, window=window)
+
+    # Step 5: Mask in place
+    with timer.stage("masking"):
+        tile *= rolloff
+    del rolloff
+
+    # Step 6: Gaussian noise
+    with timer.stage("gaussian_noise"):
+        tile = apply_gaussian_noise(tile, params["gaussian_noise"], rng=rng)
+
+    with timer.stage("quantize"):
+        return _quantize(tile)
+
+
+def _generate_nearfield_fused(params, canvas_size, perlin_method,
+                              rolloff_method, rolloff_band, dtype,
+                              noise_bank, rolloff_cache, rng, out, timer):
+    """
+    In-place variant of `generate_nearfield_image_impl`.
+
+    Every stage writes into one of four per-process scratch canvases: the
+    image itself and three work buffers that hold the signed-distance terms
+    and then the roll-off profile. The Gaussian noise is added a block of
+    rows at a time, see `_add_gaussian_noise`. Without `rng`, the noise is
+    drawn from a generator seeded from the global NumPy random state, so
+    `np.random.seed` still makes runs repeatable.
+    """
+    width, height = canvas_size
+    image, work_u, work_v, work_k = get_scratch_buffers((width, height),
+                                                        dtype, 4)
+
+    # Step 1: Perlin noise with DC offset, straight into the image buffer
+    with timer.stage("perlin"):
+        generate_perlin_noise(canvas_size, params["perlin_scale"],
+                              params["perlin_octaves"],
+                              params["perlin_persistence"],
+                              params["perlin_lacunarity"],
+                              params["perlin_amplitude"],
+                              method=perlin_method, out=image,
+                              bank=noise_bank)
+
+    # Step 2: Asymmetry (already in place)
+    with timer.stage("asymmetry"):
+        apply_asymmetry(image, params["asymmetry_x"], params["asymmetry_y"])
+
+    # Steps 3-4: Elliptical roll-off in the work buffers
+    if rolloff_cache:
+        rolloff = _cached_rolloff(canvas_size, params, rolloff_cache,
+                                  rolloff_method, rolloff_band, timer, dtype)
+    elif rolloff_method == "analytic":
+        with timer.stage("signed_distance"):
+            rolloff = _elliptical_signed_distance_into(
+                canvas_size, params["major_axis"], params["minor_axis"],
+                params["angle_rotation"], (work_u, work_v, work_k))
+        with timer.stage("erf"):
+            rolloff *= params["erf_rolloff"]
+            if rolloff_band is None:
+                erf(rolloff, out=rolloff)
+                rolloff += 1
+                rolloff *= 0.5
+            else:
+                edge = np.abs(rolloff) < rolloff_band
+                edge_values = 0.5 * (1 + erf(rolloff[edge]))
+                np.greater(rolloff, 0, out=work_u)
+                rolloff = work_u
+                rolloff[edge] = edge_values
+    else:
+        rolloff = create_elliptical_rolloff(
+            canvas_size, params["major_axis"], params["minor_axis"],
+            params["angle_rotation"], params["erf_rolloff"],
+            method=rolloff_method, band=rolloff_band, timer=timer,
+            dtype=dtype)
+
+    # Step 5: Mask in place
+    with timer.stage("masking"):
+        image *= rolloff
+    del rolloff
+
+    # Step 6: Gaussian noise, drawn like `apply_gaussian_noise`
+    with timer.stage("gaussian_noise"):
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(2 ** 31))
+        _add_gaussian_noise(image, params["gaussian_noise"], rng)
+        np.clip(image, 0, 1, out=image)
 
     # Scale the final image to 16-bit range and return
-    return (final_image * 65535).astype(np.uint16)
+    with timer.stage("quantize"):
+        return _quantize(image, out)
+
+
+def generate_nearfield_batch(param_list, canvas_size,
+                             perlin_method="vectorized",
+                             rolloff_method="analytic", rolloff_band=None,
+                             compute_dtype="float64", fused=False,
+                             noise_bank=None, rolloff_cache=None, rng=None,
+                             out=None, timer=NULL_TIMER):
+    """
+    Generates a batch of Nearfield images in one pass per pipeline stage.
+
+    The per-image parameters are gathered into arrays so that the
+    asymmetry gradients, elliptical roll-off masks, Gaussian noise and
+    quantization each run once over the whole (N, H, W) batch. Perlin noise
+    and the "edt" roll-off still run per image. Peak memory grows linearly
+    with the batch size (a few float64 canvases per image).
+
+    Parameters:
+    - param_list (list of dicts): Parameter sets, one per image.
+    - canvas_size (tuple): Size of the output images (width, height).
+    - perlin_method (str): Perlin noise backend, see `generate_perlin_noise`.
+    - rolloff_method (str): Roll-off backend, see `create_elliptical_rolloff`.
+    - rolloff_band (float or None): Edge band, see `apply_erf_to_distance`.
+    - compute_dtype (str): Floating point type of the batch canvases.
+    - fused (bool): Render the images one at a time with the in-place
+    pipeline of `generate_nearfield_image_impl`, straight into their planes
+    of the output, instead of in one pass per stage over the batch.
+    - noise_bank (str or None): Noise bank of the "bank" Perlin method.
+    - rolloff_cache (dict or None): Roll-off mask cache settings; the masks
+    are then looked up per image instead of rendered for the whole batch.
+    - rng (sequence of numpy Generators or None): One noise generator per
+    image, e.g. `src.seeding.image_rngs(run_seed, start, N)`. Each image then
+    matches its `generate_nearfield_image_impl` rendering with the same
+    generator. None uses the global `np.random` state.
+    - out (numpy array or None): (N, H, W) uint16 array to quantize the
+    batch into, e.g. a shared-memory slot.
+    - timer (StageTimer): Optional per-stage timer, see `src.profiling`.
+
+    Returns:
+    - numpy array: Contiguous (N, H, W) uint16 array of generated images.
+    """
+    width, height = canvas_size
+    if not param_list:
+        return np.empty((0, width, height), dtype=np.uint16) \
+            if out is None else out
+    dtype = np.dtype(compute_dtype)
+    if fused:
+        # One image at a time through the per-process scratch buffers
+        if out is None:
+            out = np.empty((len(param_list), width, height), dtype=np.uint16)
+        rngs = [None] * len(param_list) if rng is None else rng
+        for params, image, generator in zip(param_list, out, rngs):
+            _generate_nearfield_fused(params, canvas_size, perlin_method,
+                                      rolloff_method, rolloff_band, dtype,
+                                      noise_bank, rolloff_cache, generator,
+                                      image, timer)
+        return out
+    columns = {name: np.array([params[name] for params in param_list])
+               for name in param_list[0]}
+
+    # Step 1: Generate Perlin noise with DC offset, one image at a time
+    batch = np.empty((len(param_list), width, height), dtype=dtype)
+    with timer.stage("perlin"):
+        for image, params in zip(batch, param_list):
+            generate_perlin_noise(canvas_size, params["perlin_scale"],
+                                  params["perlin_octaves"],
+                                  params["perlin_persistence"],
+                                  params["perlin_lacunarity"],
+                                  params["perlin_amplitude"],
+                                  method=perlin_method, out=image,
+                                  bank=noise_bank)
+
+    # Step 2: Apply asymmetry to the whole batch
+    with timer.stage("asymmetry"):
+        apply_asymmetry(batch, columns["asymmetry_x"], columns["asymmetry_y"])
+
+    # Steps 3-4: Elliptical masks with ERF roll-off
+    if rolloff_cache:
+        rolloff = np.stack([
+            _cached_rolloff(canvas_size, params, rolloff_cache,
+                            rolloff_method, rolloff_band, timer, dtype)
+            for params in param_list])
+    elif rolloff_method == "analytic":
+        rolloff = create_elliptical_rolloff(
+            canvas_size, columns["major_axis"], columns["minor_axis"],
+            columns["angle_rotation"], columns["erf_rolloff"],
+            method=rolloff_method, band=rolloff_band, timer=timer,
+            dtype=dtype)
+    else:
+        rolloff = np.stack([
+            create_elliptical_rolloff(canvas_size, params["major_axis"],
+                                      params["minor_axis"],
+                                      params["angle_rotation"],
+                                      params["erf_rolloff"],
+                                      method=rolloff_method, band=rolloff_band,
+                                      timer=timer, dtype=dtype)
+            for params in param_list])
+
+    # Step 5: Apply the masks with roll-off to the images
+    with timer.stage("masking"):
+        batch *= rolloff
+    del rolloff
+
+    # Step 6: Apply Gaussian noise
+    with timer.stage("gaussian_noise"):
+        batch = apply_gaussian_noise(batch, columns["gaussian_noise"],
+                                     rng=rng)
+
+    # Scale the final images to 16-bit range and return
+    with timer.stage("quantize"):
+        return _quantize(batch, out)
+
+
+def pyramid_sizes(canvas_size, sizes):
+    """
+    Normalizes the requested levels of an image pyramid.
+
+    Parameters:
+    - canvas_size (tuple): Size of the full image (width, height).
+    - sizes (iterable): Level sizes as (width, height) tuples, or as widths
+    that keep the aspect ratio of the canvas.
+
+    Returns:
+    - list of tuples: (width, height) of each level, in the given order.
+
+    Raises:
+    - ValueError: If a level does not shrink the canvas by an integer
+    factor along both axes.
+    """
+    width, height = canvas_size
+    levels = []
+    for size in sizes or ():
+        if np.ndim(size) == 0:
+            size = (int(size), height * int(size) // width)
+        size = tuple(int(edge) for edge in size)
+        if min(size) < 1 or width % size[0] or height % size[1]:
+            raise ValueError(f"Pyramid level {size} does not divide the "
+                             f"canvas {tuple(canvas_size)} evenly")
+        levels.append(size)
+    return levels
+
+
+def downsample_pyramid(image, sizes):
+    """
+    Downsamples an image to every level of a pyramid.
+
+    Each level is the average over the block of pixels it covers (area
+    interpolation), which filters out the frequencies the smaller grid
+    cannot hold. Levels are computed from the next larger level they
+    divide, so the full image is only read once.
+
+    Parameters:
+    - image (numpy array): (width, height) uint16 image.
+    - sizes (list of tuples): Levels from `pyramid_sizes`.
+
+    Returns:
+    - list of numpy arrays: uint16 image per level, in the order of `sizes`.
+    """
+    full = image.astype(np.float32)
+    levels = {}
+    source = full
+    for size in sorted(set(sizes), key=lambda size: -size[0] * size[1]):
+        if source.shape[0] % size[0] or source.shape[1] % size[1]:
+            source = full
+        factor_x = source.shape[0] // size[0]
+        factor_y = source.shape[1] // size[1]
+        source = source.reshape(size[0], factor_x, size[1], factor_y) \
+            .mean(axis=(1, 3), dtype=np.float32)
+        levels[size] = np.rint(source).astype(np.uint16)
+    return [levels[size] for size in sizes]
+
+
+def generate_nearfield_pyramid(params, canvas_size, sizes, **options):
+    """
+    Renders a Nearfield image once at full resolution and returns it along
+    with the downsampled levels of `sizes`.
+
+    Parameters:
+    - params (dict): Dictionary of parameters for the Nearfield image.
+    - canvas_size (tuple): Size of the full image (width, height).
+    - sizes (iterable): Level sizes, see `pyramid_sizes`.
+    - options: Rendering options of `generate_nearfield_image_impl`.
+
+    Returns:
+    - list of numpy arrays: The full image followed by one uint16 image
+    per level.
+    """
+    image = generate_nearfield_image_impl(params, canvas_size, **options)
+    return [image, *downsample_pyramid(image,
+                                       pyramid_sizes(canvas_size, sizes))]
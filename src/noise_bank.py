@@ -0,0 +1,226 @@
+# noise_bank.py
+
+import itertools
+import json
+import os
+import zlib
+import numpy as np
+from src.perlin import pnoise2_grid
+
+# Storage type of the bank textures (what `pnoise2_grid` evaluates in)
+NOISE_BANK_DTYPE = np.float32
+
+# Texture edge lengths are rounded down to a multiple of this
+TEXTURE_ALIGNMENT = 16
+
+# Noise parameters that select a texture, in bank order. Octaves are kept
+# exact; the others are quantized to the centres of evenly spaced bins.
+BANK_PARAMS = ("perlin_scale", "perlin_octaves", "perlin_persistence",
+               "perlin_lacunarity")
+
+# Banks opened by the current process, by path
+_open_banks = {}
+
+
+def bank_layout(parameter_ranges, bins):
+    """
+    Returns the parameter values the textures of a bank are rendered with.
+
+    Parameters:
+    - parameter_ranges (dict): Sampling ranges, see `config.py`.
+    - bins (dict): Number of bins per quantized parameter, e.g.
+    {"perlin_scale": 4, "perlin_persistence": 2, "perlin_lacunarity": 2}.
+
+    Returns:
+    - dict: Sorted list of values per parameter of `BANK_PARAMS`; the bank
+    holds one texture per combination.
+    """
+    layout = {}
+    for name in BANK_PARAMS:
+        low, high = parameter_ranges[name]
+        if name == "perlin_octaves":
+            layout[name] = list(range(int(low), int(high) + 1))
+            continue
+        count = int(bins.get(name, 1))
+        layout[name] = [low + (i + 0.5) * (high - low) / count
+                        for i in range(count)]
+    return layout
+
+
+def texture_edge(canvas_size, num_textures, texture_size=None,
+                 max_bytes=1 << 30):
+    """
+    Returns the edge length of the square bank textures.
+
+    Without an explicit `texture_size`, textures are twice the canvas edge
+    or as large as `max_bytes` allows, whichever is smaller.
+
+    Raises:
+    - ValueError: If textures that still hold a rotated canvas exceed
+    `max_bytes`.
+    """
+    itemsize = np.dtype(NOISE_BANK_DTYPE).itemsize
+    fitting = int((max_bytes / (num_textures * itemsize)) ** 0.5)
+    fitting -= fitting % TEXTURE_ALIGNMENT
+    edge = texture_size or min(2 * max(canvas_size), fitting)
+    if edge < max(canvas_size) or edge > fitting:
+        raise ValueError(
+            f"A noise bank of {num_textures} textures of at least "
+            f"{max(canvas_size)}x{max(canvas_size)} exceeds "
+            f"noise_bank_max_bytes={max_bytes}; use fewer noise_bank_bins "
+            f"or a larger cap")
+    return edge
+
+
+def _render_texture(path, number, edge, scale, octaves, persistence,
+                    lacunarity):
+    """
+    Renders texture `number` of a bank being built at `path`. Runs in a
+    pool worker, which writes straight into the memory map.
+    """
+    textures = np.load(path, mmap_mode="r+")
+    coordinates = np.arange(edge, dtype=np.float32) / np.float32(scale)
+    pnoise2_grid(coordinates[:, np.newaxis], coordinates[np.newaxis],
+                 octaves=octaves, persistence=persistence,
+                 lacunarity=lacunarity, out=textures[number])
+    textures.flush()
+    return number
+
+
+def build_noise_bank(path, canvas_size, parameter_ranges, bins,
+                     texture_size=None, max_bytes=1 << 30, executor=None):
+    """
+    Builds the noise bank at `path`, unless a bank with the same settings
+    is already there.
+
+    The textures are stored as one (T, edge, edge) float32 `.npy` memory
+    map, with the settings in a `.json` sidecar written last, so an
+    interrupted build is never mistaken for a complete bank.
+
+    Parameters:
+    - path (str): Path of the bank's `.npy` file.
+    - canvas_size (tuple): Size of the images (width, height).
+    - parameter_ranges (dict): Sampling ranges, see `config.py`.
+    - bins (dict): Bins per quantized parameter, see `bank_layout`.
+    - texture_size (int or None): Texture edge length, see `texture_edge`.
+    - max_bytes (int): Cap on the size of the bank.
+    - executor (Executor or None): Pool to render the textures in.
+
+    Returns:
+    - tuple: (metadata dict, whether the bank was built).
+    """
+    layout = bank_layout(parameter_ranges, bins)
+    shape = tuple(len(values) for values in layout.values())
+    num_textures = int(np.prod(shape))
+    edge = texture_edge(canvas_size, num_textures, texture_size, max_bytes)
+    metadata = {"layout": layout, "edge": edge,
+                "dtype": np.dtype(NOISE_BANK_DTYPE).str}
+    try:
+        with open(f"{path}.json") as file:
+            if json.load(file) == metadata and os.path.isfile(path):
+                return metadata, False
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary = f"{path}.tmp.npy"
+    store = np.lib.format.open_memmap(temporary, mode="w+",
+                                      dtype=NOISE_BANK_DTYPE,
+                                      shape=(num_textures, edge, edge))
+    del store
+    # Texture numbers follow the row-major order of `np.ravel_multi_index`
+    tasks = [(temporary, number, edge, *settings)
+             for number, settings in enumerate(
+                 itertools.product(*layout.values()))]
+    if executor is None:
+        for task in tasks:
+            _render_texture(*task)
+    else:
+        list(executor.map(_render_texture, *zip(*tasks)))
+    _open_banks.pop(os.path.abspath(path), None)
+    os.replace(temporary, path)
+    with open(f"{path}.json.tmp", "w") as file:
+        json.dump(metadata, file)
+    os.replace(f"{path}.json.tmp", f"{path}.json")
+    return metadata, True
+
+
+def build_configured_bank(cfg, executor=None):
+    """
+    Builds or reuses the noise bank a configuration dict selects, see
+    `build_noise_bank` and the `noise_bank*` keys of `config.py`.
+
+    Returns:
+    - tuple: (metadata dict, whether the bank was built).
+    """
+    return build_noise_bank(
+        cfg["noise_bank"], cfg["canvas_size"], cfg["parameter_ranges"],
+        cfg.get("noise_bank_bins", {}),
+        texture_size=cfg.get("noise_bank_texture_size"),
+        max_bytes=cfg.get("noise_bank_max_bytes", 1 << 30),
+        executor=executor)
+
+
+def open_noise_bank(path):
+    """
+    Opens a bank read-only, once per process; the memory map lets all pool
+    workers share the textures through the page cache.
+
+    Returns:
+    - tuple: (textures memmap of shape (T, edge, edge), metadata dict).
+    """
+    path = os.path.abspath(path)
+    bank = _open_banks.get(path)
+    if bank is None:
+        with open(f"{path}.json") as file:
+            metadata = json.load(file)
+        bank = (np.load(path, mmap_mode="r"), metadata)
+        _open_banks[path] = bank
+    return bank
+
+
+def bank_noise(path, canvas_size, scale, octaves, persistence, lacunarity,
+               window=None):
+    """
+    Returns fractal noise for one image from the bank: a crop of the
+    texture of the nearest bin, flipped and rotated by a multiple of 90
+    degrees.
+
+    The crop is drawn from a generator seeded with the noise parameters, so
+    an image gets the same noise whether it is rendered whole, batched or
+    in tiles, while images with different parameters get independent
+    crops.
+
+    Parameters:
+    - path (str): Path of the bank, see `build_noise_bank`.
+    - canvas_size (tuple): Size of the canvas (width, height).
+    - scale, octaves, persistence, lacunarity (float): Noise parameters of
+    the image.
+    - window (tuple or None): (rows, columns) slices of the canvas.
+
+    Returns:
+    - numpy array: float32 read-only view of the bank, of shape
+    (width, height) or the window's shape. Noise without amplitude or
+    offset, like `src.perlin.pnoise2_grid`.
+    """
+    textures, metadata = open_noise_bank(path)
+    values = (scale, octaves, persistence, lacunarity)
+    index = [int(np.abs(np.asarray(centres) - value).argmin())
+             for centres, value in zip(metadata["layout"].values(), values)]
+    texture = textures[np.ravel_multi_index(
+        index, [len(centres) for centres in metadata["layout"].values()])]
+
+    seed = zlib.crc32(np.asarray(values, dtype=np.float64).tobytes())
+    rng = np.random.default_rng(seed)
+    turns, flip = rng.integers(4), rng.integers(2)
+    width, height = canvas_size
+    rows, columns = (height, width) if turns % 2 else (width, height)
+    edge = metadata["edge"]
+    top = rng.integers(edge - rows + 1)
+    left = rng.integers(edge - columns + 1)
+
+    crop = texture[top:top + rows, left:left + columns]
+    if flip:
+        crop = crop[:, ::-1]
+    crop = np.rot90(crop, turns)
+    return crop if window is None else crop[window]
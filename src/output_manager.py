@@ -1,8 +1,16 @@
 # output_manager.py
 
+import io
 import os
 import csv
-from tifffile import imwrite
+import json
+import threading
+import zlib
+import numpy as np
+from tifffile import imread, imwrite, TiffWriter as TiffFileWriter
+from src.image_generator import downsample_pyramid
+from src.tiling import tile_windows
+from src.parameter_sampler import ParameterTable
 from config import config  # Import configuration for potential usage in file paths
 
 def create_output_folder(base_folder):
@@ -19,7 +27,68 @@ def create_output_folder(base_folder):
     os.makedirs(output_folder, exist_ok=True)
     return output_folder
 
-def save_image(image, filename, output_folder):
+def image_filename(index):
+    """
+    Returns the TIFF filename of the image with the given (0-based) index.
+
+    Parameters:
+    - index (int): Index of the image in the run.
+
+    Returns:
+    - str: Filename such as 'nearfield_image_001.tiff'.
+    """
+    return f"nearfield_image_{index + 1:03}.tiff"
+
+def stack_filename(stack):
+    """
+    Returns the filename of the multi-page TIFF holding the given (0-based)
+    stack of images.
+    """
+    return f"nearfield_stack_{stack + 1:03}.tiff"
+
+def tiff_options(compression=None, predictor=False, level=None,
+                 layout="strip", tile_size=256, rowsperstrip=None):
+    """
+    Builds the `tifffile.imwrite` keyword arguments of an encoding setup and
+    checks that it is usable, so a bad setting fails before any rendering.
+
+    Parameters:
+    - compression (str or None): Codec, e.g. "zlib", "lzma", "zstd" or
+    "lzw". None stores the pixels uncompressed. zstd and LZW need the
+    optional `imagecodecs` package.
+    - predictor (bool): Apply horizontal differencing before compressing,
+    which suits the smooth images well.
+    - level (int or None): Compression level; None uses the codec default.
+    - layout (str): "strip" or "tile".
+    - tile_size (int): Edge length of the TIFF tiles, a multiple of 16.
+    - rowsperstrip (int or None): Rows per strip; None lets tifffile choose.
+
+    Returns:
+    - dict: Keyword arguments for `imwrite`.
+    """
+    options = {}
+    if compression is not None:
+        options["compression"] = compression
+        if predictor:
+            options["predictor"] = True
+        if level is not None:
+            options["compressionargs"] = {"level": level}
+    if layout == "tile":
+        options["tile"] = (tile_size, tile_size)
+    elif layout == "strip":
+        if rowsperstrip is not None:
+            options["rowsperstrip"] = rowsperstrip
+    else:
+        raise ValueError(f"Unknown TIFF layout: {layout}")
+
+    try:
+        imwrite(io.BytesIO(), np.zeros((16, 16), dtype=np.uint16), **options)
+    except (KeyError, ValueError, ImportError) as e:
+        raise ValueError(f"Unusable TIFF options {options}: {e} (zstd and "
+                         f"LZW need the imagecodecs package)") from e
+    return options
+
+def save_image(image, filename, output_folder, **options):
     """
     Saves an image to a TIFF file.
 
@@ -27,9 +96,29 @@ def save_image(image, filename, output_folder):
     - image (numpy array): Image data to be saved.
     - filename (str): Name of the output file.
     - output_folder (str): Path to the folder where the image will be saved.
+    - options: Encoding options from `tiff_options`.
     """
     filepath = os.path.join(output_folder, filename)
-    imwrite(filepath, image, dtype='uint16')
+    imwrite(filepath, image, dtype='uint16', **options)
+
+def save_pyramid(images, filename, output_folder, **options):
+    """
+    Saves an image and its downsampled levels to one pyramidal TIFF file;
+    the levels are stored as reduced-resolution SubIFDs of the first page
+    and read back with `imread(path, level=k)`.
+
+    Parameters:
+    - images (list of numpy arrays): Full image followed by its levels.
+    - filename (str): Name of the output file.
+    - output_folder (str): Path to the folder where the image will be saved.
+    - options: Encoding options from `tiff_options`.
+    """
+    filepath = os.path.join(output_folder, filename)
+    with TiffFileWriter(filepath) as tiff:
+        tiff.write(images[0], dtype='uint16', subifds=len(images) - 1,
+                   **options)
+        for level in images[1:]:
+            tiff.write(level, dtype='uint16', subfiletype=1, **options)
 
 def log_parameters(csv_path, filename, params):
     """
@@ -47,6 +136,879 @@ def log_parameters(csv_path, filename, params):
             writer.writeheader()
         writer.writerow({"filename": filename, **params})
 
+class ParameterLogger:
+    """
+    Single-writer parameter log for a run.
+
+    Workers only return their results; the parent process owns one logger
+    and records every image through it. Rows are held in a small reorder
+    buffer and written in image-index order, in batches, through a file
+    handle that stays open for the whole run. Images that will never be
+    logged (failed ones) are marked with `skip`, so the rows after them
+    do not wait for them. When more than `max_pending` rows wait for an
+    earlier image (e.g. with the "cost" schedule, which dispatches images
+    out of index order), the oldest of them are written out of order.
+    Columnar logs are sorted when they are written; CSV rows keep their
+    "index" column, by which `read_parameter_log` sorts them.
+
+    Parameters:
+    - path (str): Output path; the extension is chosen by `fmt` if missing.
+    - fmt (str): "csv" (streamed), "npz", "npy" (structured array) or
+    "parquet" (columnar, written on close). Parquet requires pandas with a
+    Parquet engine.
+    - flush_every (int): Number of ready rows buffered before a CSV write.
+    - max_pending (int): Most rows held back waiting for an earlier image.
+    """
+
+    formats = ("csv", "npz", "npy", "parquet")
+
+    def __init__(self, path, fmt="csv", flush_every=256, max_pending=256):
+        if fmt not in self.formats:
+            raise ValueError(f"Unknown parameter log format: {fmt}")
+        root, ext = os.path.splitext(path)
+        self.path = path if ext == f".{fmt}" else f"{root}.{fmt}"
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self.max_pending = max_pending
+        self._pending = {}  # index -> (filename, params) or None (skipped)
+        self._ready = []  # rows to write at the next flush
+        self._next_index = 0
+        self._columns = None
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def log(self, index, filename, params):
+        """
+        Records the parameters of one image.
+
+        Parameters:
+        - index (int): Index of the image in the run.
+        - filename (str): Filename of the image.
+        - params (dict): Dictionary of parameters used for the image.
+        """
+        if index < self._next_index:
+            # Later rows were already written out of order
+            self._ready.append((index, filename, params))
+        else:
+            self._pending[index] = (filename, params)
+        self._advance()
+
+    def skip(self, index):
+        """
+        Marks an image that will not be logged, e.g. because it failed.
+
+        Parameters:
+        - index (int): Index of the image in the run.
+        """
+        if index >= self._next_index:
+            self._pending.setdefault(index, None)
+            self._advance()
+
+    def _advance(self):
+        # Moves the rows whose predecessors are all logged or skipped to
+        # the ready list, then gives up on the missing predecessors of the
+        # oldest rows while more than max_pending rows are held back
+        while True:
+            while self._next_index in self._pending:
+                row = self._pending.pop(self._next_index)
+                if row is not None:
+                    self._ready.append((self._next_index, *row))
+                self._next_index += 1
+            if len(self._pending) <= self.max_pending:
+                break
+            self._next_index = min(self._pending)
+        if len(self._ready) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes or stages all rows that are ready, in index order.
+        """
+        rows, self._ready = self._ready, []
+        if not rows:
+            return
+        if self.fmt == "csv":
+            self._write_csv(rows)
+        else:
+            self._append_columns(rows)
+
+    def close(self):
+        """
+        Writes every remaining row, sorted by index, and closes the log.
+        """
+        self._ready.extend((index, *self._pending[index])
+                           for index in sorted(self._pending)
+                           if self._pending[index] is not None)
+        self._pending.clear()
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        elif self._columns is not None:
+            # Columnar logs are written at once, so rows logged out of
+            # order are sorted back
+            order = np.argsort(self._columns["index"], kind="stable")
+            columns = {name: [values[i] for i in order]
+                       for name, values in self._columns.items()}
+            if self.fmt == "npz":
+                np.savez(self.path, **{name: np.asarray(values)
+                                       for name, values in columns.items()})
+            elif self.fmt == "npy":
+                np.save(self.path, columns_to_structured(columns))
+            elif self.fmt == "parquet":
+                import pandas as pd  # Optional dependency
+                pd.DataFrame(columns).to_parquet(self.path, index=False)
+        self._columns = None
+
+    def _write_csv(self, rows):
+        if self._writer is None:
+            self._file = open(self.path, mode='w', newline='')
+            fieldnames = ["index", "filename"] + list(rows[0][2].keys())
+            self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+            self._writer.writeheader()
+        self._writer.writerows({"index": index, "filename": filename, **params}
+                               for index, filename, params in rows)
+        self._file.flush()
+
+    def _append_columns(self, rows):
+        if self._columns is None:
+            self._columns = {name: [] for name in
+                             ["index", "filename"] + list(rows[0][2].keys())}
+        for index, filename, params in rows:
+            self._columns["index"].append(index)
+            self._columns["filename"].append(filename)
+            for name, value in params.items():
+                self._columns[name].append(value)
+
+def columns_to_structured(columns):
+    """
+    Packs equally long columns into a NumPy structured array.
+
+    Parameters:
+    - columns (dict): Column name -> sequence of values.
+
+    Returns:
+    - numpy structured array: One record per row, one field per column.
+    """
+    arrays = {name: np.asarray(values) for name, values in columns.items()}
+    table = np.empty(len(next(iter(arrays.values()), [])),
+                     dtype=[(name, array.dtype)
+                            for name, array in arrays.items()])
+    for name, array in arrays.items():
+        table[name] = array
+    return table
+
+def _parse_csv_value(text):
+    """
+    Converts a CSV cell back to the int, float or str it was written from.
+    """
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def read_parameter_log(path):
+    """
+    Reads a parameter log written by `ParameterLogger`, in any format.
+
+    Parameters:
+    - path (str): Path to the log, including its extension.
+
+    Returns:
+    - list of dicts: One row per image, sorted by index, with the "index"
+    and "filename" columns followed by the image parameters.
+    """
+    fmt = os.path.splitext(path)[1].lstrip(".")
+    if fmt == "csv":
+        with open(path, newline='') as file:
+            rows = [{name: _parse_csv_value(value)
+                     for name, value in row.items()}
+                    for row in csv.DictReader(file)]
+    elif fmt in ("npz", "npy"):
+        if fmt == "npz":
+            with np.load(path) as archive:
+                columns = {name: archive[name] for name in archive.files}
+        else:
+            table = np.load(path)
+            columns = {name: table[name] for name in table.dtype.names}
+        names = list(columns)
+        rows = [dict(zip(names, values)) for values in
+                zip(*(columns[name].tolist() for name in names))]
+    elif fmt == "parquet":
+        import pandas as pd  # Optional dependency
+        rows = pd.read_parquet(path).to_dict(orient="records")
+    else:
+        raise ValueError(f"Unknown parameter log format: {fmt}")
+    return sorted(rows, key=lambda row: row["index"])
+
+def _write_atomically(path, write):
+    """
+    Calls `write(file)` on a temporary file that then replaces `path`, so
+    that readers never see a partially written file.
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+def write_manifest(output_folder, manifest):
+    """
+    Writes the manifest of a run (seed, config snapshot, rendering options,
+    file names) to `manifest.json`. It is written before generation starts
+    and is all `main --resume` and `NearfieldDataset` need besides the
+    parameter table.
+
+    Parameters:
+    - output_folder (str): Folder of the run.
+    - manifest (dict): JSON-serializable run settings.
+
+    Returns:
+    - str: Path of the written file.
+    """
+    path = os.path.join(output_folder, "manifest.json")
+    data = json.dumps(manifest, indent=2).encode()
+    _write_atomically(path, lambda file: file.write(data))
+    return path
+
+def read_manifest(output_folder):
+    """
+    Reads the `manifest.json` written by `write_manifest`.
+
+    Returns:
+    - dict: Run settings.
+    """
+    with open(os.path.join(output_folder, "manifest.json")) as file:
+        return json.load(file)
+
+def write_parameter_table(path, parameter_sets):
+    """
+    Persists the parameter sets of every image of a run, by index, as a
+    structured `.npy` array.
+
+    Parameters:
+    - path (str): Path of the `.npy` table.
+    - parameter_sets (structured array, ParameterTable or list of dicts):
+    Parameter set of every image.
+    """
+    if isinstance(parameter_sets, ParameterTable):
+        parameter_sets = parameter_sets.table
+    if isinstance(parameter_sets, np.ndarray):
+        table = parameter_sets
+    else:
+        columns = {name: [params[name] for params in parameter_sets]
+                   for name in (parameter_sets[0] if parameter_sets else {})}
+        table = columns_to_structured(columns)
+    _write_atomically(path, lambda file: np.save(file, table))
+
+def read_parameter_table(path):
+    """
+    Reads a table written by `write_parameter_table`.
+
+    Returns:
+    - ParameterTable: Parameter set of every image, as dicts of Python
+    scalars on access.
+    """
+    return ParameterTable(np.load(path))
+
+def image_checksum(image, tile_size=None, value=0):
+    """
+    Returns the CRC-32 of the pixel data of an image.
+
+    Parameters:
+    - image (numpy array): uint16 image.
+    - tile_size (int or None): For tiled images, the checksum runs over the
+    tiles in `src.tiling.tile_windows` order, which is how the tiles are
+    streamed to the writer.
+    - value (int): Running checksum to continue from.
+
+    Returns:
+    - int: CRC-32 value.
+    """
+    if tile_size:
+        for window in tile_windows(image.shape, tile_size):
+            value = image_checksum(image[window], value=value)
+        return value
+    return zlib.crc32(np.ascontiguousarray(image), value)
+
+def _ends_mid_line(path):
+    """
+    Returns whether a non-empty text file lacks a trailing newline.
+    """
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() == 0:
+            return False
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) != b"\n"
+
+class CompletionLog:
+    """
+    Append-only record of the images of a run that were stored
+    successfully, one `index,name,size,crc32` line per image.
+
+    Each line is flushed as soon as the image is stored, so after a crash
+    the log lists exactly the images that do not need to be generated again.
+
+    Parameters:
+    - path (str): Path of the completion log; existing lines are kept.
+    """
+
+    fieldnames = ["index", "name", "size", "crc32"]
+
+    def __init__(self, path):
+        self.path = path
+        new = not os.path.isfile(path)
+        torn = not new and _ends_mid_line(path)
+        self._file = open(path, mode='a', newline='')
+        self._writer = csv.writer(self._file)
+        if new:
+            self._writer.writerow(self.fieldnames)
+        elif torn:
+            self._file.write("\r\n")  # Terminate a line cut off by a crash
+        self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, index, name, size, checksum):
+        """
+        Marks image `index` as stored under `name`, with the stored size in
+        bytes and the CRC-32 of its pixels (see `image_checksum`).
+        """
+        self._writer.writerow([index, name, size, checksum])
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def read_completion_log(path):
+    """
+    Reads a `CompletionLog`, ignoring a truncated last line.
+
+    Returns:
+    - dict: Image index -> {"name", "size", "crc32"}; later lines win.
+    """
+    if not os.path.isfile(path):
+        return {}
+    records = {}
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            try:
+                records[int(row["index"])] = {"name": row["name"],
+                                              "size": int(row["size"]),
+                                              "crc32": int(row["crc32"])}
+            except (TypeError, ValueError):
+                continue  # Partially written line from an interrupted run
+    return records
+
+def verify_outputs(writer, records, checksum=False, tile_size=None):
+    """
+    Checks which recorded images are still intact in the output backend.
+
+    By default only the stored size is compared, which costs one `stat`
+    per image. With `checksum`, every image is read back and its pixel
+    CRC-32 compared as well.
+
+    Parameters:
+    - writer (ImageWriter): Output backend of the run.
+    - records (dict): Completion records from `read_completion_log`.
+    - checksum (bool): Also compare pixel checksums.
+    - tile_size (int or None): Tile size the run was rendered with.
+
+    Returns:
+    - set of int: Indices whose output is intact.
+    """
+    intact = set()
+    for index, record in records.items():
+        if writer.stored_size(index, record["name"]) != record["size"]:
+            continue
+        if checksum:
+            try:
+                image = writer.read(index, record["name"])
+            except Exception:
+                continue
+            if image_checksum(image, tile_size) != record["crc32"]:
+                continue
+        intact.add(index)
+    # Images stored together are only kept if their whole group is, since
+    # regenerating one member rewrites the group's file
+    return {index for index in intact
+            if all(member in intact for member in writer.group(index))}
+
+class RunRecorder:
+    """
+    Records each stored image of a run, from the parent process, in both the
+    parameter log and the completion log, and accumulates the figures of the
+    output summary.
+
+    An image only enters the completion log once the writer reports it as
+    durable; images buffered into a stack wait until the stack is written.
+
+    Parameters:
+    - parameter_sets (list of dicts): Parameter set of every image.
+    - logger (ParameterLogger): Parameter log of the run.
+    - completion_log (CompletionLog): Completion log of the run.
+    - writer (ImageWriter): Output backend, for the stored sizes.
+    """
+
+    def __init__(self, parameter_sets, logger, completion_log, writer):
+        self.parameter_sets = parameter_sets
+        self.logger = logger
+        self.completion_log = completion_log
+        self.writer = writer
+        self.images = 0
+        self.written = 0
+        self.write_seconds = 0.0
+        self._held = {}
+
+    def record(self, index, name, checksum, write_seconds=None):
+        """
+        Logs a newly stored image and marks it as complete.
+
+        Parameters:
+        - index (int): Index of the image in the run.
+        - name (str): Name under which the image was stored.
+        - checksum (int): Pixel checksum of the image.
+        - write_seconds (float or None): Time spent encoding and writing it.
+        """
+        self.logger.log(index, name, self.parameter_sets[index])
+        self.images += 1
+        self.written += 1
+        if write_seconds is not None:
+            self.write_seconds += write_seconds
+        group = self.writer.group(index).start
+        self._held.setdefault(group, []).append((index, name, checksum))
+        if self.writer.durable(index):
+            for held_index, held_name, held_checksum in self._held.pop(group):
+                self.completion_log.record(
+                    held_index, held_name,
+                    self.writer.stored_size(held_index, held_name),
+                    held_checksum)
+
+    def restore(self, index, name):
+        """
+        Logs an image completed by an earlier, interrupted attempt.
+        """
+        self.logger.log(index, name, self.parameter_sets[index])
+        self.images += 1
+
+    def skip(self, indices):
+        """
+        Notes images that failed, so the parameter log does not wait for
+        them; they stay out of the completion log.
+
+        Parameters:
+        - indices (iterable of int): Indices of the failed images.
+        """
+        for index in indices:
+            self.logger.skip(index)
+
+    def summary(self, image_nbytes):
+        """
+        Returns the storage figures of the run.
+
+        Parameters:
+        - image_nbytes (int): Uncompressed size of one image in bytes.
+
+        Returns:
+        - dict: Images stored, bytes on disk, uncompressed bytes, their
+        ratio, and the time spent encoding and writing the images of this
+        attempt.
+        """
+        stored = self.writer.stored_bytes()
+        raw = self.images * image_nbytes
+        return {"images": self.images,
+                "bytes_stored": stored,
+                "bytes_uncompressed": raw,
+                "compression_ratio": raw / stored if stored else None,
+                "write_seconds": self.write_seconds,
+                "write_seconds_per_image":
+                    self.write_seconds / self.written if self.written
+                    else None}
+
+class ImageWriter:
+    """
+    Base class of the image output backends.
+
+    A writer is created once in the parent process and may be pickled into
+    pool workers, which then write disjoint images through it.
+    """
+
+    def write(self, index, image):
+        """
+        Stores one image.
+
+        Parameters:
+        - index (int): Index of the image in the run.
+        - image (numpy array): uint16 image data.
+
+        Returns:
+        - str: Name under which the image was stored (for the parameter log).
+        """
+        raise NotImplementedError
+
+    def write_tiles(self, index, tiles, canvas_size, tile_size):
+        """
+        Stores one image given as a stream of tiles, without assembling it
+        in memory.
+
+        Parameters:
+        - index (int): Index of the image in the run.
+        - tiles (iterable of numpy arrays): uint16 tiles in
+        `src.tiling.tile_windows` order.
+        - canvas_size (tuple): Size of the full image (width, height).
+        - tile_size (int): Edge length of the tiles.
+
+        Returns:
+        - str: Name under which the image was stored (for the parameter log).
+        """
+        raise NotImplementedError
+
+    def stored_size(self, index, name):
+        """
+        Returns the number of bytes stored for image `index` under `name`,
+        or None if it is missing. Must be cheap; used to verify outputs.
+        """
+        raise NotImplementedError
+
+    def read(self, index, name, level=0):
+        """
+        Reads image `index`, stored under `name`, back from the backend;
+        `level` k > 0 selects the k-th pyramid level instead.
+        """
+        raise NotImplementedError
+
+    def group(self, index):
+        """
+        Returns the indices stored together with image `index`, which are
+        written, verified and regenerated as a unit.
+        """
+        return range(index, index + 1)
+
+    def durable(self, index):
+        """
+        Returns whether image `index` has reached storage (rather than a
+        buffer of the writer).
+        """
+        return True
+
+    def stored_bytes(self):
+        """
+        Returns the total number of bytes the backend holds on disk.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Flushes pending data. Called once, in the parent, at the end.
+        """
+
+def _tiff_bytes(output_folder):
+    """
+    Returns the total size of the TIFF files in a folder.
+    """
+    return sum(entry.stat().st_size for entry in os.scandir(output_folder)
+               if entry.name.endswith(".tiff") and entry.is_file())
+
+class TiffWriter(ImageWriter):
+    """
+    Writes one TIFF file per image into an output folder.
+
+    Parameters:
+    - output_folder (str): Folder of the run.
+    - options (dict or None): Encoding options from `tiff_options`.
+    - levels (list of tuples): Pyramid levels stored along with each image,
+    see `src.image_generator.pyramid_sizes`.
+    """
+
+    def __init__(self, output_folder, options=None, levels=()):
+        self.output_folder = output_folder
+        self.options = dict(options or {})
+        self.levels = list(levels)
+
+    def write(self, index, image):
+        filename = image_filename(index)
+        if self.levels:
+            save_pyramid([image, *downsample_pyramid(image, self.levels)],
+                         filename, self.output_folder, **self.options)
+        else:
+            save_image(image, filename, self.output_folder, **self.options)
+        return filename
+
+    def write_tiles(self, index, tiles, canvas_size, tile_size):
+        # Tiles are consumed as they arrive and stored as TIFF tiles, so the
+        # strip settings of the layout do not apply
+        options = {key: value for key, value in self.options.items()
+                   if key not in ("tile", "rowsperstrip")}
+        filename = image_filename(index)
+        imwrite(os.path.join(self.output_folder, filename), tiles,
+                shape=tuple(canvas_size), dtype='uint16',
+                tile=(tile_size, tile_size), **options)
+        return filename
+
+    def stored_size(self, index, name):
+        path = os.path.join(self.output_folder, name)
+        return os.path.getsize(path) if os.path.isfile(path) else None
+
+    def read(self, index, name, level=0):
+        return imread(os.path.join(self.output_folder, name), level=level)
+
+    def stored_bytes(self):
+        return _tiff_bytes(self.output_folder)
+
+class TiffStackWriter(ImageWriter):
+    """
+    Packs `stack_size` consecutive images per multi-page BigTIFF file, which
+    cuts the file count of large runs.
+
+    Images are buffered in the parent until every page of their stack has
+    arrived, in any order; the stack is then written in one go. It is only
+    usable where all images pass through one writer, i.e. the "parent" and
+    "pipelined" write modes. Stacks still incomplete when the writer is
+    closed (after a failed image) are dropped and regenerated on resume.
+
+    Parameters:
+    - output_folder (str): Folder of the run.
+    - num_images (int): Number of images in the run.
+    - stack_size (int): Images per file; the last stack may be smaller.
+    - options (dict or None): Encoding options from `tiff_options`.
+    """
+
+    def __init__(self, output_folder, num_images, stack_size, options=None):
+        self.output_folder = output_folder
+        self.num_images = num_images
+        self.stack_size = stack_size
+        self.options = dict(options or {})
+        self._buffers = {}
+        self._writing = set()
+        self._lock = threading.Lock()  # Writes may come from an I/O pool
+
+    def group(self, index):
+        start = index - index % self.stack_size
+        return range(start, min(start + self.stack_size, self.num_images))
+
+    def write(self, index, image):
+        stack, page = divmod(index, self.stack_size)
+        members = self.group(index)
+        with self._lock:
+            pages = self._buffers.setdefault(stack, {})
+            pages[page] = np.array(image, dtype=np.uint16)  # Slots are reused
+            complete = len(pages) == len(members)
+            if complete:
+                del self._buffers[stack]
+                self._writing.add(stack)
+        if complete:
+            try:
+                self._write_stack(stack, [pages[number]
+                                          for number in range(len(pages))])
+            finally:
+                with self._lock:
+                    self._writing.discard(stack)
+        return f"{stack_filename(stack)}[{page}]"
+
+    def _write_stack(self, stack, images):
+        path = os.path.join(self.output_folder, stack_filename(stack))
+        temporary = f"{path}.tmp"
+        imwrite(temporary, np.stack(images), bigtiff=True,
+                photometric='minisblack', **self.options)
+        os.replace(temporary, path)
+
+    def durable(self, index):
+        stack = index // self.stack_size
+        with self._lock:
+            if stack in self._buffers or stack in self._writing:
+                return False
+        return os.path.isfile(os.path.join(self.output_folder,
+                                           stack_filename(stack)))
+
+    def stored_size(self, index, name):
+        path = os.path.join(self.output_folder, name.split("[")[0])
+        return os.path.getsize(path) if os.path.isfile(path) else None
+
+    def read(self, index, name, level=0):
+        if level:
+            raise ValueError("TIFF stacks hold no pyramid levels")
+        filename, page = name.rstrip("]").split("[")
+        return imread(os.path.join(self.output_folder, filename),
+                      key=int(page))
+
+    def stored_bytes(self):
+        return _tiff_bytes(self.output_folder)
+
+    def close(self):
+        if self._buffers:
+            print(f"Dropped {len(self._buffers)} incomplete image stacks; "
+                  f"resume the run to regenerate them")
+            self._buffers.clear()
+
+# Memory maps opened by the current process, by path
+_open_stores = {}
+
+def open_image_store(path, mode="r"):
+    """
+    Opens an (N, H, W) uint16 image store written by `MemmapWriter` as a
+    memory map, for zero-copy random access.
+
+    Parameters:
+    - path (str): Path to the `.npy` image store.
+    - mode (str): "r" for read-only access, "r+" to write images.
+
+    Returns:
+    - numpy memmap: Array of shape (N, H, W).
+    """
+    return np.load(path, mmap_mode=mode)
+
+def level_store_path(path, size):
+    """
+    Returns the path of the image store holding one pyramid level, e.g.
+    'images_256x256.npy' next to 'images.npy'.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}_{size[0]}x{size[1]}{extension}"
+
+def _writable_store(path):
+    """
+    Returns the store at `path`, opened for writing once per process.
+    """
+    store = _open_stores.get(path)
+    if store is None:
+        store = open_image_store(path, mode="r+")
+        _open_stores[path] = store
+    return store
+
+class MemmapWriter(ImageWriter):
+    """
+    Writes all images of a run into one preallocated `.npy` memory map of
+    shape (N, H, W), uint16. Workers open the store once per process and
+    write their images into disjoint slices; consumers read it back with
+    `open_image_store` without copying. Each pyramid level gets a store of
+    its own, see `level_store_path`.
+
+    Parameters:
+    - path (str): Path to the `.npy` image store.
+    - num_images (int): Number of images N.
+    - canvas_size (tuple): Size of the images (width, height).
+    - resume (bool): Reuse the existing store of an interrupted run instead
+    of preallocating a new one.
+    - levels (list of tuples): Pyramid levels stored along with each image,
+    see `src.image_generator.pyramid_sizes`.
+    """
+
+    def __init__(self, path, num_images, canvas_size, resume=False,
+                 levels=()):
+        self.path = path
+        self.levels = list(levels)
+        self.level_paths = [level_store_path(path, size)
+                            for size in self.levels]
+        for store_path, size in zip([path, *self.level_paths],
+                                    [canvas_size, *self.levels]):
+            if resume and os.path.isfile(store_path):
+                continue
+            store = np.lib.format.open_memmap(store_path, mode="w+",
+                                              dtype=np.uint16,
+                                              shape=(num_images, *size))
+            del store  # Only preallocate here; writes go through `images`
+
+    @property
+    def images(self):
+        return _writable_store(self.path)
+
+    def write(self, index, image):
+        self.images[index] = image
+        if self.levels:
+            for level_path, level in zip(
+                    self.level_paths,
+                    downsample_pyramid(image, self.levels)):
+                _writable_store(level_path)[index] = level
+        return f"{os.path.basename(self.path)}[{index}]"
+
+    def write_tiles(self, index, tiles, canvas_size, tile_size):
+        image = self.images[index]
+        for window, tile in zip(tile_windows(canvas_size, tile_size), tiles):
+            image[window] = tile
+        return f"{os.path.basename(self.path)}[{index}]"
+
+    def stored_size(self, index, name):
+        # Slots are preallocated, so check that the stores still hold the
+        # record: a missing, truncated or reallocated store, or one of
+        # another shape, no longer matches the size logged for `name`
+        if name != f"{os.path.basename(self.path)}[{index}]":
+            return None
+        size = 0
+        for path in [self.path, *self.level_paths]:
+            try:
+                store = open_image_store(path)
+            except (OSError, ValueError):
+                return None
+            if store.dtype != np.uint16 or not 0 <= index < len(store):
+                return None
+            size += store[index].nbytes
+        return size
+
+    def read(self, index, name, level=0):
+        path = self.level_paths[level - 1] if level else self.path
+        return open_image_store(path)[index]
+
+    def stored_bytes(self):
+        return sum(os.path.getsize(path)
+                   for path in [self.path, *self.level_paths])
+
+    def close(self):
+        for path in [self.path, *self.level_paths]:
+            store = _open_stores.pop(path, None)
+            if store is not None:
+                store.flush()
+
+def create_image_writer(output_format, output_folder, num_images,
+                        canvas_size, resume=False, options=None,
+                        stack_size=1, levels=()):
+    """
+    Creates the output backend selected by `output_format`.
+
+    Parameters:
+    - output_format (str): "tiff" (one file per image, or per stack) or
+    "memmap" (one chunked `images.npy` store).
+    - output_folder (str): Folder of the run.
+    - num_images (int): Number of images in the run.
+    - canvas_size (tuple): Size of the images (width, height).
+    - resume (bool): Keep the existing outputs of an interrupted run.
+    - options (dict or None): TIFF encoding options from `tiff_options`.
+    - stack_size (int): TIFF images per multi-page file.
+    - levels (list of tuples): Pyramid levels stored along with each image,
+    see `src.image_generator.pyramid_sizes`. Not supported for stacks.
+
+    Returns:
+    - ImageWriter: The output backend.
+    """
+    if output_format == "tiff":
+        if stack_size > 1:
+            if levels:
+                raise ValueError("Pyramid levels cannot be stored in TIFF "
+                                 "stacks")
+            return TiffStackWriter(output_folder, num_images, stack_size,
+                                   options)
+        return TiffWriter(output_folder, options, levels)
+    if output_format == "memmap":
+        return MemmapWriter(os.path.join(output_folder, "images.npy"),
+                            num_images, canvas_size, resume=resume,
+                            levels=levels)
+    raise ValueError(f"Unknown output format: {output_format}")
+
 def get_timestamp():
     """
     Returns a timestamp string for unique folder naming.
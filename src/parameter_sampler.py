@@ -1,10 +1,192 @@
 # parameter_sampler.py
 
+import warnings
 import numpy as np
-from scipy.stats import qmc  # For Latin Hypercube Sampling
 from config import config
 
-def sample_parameters(parameter_ranges, num_samples, method="LHS"):
+# Define parameters that should be integers
+INTEGER_PARAMS = ("perlin_octaves",)
+
+# Sampling methods accepted by `sampling_method`, by lower-case name
+SAMPLING_METHODS = {"lhs": "LHS", "random": "random", "sobol": "Sobol",
+                    "halton": "Halton"}
+
+# Parameter rows generated per block by `iter_parameter_blocks`
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def flatten_ranges(parameter_ranges):
+    """
+    Flattens nested parameter ranges into one (min, max) entry per
+    parameter; nested entries are named "{group}_{name}".
+    """
+    flattened_ranges = {}
+    for param_name, range_vals in parameter_ranges.items():
+        if isinstance(range_vals, dict):
+            for sub_param, sub_range in range_vals.items():
+                flattened_ranges[f"{param_name}_{sub_param}"] = sub_range
+        else:
+            flattened_ranges[param_name] = range_vals
+    return flattened_ranges
+
+
+def parameter_dtype(parameter_ranges):
+    """
+    Returns the structured dtype of a parameter table: int64 fields for
+    `INTEGER_PARAMS`, float64 for everything else.
+    """
+    return np.dtype([(name, np.int64 if name in INTEGER_PARAMS else np.float64)
+                     for name in flatten_ranges(parameter_ranges)])
+
+
+def _qmc_engine(name, dimensions, rng):
+    # scipy.stats takes about a second to import, so it is only loaded when
+    # parameters are actually sampled (not in pool workers or on resume)
+    from scipy.stats import qmc  # Latin Hypercube and low-discrepancy
+    engine = getattr(qmc, name)
+    # `rng` replaced the `seed` keyword of the engines in SciPy 1.15
+    try:
+        return engine(dimensions, rng=rng)
+    except TypeError:
+        return engine(dimensions, seed=rng)
+
+
+def _unit_sampler(method, dimensions, rng):
+    """
+    Returns a function drawing (n, dimensions) points in the unit cube.
+
+    The QMC engines keep their state between calls, so consecutive draws
+    continue one Sobol or Halton sequence. Latin Hypercube draws are
+    stratified per call.
+    """
+    name = SAMPLING_METHODS.get(str(method).lower())
+    if name == "random":
+        return lambda n: rng.random((n, dimensions))
+    if name == "LHS":
+        return _qmc_engine("LatinHypercube", dimensions, rng).random
+    if name == "Halton":
+        return _qmc_engine("Halton", dimensions, rng).random
+    if name == "Sobol":
+        engine = _qmc_engine("Sobol", dimensions, rng)
+
+        def sobol(n):
+            # Streaming blocks are rarely powers of two; that only weakens
+            # the balance of the individual blocks, not of the sequence
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore", "The balance properties",
+                                        UserWarning)
+                return engine.random(n)
+        return sobol
+    raise ValueError(f"Unknown sampling method: {method}")
+
+
+def _scale_to_table(unit, parameter_ranges):
+    """
+    Scales unit-cube samples to the parameter ranges in place, then copies
+    them column by column into the table, rounding the integer parameters.
+    """
+    flattened_ranges = flatten_ranges(parameter_ranges)
+    bounds = np.array(list(flattened_ranges.values()), dtype=float)
+    values = unit
+    values *= bounds[:, 1] - bounds[:, 0]
+    values += bounds[:, 0]
+
+    table = np.empty(len(unit), dtype=parameter_dtype(parameter_ranges))
+    for j, name in enumerate(flattened_ranges):
+        if name in INTEGER_PARAMS:
+            table[name] = np.rint(values[:, j])
+        else:
+            table[name] = values[:, j]
+    return table
+
+
+def iter_parameter_blocks(parameter_ranges, num_samples, method="LHS",
+                          chunk_size=DEFAULT_CHUNK_SIZE, seed=None):
+    """
+    Generates parameter sets block by block, for streaming pipelines that
+    should not hold the whole table in memory.
+
+    Parameters:
+    - parameter_ranges (dict): Dictionary with parameter names as keys and
+    (min, max) tuples or nested dicts.
+    - num_samples (int): Total number of samples.
+    - method (str): "LHS", "random", "Sobol" or "Halton". Sobol and Halton
+    blocks continue one low-discrepancy sequence; LHS blocks are each an
+    independent Latin Hypercube of their own size.
+    - chunk_size (int): Maximum number of rows per block.
+    - seed (int, numpy Generator or None): Seed of the sampler.
+
+    Yields:
+    - numpy structured array: Up to `chunk_size` rows, one field per
+    parameter (see `parameter_dtype`).
+    """
+    rng = np.random.default_rng(seed)
+    draw = _unit_sampler(method, len(flatten_ranges(parameter_ranges)), rng)
+    for start in range(0, num_samples, chunk_size):
+        count = min(chunk_size, num_samples - start)
+        yield _scale_to_table(draw(count), parameter_ranges)
+
+
+def sample_parameter_table(parameter_ranges, num_samples, method="LHS",
+                           seed=None):
+    """
+    Samples parameters into a structured NumPy array, one row per image.
+
+    The scaling and integer rounding are vectorized over all samples, so
+    the table costs 8 bytes per parameter and image.
+
+    Parameters:
+    - parameter_ranges (dict): Dictionary with parameter names as keys and
+    (min, max) tuples or nested dicts.
+    - num_samples (int): Number of samples to generate.
+    - method (str): "LHS" (Latin Hypercube Sampling, default), "random",
+    "Sobol" or "Halton".
+    - seed (int, numpy Generator or None): Seed of the sampler.
+
+    Returns:
+    - numpy structured array: Sampled parameter table.
+    """
+    rng = np.random.default_rng(seed)
+    draw = _unit_sampler(method, len(flatten_ranges(parameter_ranges)), rng)
+    return _scale_to_table(draw(num_samples), parameter_ranges)
+
+
+def table_to_dicts(table):
+    """
+    Converts rows of a parameter table to dicts of Python scalars.
+    """
+    names = table.dtype.names
+    return [dict(zip(names, row)) for row in table.tolist()]
+
+
+class ParameterTable:
+    """
+    Read-only sequence view of a structured parameter table that hands out
+    rows as dicts, so code written against lists of parameter dicts can use
+    a compact table without materialising one dict per image.
+
+    Parameters:
+    - table (numpy structured array): One row per image.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return table_to_dicts(self.table[index])
+        names = self.table.dtype.names
+        return dict(zip(names, self.table[index].tolist()))
+
+    def __iter__(self):
+        for start in range(0, len(self.table), DEFAULT_CHUNK_SIZE):
+            yield from self[start:start + DEFAULT_CHUNK_SIZE]
+
+
+def sample_parameters(parameter_ranges, num_samples, method="LHS", seed=None):
     """
     Samples parameters within the specified ranges for generating Nearfield images.
 
@@ -12,71 +194,26 @@ def sample_parameters(parameter_ranges, num_samples, method="LHS"):
     - parameter_ranges (dict): Dictionary with parameter names as keys and (min, max) tuples or nested dicts.
     - num_samples (int): Number of samples to generate.
     - method (str): Sampling method; default is "LHS" (Latin Hypercube Sampling).
+    - seed (int, numpy Generator or None): Seed of the sampler.
 
     Returns:
     - list of dicts: Each dict contains a unique set of parameters for an image.
     """
-    parameters = []
+    return table_to_dicts(sample_parameter_table(parameter_ranges,
+                                                 num_samples, method, seed))
 
-    # Flatten parameter_ranges for LHS if method is "LHS"
-    flattened_ranges = {}
-    for param_name, range_vals in parameter_ranges.items():
-        if isinstance(range_vals, dict):
-            for sub_param, sub_range in range_vals.items():
-                flattened_ranges[f"{param_name}_{sub_param}"] = sub_range
-        else:
-            flattened_ranges[param_name] = range_vals
 
-    # Define parameters that should be integers
-    integer_params = ["perlin_octaves"]
-
-    if method == "LHS":
-        # Perform Latin Hypercube Sampling for efficient coverage
-        sampler = qmc.LatinHypercube(d=len(flattened_ranges))
-        lhs_samples = sampler.random(n=num_samples)
-
-        # Map LHS results to parameter ranges
-        for i in range(num_samples):
-            sample = {}
-            for j, (param_name, (min_val, max_val)) in enumerate(flattened_ranges.items()):
-                # Scale LHS value to the specified range
-                value = min_val + lhs_samples[i, j] * (max_val - min_val)
-                # Convert to integer if needed
-                if param_name in integer_params:
-                    value = int(round(value))
-                sample[param_name] = value
-            parameters.append(sample)
-
-    elif method == "random":
-        # Use simple random sampling within the range
-        for _ in range(num_samples):
-            sample = {}
-            for param_name, range_vals in parameter_ranges.items():
-                if isinstance(range_vals, dict):
-                    for sub_param, (min_val, max_val) in range_vals.items():
-                        value = np.random.uniform(min_val, max_val)
-                        if f"{param_name}_{sub_param}" in integer_params:
-                            value = int(round(value))
-                        sample[f"{param_name}_{sub_param}"] = value
-                else:
-                    min_val, max_val = range_vals
-                    value = np.random.uniform(min_val, max_val)
-                    if param_name in integer_params:
-                        value = int(round(value))
-                    sample[param_name] = value
-            parameters.append(sample)
-    
-    else:
-        raise ValueError(f"Unknown sampling method: {method}")
-    
-    return parameters
-
-def get_sampled_parameters():
+def get_sampled_parameter_table(seed=None):
     """
-    Generates parameters for the number of images specified in config using LHS.
+    Samples the parameter table of the number of images specified in config.
     """
-    num_samples = config["num_images"]
-    parameter_ranges = config["parameter_ranges"]
-    sampling_method = config["sampling_method"]
+    return sample_parameter_table(config["parameter_ranges"],
+                                  config["num_images"],
+                                  method=config["sampling_method"], seed=seed)
 
-    return sample_parameters(parameter_ranges, num_samples, method=sampling_method)
+
+def get_sampled_parameters(seed=None):
+    """
+    Generates parameters for the number of images specified in config using LHS.
+    """
+    return table_to_dicts(get_sampled_parameter_table(seed))
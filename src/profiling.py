@@ -0,0 +1,166 @@
+# profiling.py
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+_NULL_CONTEXT = nullcontext()
+
+
+class NullTimer:
+    """
+    Stand-in for `StageTimer` when profiling is disabled; every stage is a
+    shared no-op context manager.
+    """
+
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_CONTEXT
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageTimer:
+    """
+    Records the wall time, and optionally the peak traced allocation, of the
+    pipeline stages of one task (a single image or a batch).
+
+    Parameters:
+    - images (int): Number of images produced by the task.
+    - trace_memory (bool): Also record the peak allocation of each stage
+    with `tracemalloc` (NumPy allocations are traced). This slows the
+    pipeline down noticeably and is meant for diagnosis only.
+    """
+
+    enabled = True
+
+    def __init__(self, images=1, trace_memory=False):
+        self.images = images
+        self.trace_memory = trace_memory
+        self.seconds = {}
+        self.peak_bytes = {}
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                self.peak_bytes[name] = max(self.peak_bytes.get(name, 0),
+                                            peak)
+
+    def record(self):
+        """
+        Returns the measurements as a small picklable dict.
+        """
+        return {"images": self.images, "seconds": self.seconds,
+                "peak_bytes": self.peak_bytes}
+
+
+def make_timer(enabled, images=1, trace_memory=False):
+    """
+    Returns a `StageTimer` if profiling is enabled, else `NULL_TIMER`.
+    """
+    if not enabled:
+        return NULL_TIMER
+    return StageTimer(images=images, trace_memory=trace_memory)
+
+
+def merge_records(records):
+    """
+    Combines the `StageTimer` records of the parts of one image, e.g. its
+    tiles, into a single record: image counts and stage seconds add up,
+    peak bytes take the maximum.
+    """
+    merged = {"images": 0, "seconds": {}, "peak_bytes": {}}
+    for record in records:
+        merged["images"] += record["images"]
+        for name, seconds in record["seconds"].items():
+            merged["seconds"][name] = (merged["seconds"].get(name, 0.0)
+                                       + seconds)
+        for name, peak in record["peak_bytes"].items():
+            merged["peak_bytes"][name] = max(
+                merged["peak_bytes"].get(name, 0), peak)
+    return merged
+
+
+def summarize_stats(values):
+    """
+    Returns the mean, median, 99th percentile and maximum of `values`.
+    """
+    values = np.asarray(values, dtype=float)
+    return {"mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p99": float(np.percentile(values, 99)),
+            "max": float(values.max())}
+
+
+class ProfileCollector:
+    """
+    Aggregates `StageTimer` records returned by the pool workers and
+    summarizes them at the end of a run.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.extra = {}
+        self._start = time.perf_counter()
+
+    def add(self, record):
+        self.records.append(record)
+
+    def summary(self):
+        """
+        Returns per-image stage statistics (seconds, and peak bytes if
+        traced) and the overall throughput of the run.
+
+        Returns:
+        - dict: JSON-serializable summary.
+        """
+        elapsed = time.perf_counter() - self._start
+        images = sum(record["images"] for record in self.records)
+        stages = {}
+        for record in self.records:
+            for name, seconds in record["seconds"].items():
+                stages.setdefault(name, []).append(seconds / record["images"])
+        peaks = {}
+        for record in self.records:
+            for name, peak in record["peak_bytes"].items():
+                peaks.setdefault(name, []).append(peak)
+
+        summary = {
+            "images": images,
+            "wall_seconds": elapsed,
+            "images_per_second": images / elapsed if elapsed > 0 else 0.0,
+            "stage_seconds_per_image": {
+                name: summarize_stats(values)
+                for name, values in stages.items()},
+        }
+        if peaks:
+            summary["stage_peak_bytes"] = {
+                name: summarize_stats(values)
+                for name, values in peaks.items()}
+        summary.update(self.extra)
+        return summary
+
+    def write(self, path):
+        """
+        Writes the summary to a JSON file and returns it.
+        """
+        summary = self.summary()
+        with open(path, "w") as file:
+            json.dump(summary, file, indent=2)
+        return summary
@@ -0,0 +1,181 @@
+# rolloff_cache.py
+
+import hashlib
+import os
+import numpy as np
+from src.utils import LRUCache
+
+# Parameters the roll-off mask of an image depends on, besides the canvas
+ROLLOFF_PARAMS = ("major_axis", "minor_axis", "angle_rotation", "erf_rolloff")
+
+# Slots of the cache counters, see `share_rolloff_counters`
+COUNTERS = ("hits", "store_hits", "misses", "spills")
+
+# Roll-off cache of the current process, see `get_rolloff_cache`
+_cache = None
+
+# Counters shared with the parent process, if any
+_shared_counters = None
+
+
+def quantize_geometry(params, quantization):
+    """
+    Returns the roll-off parameters of an image rounded to multiples of
+    their quantization steps.
+
+    Parameters:
+    - params (dict): Parameter set of the image.
+    - quantization (dict): Step per name of `ROLLOFF_PARAMS`; missing or
+    zero steps keep the exact value.
+
+    Returns:
+    - tuple: (major_axis, minor_axis, angle_rotation, erf_rolloff).
+    """
+    values = []
+    for name in ROLLOFF_PARAMS:
+        value = float(params[name])
+        step = quantization.get(name)
+        values.append(round(value / step) * step if step else value)
+    return tuple(values)
+
+
+class RolloffCache:
+    """
+    Byte-bounded LRU cache of read-only roll-off masks, with an optional
+    spill store on disk.
+
+    Masks evicted from memory are written to the store as one `.npy` file
+    each, and masks missing from memory are looked up there before being
+    rendered. Store hits are memory maps, so pool workers pointed at the
+    same store share the masks through the page cache. The store is not
+    bounded; its size follows from the quantization steps.
+
+    Parameters:
+    - max_bytes (int): Memory budget of the cached masks.
+    - store (str or None): Directory of the spill store.
+    """
+
+    def __init__(self, max_bytes, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self._memory = LRUCache(max_bytes=max_bytes, on_evict=self._spill)
+        if store is not None:
+            os.makedirs(store, exist_ok=True)
+
+    def __len__(self):
+        return len(self._memory)
+
+    @property
+    def total_bytes(self):
+        return self._memory.total_bytes
+
+    def get(self, key, build):
+        """
+        Returns the mask stored under `key`, calling `build()` to render it
+        on a miss.
+        """
+        mask = self._memory.get(key)
+        if mask is not None:
+            self._count("hits")
+            return mask
+        mask = self._load(key)
+        if mask is not None:
+            self._count("store_hits")
+        else:
+            mask = build()
+            mask.flags.writeable = False
+            self._count("misses")
+            if mask.nbytes > self.max_bytes:
+                # Too large to keep in memory, but still worth sharing
+                self._spill(key, mask)
+        self._memory.put(key, mask)
+        return mask
+
+    def clear(self):
+        self._memory.clear()
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.store, f"{digest}.npy")
+
+    def _load(self, key):
+        if self.store is None:
+            return None
+        try:
+            return np.load(self._path(key), mmap_mode="r")
+        except FileNotFoundError:
+            return None
+
+    def _spill(self, key, mask):
+        if self.store is None or isinstance(mask, np.memmap):
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        # Written under a unique name and renamed, so concurrent workers
+        # never load a partial file
+        temporary = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(temporary, mask)
+        os.replace(temporary, path)
+        self._count("spills")
+
+    def _count(self, name):
+        self.counts[name] += 1
+        if _shared_counters is not None:
+            with _shared_counters.get_lock():
+                _shared_counters[COUNTERS.index(name)] += 1
+
+
+def get_rolloff_cache(max_bytes, store=None):
+    """
+    Returns the roll-off cache of the current process, creating it on first
+    use or when its settings change.
+    """
+    global _cache
+    if _cache is None or (_cache.max_bytes, _cache.store) != (max_bytes,
+                                                              store):
+        _cache = RolloffCache(max_bytes, store)
+    return _cache
+
+
+def clear_rolloff_cache():
+    """
+    Drops the roll-off cache of the current process (the store is kept).
+    """
+    global _cache
+    _cache = None
+
+
+def share_rolloff_counters(counters):
+    """
+    Makes the cache of the current process also count into `counters`, a
+    `multiprocessing.Array("q", len(COUNTERS))` created by the parent, so a
+    run can report the statistics of all its pool workers.
+    """
+    global _shared_counters
+    _shared_counters = counters
+
+
+def rolloff_cache_info(counters=None):
+    """
+    Returns the hit/miss statistics of the roll-off cache.
+
+    Parameters:
+    - counters (multiprocessing Array or None): Counters shared by the pool
+    workers, see `share_rolloff_counters`. None reports the cache of the
+    current process.
+
+    Returns:
+    - dict: Count per name of `COUNTERS` and the hit rate, counting store
+    hits as hits.
+    """
+    if counters is not None:
+        info = dict(zip(COUNTERS, counters[:]))
+    else:
+        info = dict(_cache.counts) if _cache is not None \
+            else dict.fromkeys(COUNTERS, 0)
+    lookups = info["hits"] + info["store_hits"] + info["misses"]
+    info["hit_rate"] = (info["hits"] + info["store_hits"]) / lookups \
+        if lookups else 0.0
+    return info
@@ -0,0 +1,184 @@
+# scheduler.py
+
+import numpy as np
+
+# Per-pixel cost of the Perlin noise as (fixed, per octave), relative to
+# the rest of the pipeline (measured at 256-1024 px with the default
+# options). The noise scale does not change the cost of any method.
+PERLIN_COST = {"vectorized": (0.0, 0.3), "pnoise2": (8.0, 0.0),
+               "bank": (0.1, 0.0)}
+
+# Per-pixel cost of evaluating erf, relative to the rest of the pipeline
+ERF_COST = 0.25
+
+# Adaptive chunks are sized to leave this many chunks per worker
+CHUNKS_PER_WORKER = 2
+
+
+def _columns(parameter_sets, indices):
+    """
+    Returns the parameter columns of `indices` as arrays, from a
+    `ParameterTable` or a list of parameter dicts.
+    """
+    table = getattr(parameter_sets, "table", None)
+    if table is not None:
+        return table[np.asarray(indices, dtype=np.int64)]
+    rows = [parameter_sets[index] for index in indices]
+    return {name: np.array([row[name] for row in rows])
+            for name in (rows[0] if rows else ())}
+
+
+def estimate_costs(parameter_sets, indices, canvas_size, options):
+    """
+    Estimates the relative render cost of images from their parameters.
+
+    The cost is the pixel count times the per-pixel work of the noise (its
+    octaves, for the vectorized method) plus the erf, which the banded
+    analytic roll-off only evaluates in a band of width 2 * band / rolloff
+    along the edge of the ellipse.
+
+    Parameters:
+    - parameter_sets (ParameterTable or list of dicts): Parameters by index.
+    - indices (sequence of int): Images to estimate.
+    - canvas_size (tuple): Size of the images (width, height).
+    - options (dict): Rendering options, see `render_options`.
+
+    Returns:
+    - numpy array: One cost per index, in megapixel-passes.
+    """
+    if len(indices) == 0:
+        return np.zeros(0)
+    columns = _columns(parameter_sets, indices)
+    width, height = canvas_size
+    pixels = width * height
+    fixed, per_octave = PERLIN_COST.get(options.get("perlin_method"),
+                                        PERLIN_COST["vectorized"])
+    noise = fixed + per_octave * np.asarray(columns["perlin_octaves"])
+
+    band = options.get("rolloff_band")
+    if band is None or options.get("rolloff_method") != "analytic":
+        edge_fraction = 1.0
+    else:
+        perimeter = np.pi * (np.asarray(columns["major_axis"])
+                             + np.asarray(columns["minor_axis"]))
+        edge_pixels = perimeter * 2 * band / np.asarray(columns["erf_rolloff"])
+        edge_fraction = np.minimum(edge_pixels / pixels, 1.0)
+    return pixels * (1 + noise + ERF_COST * edge_fraction) / 1e6
+
+
+def cost_order(indices, costs, group=None):
+    """
+    Orders images most expensive first.
+
+    Parameters:
+    - indices (sequence of int): Images to order.
+    - costs (numpy array): Cost of every image, see `estimate_costs`.
+    - group (callable or None): Maps an index to the indices stored with
+    it, see `ImageWriter.group`. Groups are ordered by their total cost
+    and kept together, so a writer buffering a group (a TIFF stack) holds
+    few incomplete groups at a time.
+
+    Returns:
+    - list of int: The indices in dispatch order.
+    """
+    indices = list(indices)
+    if group is None:
+        return [indices[i] for i in np.argsort(-costs, kind="stable")]
+    groups = {}
+    for index, cost in zip(indices, costs):
+        key = group(index)[0]
+        members, total = groups.get(key, ([], 0.0))
+        members.append((cost, index))
+        groups[key] = (members, total + cost)
+    ordered = sorted(groups.values(), key=lambda entry: -entry[1])
+    return [index for members, _ in ordered
+            for _, index in sorted(members, key=lambda member: -member[0])]
+
+
+def adaptive_chunks(order, costs, num_workers, max_chunk):
+    """
+    Splits images in dispatch order into worker tasks whose size shrinks
+    as the run progresses (guided self-scheduling by cost).
+
+    A chunk takes images until it reaches 1 / (CHUNKS_PER_WORKER *
+    num_workers) of the cost still to dispatch, or `max_chunk` images. The
+    first chunks amortise the task overhead over several images; the last
+    ones are single images, so workers finish at about the same time.
+
+    Parameters:
+    - order (list of int): Indices in dispatch order, see `cost_order`.
+    - costs (dict or numpy array): Cost of every image, by index.
+    - num_workers (int): Number of pool workers.
+    - max_chunk (int): Maximum number of images per task.
+
+    Returns:
+    - list of tuples: The indices of each task, in dispatch order.
+    """
+    remaining = float(sum(costs[index] for index in order))
+    chunks = []
+    position = 0
+    while position < len(order):
+        target = remaining / (CHUNKS_PER_WORKER * max(num_workers, 1))
+        chunk = [order[position]]
+        chunk_cost = costs[order[position]]
+        position += 1
+        while position < len(order) and len(chunk) < max_chunk and \
+                chunk_cost + costs[order[position]] <= target:
+            chunk.append(order[position])
+            chunk_cost += costs[order[position]]
+            position += 1
+        remaining -= chunk_cost
+        chunks.append(tuple(chunk))
+    return chunks
+
+
+def index_chunks(indices, batch_size):
+    """
+    Groups image indices into runs of consecutive indices of at most
+    `batch_size` images, in index order.
+
+    Parameters:
+    - indices (iterable of int): Sorted indices of the images to generate.
+    - batch_size (int): Maximum number of images per chunk.
+
+    Returns:
+    - list of tuples: The indices of each task.
+    """
+    chunks = []
+    for index in indices:
+        if chunks and chunks[-1][-1] + 1 == index \
+                and len(chunks[-1]) < batch_size:
+            chunks[-1].append(index)
+        else:
+            chunks.append([index])
+    return [tuple(chunk) for chunk in chunks]
+
+
+def plan_chunks(parameter_sets, indices, canvas_size, options, num_workers,
+                batch_size, schedule="cost", group=None):
+    """
+    Plans the worker tasks of a run.
+
+    Parameters:
+    - parameter_sets (ParameterTable or list of dicts): Parameters by index.
+    - indices (list of int): Sorted indices of the images to generate.
+    - canvas_size (tuple): Size of the images (width, height).
+    - options (dict): Rendering options, see `render_options`.
+    - num_workers (int): Number of pool workers.
+    - batch_size (int): Maximum number of images per task.
+    - schedule (str): "cost" dispatches the most expensive images first in
+    adaptive chunks; "index" dispatches runs of `batch_size` consecutive
+    images in index order.
+    - group (callable or None): Indices stored together, see `cost_order`.
+
+    Returns:
+    - list of tuples: The indices of each task, in dispatch order.
+    """
+    if schedule == "index":
+        return index_chunks(indices, batch_size)
+    if schedule != "cost":
+        raise ValueError(f"Unknown schedule: {schedule}")
+    costs = estimate_costs(parameter_sets, indices, canvas_size, options)
+    order = cost_order(indices, costs, group)
+    return adaptive_chunks(order, dict(zip(indices, costs.tolist())),
+                           num_workers, batch_size)
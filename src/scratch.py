@@ -0,0 +1,41 @@
+# scratch.py
+
+import numpy as np
+from src.utils import LRUCache
+
+# Number of distinct (shape, dtype, count) buffer sets kept per process
+SCRATCH_CACHE_SIZE = 2
+
+_scratch_cache = LRUCache(max_items=SCRATCH_CACHE_SIZE)
+
+
+def get_scratch_buffers(shape, dtype, count):
+    """
+    Returns `count` preallocated work arrays owned by the current process.
+
+    The same arrays are handed out on every call with the same arguments,
+    so callers must treat their contents as garbage on entry and must not
+    keep references to them across images.
+
+    Parameters:
+    - shape (tuple): Shape of each buffer.
+    - dtype (numpy dtype): Data type of each buffer.
+    - count (int): Number of buffers.
+
+    Returns:
+    - list of numpy arrays: Uninitialised buffers.
+    """
+    dtype = np.dtype(dtype)
+    key = (tuple(shape), dtype.str, count)
+    buffers = _scratch_cache.get(key)
+    if buffers is None:
+        buffers = [np.empty(shape, dtype=dtype) for _ in range(count)]
+        _scratch_cache.put(key, buffers)
+    return buffers
+
+
+def clear_scratch_buffers():
+    """
+    Releases all scratch buffers of the current process.
+    """
+    _scratch_cache.clear()
@@ -0,0 +1,76 @@
+# seeding.py
+
+import numpy as np
+
+
+def resolve_run_seed(seed=None):
+    """
+    Returns the seed of a run as a plain integer.
+
+    Parameters:
+    - seed (int or None): Configured run seed. None draws fresh entropy from
+    the operating system.
+
+    Returns:
+    - int: Run seed to record alongside the parameter log.
+    """
+    if seed is None:
+        return int(np.random.SeedSequence().entropy)
+    return int(seed)
+
+
+def image_rng(run_seed, index):
+    """
+    Returns the random generator of one image of a run.
+
+    The stream depends only on the run seed and the image index, not on the
+    worker process, the batch the image was rendered in or the order of
+    completion, so any image can be regenerated from its logged parameters.
+
+    Parameters:
+    - run_seed (int): Seed of the run, see `resolve_run_seed`.
+    - index (int): Index of the image in the run.
+
+    Returns:
+    - numpy Generator: Independent stream for the image.
+    """
+    seed_sequence = np.random.SeedSequence(run_seed, spawn_key=(int(index),))
+    return np.random.default_rng(seed_sequence)
+
+
+def image_rngs(run_seed, start, count):
+    """
+    Returns the generators of `count` consecutive images starting at `start`.
+    """
+    return [image_rng(run_seed, index) for index in range(start, start + count)]
+
+
+def tile_rng(run_seed, index, tile_number):
+    """
+    Returns the random generator of one tile of an image rendered in tiles.
+
+    Tiles draw from streams of their own, so they can be rendered in any
+    order and in parallel; a tiled image therefore has a different noise
+    realisation than the same image rendered whole.
+
+    Parameters:
+    - run_seed (int): Seed of the run, see `resolve_run_seed`.
+    - index (int): Index of the image in the run.
+    - tile_number (int): Position of the tile in `src.tiling.tile_windows`.
+
+    Returns:
+    - numpy Generator: Independent stream for the tile.
+    """
+    seed_sequence = np.random.SeedSequence(
+        run_seed, spawn_key=(int(index), int(tile_number)))
+    return np.random.default_rng(seed_sequence)
+
+
+def sampler_rng(run_seed):
+    """
+    Returns the random generator the parameter sampler of a run draws from.
+
+    It is built from the root of the run's seed sequence, so it never
+    overlaps the per-image and per-tile streams spawned from it.
+    """
+    return np.random.default_rng(np.random.SeedSequence(run_seed))
@@ -0,0 +1,434 @@
+# service.py
+
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import (Future, InvalidStateError,
+                                ProcessPoolExecutor)
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from config import config
+from src.image_generator import (generate_nearfield_image_impl,
+                                 generate_nearfield_batch, prepare_worker,
+                                 render_options)
+from src.noise_bank import build_configured_bank
+from src.parameter_sampler import sample_parameters
+from src.profiling import summarize_stats
+from src.seeding import image_rng, resolve_run_seed, sampler_rng
+
+# Requests coalesced into one worker task at most
+DEFAULT_MAX_BATCH = 8
+
+# Seconds a request waits for others to share its batch
+DEFAULT_MAX_DELAY = 0.002
+
+# Request latencies kept for the latency statistics
+LATENCY_WINDOW = 10000
+
+
+def init_generator_worker(cfg):
+    """
+    Initializer of the generator's pool workers. Installs the generator's
+    configuration in place of `config.py` (the noise offset is read from
+    it) and warms the per-process caches before the first request.
+    """
+    config.clear()
+    config.update(cfg)
+    config["canvas_size"] = tuple(config["canvas_size"])
+    prepare_worker(config["canvas_size"], render_options(config))
+
+
+def render_requests(param_list, indices, canvas_size, options, run_seed):
+    """
+    Renders a batch of coalesced requests in a pool worker.
+
+    Parameters:
+    - param_list (list of dicts): Parameter set of every request.
+    - indices (list of int): Image index of every request (for seeding).
+    - canvas_size (tuple): Size of the images (width, height).
+    - options (dict): Rendering options, see `render_options`.
+    - run_seed (int): Seed the image noise is derived from.
+
+    Returns:
+    - numpy array: (N, width, height) uint16 images.
+    """
+    rngs = [image_rng(run_seed, index) for index in indices]
+    if len(param_list) == 1:
+        image = generate_nearfield_image_impl(param_list[0], canvas_size,
+                                              **options, rng=rngs[0])
+        return image[np.newaxis]
+    return generate_nearfield_batch(param_list, canvas_size, **options,
+                                    rng=rngs)
+
+
+def _settle(outcomes):
+    """
+    Resolves request futures from `(future.set_result or
+    future.set_exception, value)` pairs. A future that is already resolved
+    is skipped without affecting the others.
+    """
+    for settle, value in outcomes:
+        try:
+            settle(value)
+        except InvalidStateError:
+            pass
+
+
+def _worker_ready():
+    # No-op task; the pool has started once every worker has run one
+    return None
+
+
+class _Request:
+    __slots__ = ("params", "index", "future", "submitted")
+
+    def __init__(self, params, index):
+        self.params = params
+        self.index = index
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class NearfieldGenerator:
+    """
+    Persistent Nearfield generator with a warm worker pool.
+
+    Image `index` is rendered with `image_rng(run_seed, index)`, so a
+    request is reproducible from its parameters, index and the generator's
+    seed, and matches the image `main.main()` renders for that index with
+    the same seed and options. Requests that arrive within `max_delay` of
+    each other, or while every worker is busy, are rendered as one batch.
+
+    Parameters:
+    - cfg (dict or None): Configuration dict with the keys of `config.py`;
+    defaults to a copy of `config.config`. Not modified.
+    - num_workers (int or None): Worker processes; defaults to the
+    configured `num_workers` (None uses the CPU count).
+    - max_batch (int): Most requests rendered in one worker task.
+    - max_delay (float): Seconds a request waits for others to batch with.
+    - max_in_flight (int or None): Batches submitted to the pool at once
+    (None: twice the number of workers). Further requests queue up and
+    form larger batches.
+    - **overrides: Configuration keys replacing those of `cfg`.
+    """
+
+    def __init__(self, cfg=None, num_workers=None, max_batch=DEFAULT_MAX_BATCH,
+                 max_delay=DEFAULT_MAX_DELAY, max_in_flight=None, **overrides):
+        if max_batch < 1:
+            raise ValueError("Expected max_batch value > 0")
+        self.config = json.loads(json.dumps(
+            dict(config if cfg is None else cfg, **overrides)))
+        self.config["canvas_size"] = tuple(self.config["canvas_size"])
+        self.canvas_size = self.config["canvas_size"]
+        self.options = render_options(self.config)
+        self.run_seed = resolve_run_seed(self.config.get("seed"))
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self.num_workers = (num_workers or self.config.get("num_workers")
+                            or os.cpu_count() or 1)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers, initializer=init_generator_worker,
+            initargs=(self.config,))
+        if self.options["noise_bank"] is not None:
+            build_configured_bank(self.config, self._executor)
+
+        self._rng = sampler_rng(self.run_seed)
+        self._indices = itertools.count()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._batches = 0
+        self._requests = 0
+        self._queue = queue.SimpleQueue()
+        self._max_in_flight = max_in_flight or 2 * self.num_workers
+        self._slots = threading.BoundedSemaphore(self._max_in_flight)
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch,
+                                            name="nearfield-dispatch",
+                                            daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def warm_up(self):
+        """
+        Starts every worker process and waits until they are initialized,
+        so the first requests do not pay for the pool startup.
+        """
+        futures = [self._executor.submit(_worker_ready)
+                   for _ in range(self.num_workers)]
+        for future in futures:
+            future.result()
+
+    def next_index(self):
+        """
+        Reserves the next unused image index of this generator.
+        """
+        return next(self._indices)
+
+    def sample_parameters(self, count):
+        """
+        Draws `count` parameter sets from the configured ranges and
+        sampling method, from a stream seeded by the generator's seed.
+        """
+        with self._lock:
+            return sample_parameters(self.config["parameter_ranges"], count,
+                                     method=self.config["sampling_method"],
+                                     seed=self._rng)
+
+    def submit(self, params, index=None):
+        """
+        Queues one image for rendering.
+
+        Parameters:
+        - params (dict): Parameter set of the image.
+        - index (int or None): Image index the noise is seeded with; None
+        takes the next unused index of this generator.
+
+        Returns:
+        - concurrent.futures.Future: Resolves to the (width, height) uint16
+        image.
+        """
+        if self._closed:
+            raise RuntimeError("The generator is closed")
+        if index is None:
+            index = self.next_index()
+        request = _Request(dict(params), int(index))
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, params, index=None):
+        """
+        Renders one image and blocks until it is ready, see `submit`.
+        """
+        return self.submit(params, index).result()
+
+    def generate_many(self, param_list, indices=None):
+        """
+        Renders several images and returns them as one (N, width, height)
+        array; the requests are batched like concurrent ones.
+        """
+        if indices is None:
+            indices = [None] * len(param_list)
+        futures = [self.submit(params, index)
+                   for params, index in zip(param_list, indices)]
+        return np.stack([future.result() for future in futures])
+
+    async def agenerate(self, params, index=None):
+        """
+        Renders one image without blocking the event loop, see `submit`.
+        """
+        return await asyncio.wrap_future(self.submit(params, index))
+
+    def stats(self):
+        """
+        Returns request and batch counts and the latency distribution, in
+        milliseconds, of the last `LATENCY_WINDOW` requests.
+        """
+        with self._lock:
+            latencies = list(self._latencies)
+            stats = {"requests": self._requests, "batches": self._batches,
+                     "mean_batch_size": self._requests / self._batches
+                     if self._batches else 0.0}
+        if latencies:
+            stats["latency_ms"] = summarize_stats(
+                np.asarray(latencies) * 1e3)
+        return stats
+
+    def close(self):
+        """
+        Renders the queued requests, then stops the dispatcher and the pool.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def _collect(self, first):
+        """
+        Gathers the requests batched with `first`. Returns the batch and
+        whether the generator was closed meanwhile.
+        """
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                request = self._queue.get(
+                    timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _dispatch(self):
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            batch, stopping = self._collect(request)
+            # Drop requests cancelled while queued; the others can no
+            # longer be cancelled
+            batch = [request for request in batch
+                     if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self._slots.acquire()
+            try:
+                future = self._executor.submit(
+                    render_requests, [r.params for r in batch],
+                    [r.index for r in batch], self.canvas_size, self.options,
+                    self.run_seed)
+            except Exception as error:
+                self._slots.release()
+                _settle((request.future.set_exception, error)
+                        for request in batch)
+                continue
+            future.add_done_callback(partial(self._complete, batch))
+        # Wait for the batches in flight before the pool shuts down
+        for _ in range(self._max_in_flight):
+            self._slots.acquire()
+
+    def _complete(self, batch, future):
+        self._slots.release()
+        try:
+            images = future.result()
+        except Exception as error:  # Including a cancelled pool task
+            _settle((request.future.set_exception, error)
+                    for request in batch)
+            return
+        done = time.perf_counter()
+        with self._lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._latencies.extend(done - request.submitted
+                                   for request in batch)
+        _settle((request.future.set_result, image)
+                for request, image in zip(batch, images))
+
+
+def make_server(generator, host="127.0.0.1", port=8000):
+    """
+    Creates a threaded HTTP front end for a generator; concurrent HTTP
+    requests are batched by the generator like any others.
+
+    Endpoints:
+    - POST /generate: JSON body {"params": {...}, "index": int}, both
+    optional (missing parameters are sampled). Responds with the image as
+    a `.npy` file, and its parameters and index in the
+    X-Nearfield-Params and X-Nearfield-Index headers.
+    - GET /stats: JSON request counts and latency percentiles.
+
+    Returns:
+    - ThreadingHTTPServer: Call `serve_forever()` to start serving.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, status, body, content_type, headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _reply_json(self, status, data):
+            self._reply(status, json.dumps(data).encode(), "application/json")
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._reply_json(200, generator.stats())
+            else:
+                self._reply_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/generate":
+                self._reply_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                params = body.get("params") or \
+                    generator.sample_parameters(1)[0]
+                index = body.get("index")
+                if index is None:
+                    index = generator.next_index()
+                image = generator.generate(params, index)
+            except (ValueError, TypeError, KeyError, AttributeError) as error:
+                self._reply_json(400, {"error": str(error)})
+                return
+            except Exception as error:
+                self._reply_json(500, {"error": str(error)})
+                return
+            buffer = io.BytesIO()
+            np.save(buffer, image)
+            self._reply(200, buffer.getvalue(), "application/x-npy",
+                        [("X-Nearfield-Params", json.dumps(params)),
+                         ("X-Nearfield-Index", str(index))])
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serves Nearfield images over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to listen on (default 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="Port to listen on (default 8000).")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes (default: config num_workers).")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="Most requests rendered in one worker task.")
+    parser.add_argument("--max-delay", type=float, default=DEFAULT_MAX_DELAY,
+                        help="Seconds a request waits for others to batch "
+                             "with.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with NearfieldGenerator(num_workers=args.workers,
+                            max_batch=args.max_batch,
+                            max_delay=args.max_delay) as generator:
+        generator.warm_up()
+        server = make_server(generator, args.host, args.port)
+        print(f"Serving Nearfield images on http://{args.host}:"
+              f"{server.server_address[1]} (seed {generator.run_seed})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        stats = generator.stats()
+        if "latency_ms" in stats:
+            latency = stats["latency_ms"]
+            print(f"{stats['requests']} requests in {stats['batches']} "
+                  f"batches, latency p50 {latency['p50']:.1f} ms, "
+                  f"p99 {latency['p99']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
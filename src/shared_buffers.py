@@ -0,0 +1,115 @@
+# shared_buffers.py
+
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+
+# Shared-memory blocks attached by the current (worker) process, by name
+_attached = {}
+
+
+class SharedImagePool:
+    """
+    Bounded, recycled pool of shared-memory slots for handing rendered images
+    from pool workers to the parent without pickling the pixel data.
+
+    Each slot holds one array of `shape` and `dtype`. The parent acquires a
+    free slot before submitting a task, the worker renders into it through
+    `attach_slot`, and the parent releases the slot once the image has been
+    consumed, so peak memory is `num_slots` slots regardless of run length.
+
+    Parameters:
+    - num_slots (int): Number of slots in the pool.
+    - shape (tuple): Shape of the array stored in each slot.
+    - dtype (numpy dtype): Data type of the array stored in each slot.
+    """
+
+    def __init__(self, num_slots, shape, dtype=np.uint16):
+        if num_slots < 1:
+            raise ValueError("Expected num_slots value > 0")
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self._blocks = [shared_memory.SharedMemory(create=True, size=nbytes)
+                        for _ in range(num_slots)]
+        self._views = [np.ndarray(self.shape, dtype=self.dtype,
+                                  buffer=block.buf)
+                       for block in self._blocks]
+        self._free = deque(range(num_slots))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    @property
+    def num_free(self):
+        return len(self._free)
+
+    def name(self, slot):
+        """
+        Returns the shared-memory name workers use to attach to `slot`.
+        """
+        return self._blocks[slot].name
+
+    def acquire(self):
+        """
+        Takes a free slot out of the pool.
+
+        Returns:
+        - int or None: Slot index, or None if every slot is in use.
+        """
+        return self._free.popleft() if self._free else None
+
+    def release(self, slot):
+        """
+        Returns `slot` to the pool so that it can be reused.
+        """
+        self._free.append(slot)
+
+    def view(self, slot):
+        """
+        Returns a NumPy view of the data stored in `slot` (no copy).
+        """
+        return self._views[slot]
+
+    def close(self):
+        """
+        Releases and unlinks all shared-memory blocks of the pool.
+        """
+        self._views = []
+        for block in self._blocks:
+            try:
+                block.close()
+            except BufferError:
+                pass  # A view is still alive; the mapping goes with it
+            block.unlink()
+        self._blocks = []
+        self._free.clear()
+
+
+def attach_slot(name, shape, dtype=np.uint16):
+    """
+    Returns a writable NumPy view of a shared-memory slot from a worker.
+
+    Blocks are attached once per process and kept open, so recycled slots do
+    not pay the attach cost again. They are closed when the worker exits,
+    i.e. when the run's process pool shuts down.
+
+    Parameters:
+    - name (str): Shared-memory name from `SharedImagePool.name`.
+    - shape (tuple): Shape of the array stored in the slot.
+    - dtype (numpy dtype): Data type of the array stored in the slot.
+
+    Returns:
+    - numpy array: View backed by the shared-memory block.
+    """
+    block = _attached.get(name)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = block
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf)
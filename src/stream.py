@@ -0,0 +1,294 @@
+# stream.py
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                wait, FIRST_COMPLETED)
+from config import config
+from src.image_generator import (generate_nearfield_image_impl,
+                                 generate_nearfield_batch, render_options)
+from src.noise_bank import build_configured_bank
+from src.output_manager import (CompletionLog, ParameterLogger, RunRecorder,
+                                create_image_writer, create_output_folder,
+                                get_timestamp, image_checksum, tiff_options,
+                                write_manifest, write_parameter_table)
+from src.parameter_sampler import (ParameterTable, sample_parameter_table,
+                                   table_to_dicts)
+from src.seeding import image_rng, resolve_run_seed, sampler_rng
+from src.service import init_generator_worker
+from src.shared_buffers import SharedImagePool, attach_slot
+
+# Images per yielded batch
+DEFAULT_BATCH_SIZE = 32
+
+
+def render_into_slot(param_list, indices, slot_name, slot_shape, canvas_size,
+                     options, run_seed):
+    """
+    Renders consecutive images of a stream into a shared-memory slot, in a
+    pool worker.
+
+    Parameters:
+    - param_list (list of dicts): Parameter sets of the images.
+    - indices (range): Indices of the images (for seeding).
+    - slot_name (str): Name of the shared-memory slot to render into.
+    - slot_shape (tuple): Shape of the slot, (batch_size, width, height).
+    - canvas_size (tuple): Size of the images (width, height).
+    - options (dict): Rendering options, see `render_options`.
+    - run_seed (int): Seed the image noise is derived from.
+
+    Returns:
+    - int: Number of images written to the slot.
+    """
+    images = attach_slot(slot_name, slot_shape)
+    rngs = [image_rng(run_seed, index) for index in indices]
+    if len(param_list) == 1:
+        generate_nearfield_image_impl(param_list[0], canvas_size, **options,
+                                      rng=rngs[0], out=images[0])
+    else:
+        generate_nearfield_batch(param_list, canvas_size, **options,
+                                 rng=rngs, out=images[:len(param_list)])
+    return len(param_list)
+
+
+class NearfieldStream:
+    """
+    Iterator over batches of freshly rendered Nearfield images, for
+    training loops that consume images rather than files.
+
+    The parameters are sampled like a `main.main()` run, from the root of
+    the run seed, and image `i` is rendered with `image_rng(run_seed, i)`,
+    so a stream and a run with the same seed and configuration produce the
+    same images. Pool workers render up to `prefetch` batches ahead into
+    shared-memory slots; each batch is copied out of its slot when it is
+    yielded.
+
+    With `tee`, every batch is also stored, by a background thread, in a
+    regular run folder (manifest, parameter table and logs) that
+    `NearfieldDataset.from_folder` reads and `main.py --resume` completes
+    if the stream is closed early. Slots stay taken until their images are
+    stored, so a slow disk throttles the rendering instead of growing a
+    queue.
+
+    Closing the stream, leaving its `with` block or exhausting it cancels
+    the queued batches, waits for the running ones and the pending writes,
+    and releases the workers and the shared memory.
+
+    Parameters:
+    - batch_size (int): Images per batch; the last batch may be smaller.
+    - num_images (int or None): Images in the stream; defaults to the
+    configured `num_images`.
+    - cfg (dict or None): Configuration dict with the keys of `config.py`;
+    defaults to a copy of `config.config`. Not modified.
+    - prefetch (int or None): Batches rendered or waiting ahead of the
+    consumer (None: twice the number of workers).
+    - num_workers (int or None): Worker processes; defaults to the
+    configured `num_workers` (None uses the CPU count).
+    - tee (str or None): Base folder of the run folder to store the images
+    in, e.g. "output/images"; a timestamp is appended as for runs.
+    - **overrides: Configuration keys replacing those of `cfg`.
+
+    Yields:
+    - tuple: (images, params): a (N, width, height) uint16 array and the
+    N matching rows of the structured parameter table.
+    """
+
+    _closed = True  # Until __init__ completes
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, num_images=None,
+                 cfg=None, prefetch=None, num_workers=None, tee=None,
+                 **overrides):
+        if batch_size < 1:
+            raise ValueError("Expected batch_size value > 0")
+        self.config = json.loads(json.dumps(
+            dict(config if cfg is None else cfg, **overrides)))
+        self.config["canvas_size"] = tuple(self.config["canvas_size"])
+        self.canvas_size = self.config["canvas_size"]
+        self.options = render_options(self.config)
+        self.batch_size = batch_size
+        self.run_seed = resolve_run_seed(self.config.get("seed"))
+        num_images = self.config["num_images"] if num_images is None \
+            else num_images
+        self.parameters = sample_parameter_table(
+            self.config["parameter_ranges"], num_images,
+            method=self.config["sampling_method"],
+            seed=sampler_rng(self.run_seed))
+
+        workers = (num_workers or self.config.get("num_workers")
+                   or os.cpu_count() or 1)
+        self.prefetch = prefetch or 2 * workers
+        # Created before the workers start, so they share the parent's
+        # shared-memory resource tracker
+        width, height = self.canvas_size
+        self._slots = SharedImagePool(self.prefetch,
+                                      (batch_size, width, height))
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=init_generator_worker,
+            initargs=(self.config,))
+        if self.options["noise_bank"] is not None:
+            build_configured_bank(self.config, self._executor)
+        self._rendering = deque()  # (future, slot, indices), in order
+        self._writing = set()
+        self._next_index = 0
+        self.folder = None
+        self._io = None
+        if tee is not None:
+            self._start_tee(tee)
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def __len__(self):
+        return -(-len(self.parameters) // self.batch_size)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        self._reap_writes()
+        self._submit()
+        while not self._rendering and self._writing:
+            # Every slot is waiting for its images to be stored
+            self._wait_for_writes()
+            self._submit()
+        if not self._rendering:
+            self.close()
+            raise StopIteration
+
+        future, slot, indices = self._rendering.popleft()
+        try:
+            future.result()
+        except BaseException:
+            self._slots.release(slot)
+            self.close()
+            raise
+        view = self._slots.view(slot)[:len(indices)]
+        images = view.copy()
+        if self._io is None:
+            self._slots.release(slot)
+        else:
+            self._writing.add(self._io.submit(self._store, slot, indices))
+        self._submit()
+        return images, self.parameters[indices.start:indices.stop]
+
+    def close(self):
+        """
+        Stops the stream; idempotent. Images already rendered but not yet
+        yielded are discarded (and not stored).
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for future, _, _ in self._rendering:
+            future.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._rendering.clear()
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+            self._writer.close()
+            self._logger.close()
+            self._completion_log.close()
+        self._slots.close()
+
+    def _submit(self):
+        # Keep every free slot rendering the next batch
+        while self._next_index < len(self.parameters):
+            slot = self._slots.acquire()
+            if slot is None:
+                return
+            start = self._next_index
+            indices = range(start, min(start + self.batch_size,
+                                       len(self.parameters)))
+            self._next_index = indices.stop
+            future = self._executor.submit(
+                render_into_slot,
+                table_to_dicts(self.parameters[indices.start:indices.stop]),
+                indices, self._slots.name(slot), self._slots.view(slot).shape,
+                self.canvas_size, self.options, self.run_seed)
+            self._rendering.append((future, slot, indices))
+
+    def _wait_for_writes(self):
+        wait(self._writing, return_when=FIRST_COMPLETED)
+        self._reap_writes()
+
+    def _reap_writes(self):
+        # Surfaces the errors of finished writes to the consumer
+        done = {future for future in self._writing if future.done()}
+        self._writing -= done
+        for future in done:
+            if future.exception() is not None:
+                self.close()
+                raise future.exception()
+
+    def _start_tee(self, tee):
+        """
+        Creates the run folder the stream is stored in, with the manifest
+        and parameter table `main.main()` writes for a run.
+        """
+        cfg = self.config
+        self.folder = create_output_folder(tee)
+        output_format = cfg.get("output_format", "tiff")
+        log_format = "npy" if output_format == "memmap" else \
+            cfg.get("parameter_log_format", "csv")
+        write_parameter_table(os.path.join(self.folder, "parameters.npy"),
+                              self.parameters)
+        write_manifest(self.folder, {
+            "created": get_timestamp(),
+            "seed": self.run_seed,
+            "num_images": len(self.parameters),
+            "canvas_size": list(self.canvas_size),
+            "render_options": self.options,
+            "tile_size": None,
+            "pyramid_sizes": [],
+            "output_format": output_format,
+            "parameter_table": "parameters.npy",
+            "parameter_log": f"parameters_log.{log_format}",
+            "completion_log": "completed.csv",
+            "config": dict(cfg, tile_size=None, pyramid_sizes=None),
+        })
+        options = tiff_options(cfg.get("tiff_compression"),
+                               cfg.get("tiff_predictor", False),
+                               cfg.get("tiff_compression_level"),
+                               cfg.get("tiff_layout", "strip"),
+                               cfg.get("tiff_tile_size", 256),
+                               cfg.get("tiff_rowsperstrip")) \
+            if output_format == "tiff" else None
+        self._writer = create_image_writer(
+            output_format, self.folder, len(self.parameters),
+            self.canvas_size, options=options,
+            stack_size=cfg.get("tiff_stack_size", 1))
+        self._logger = ParameterLogger(
+            os.path.join(self.folder, f"parameters_log.{log_format}"),
+            fmt=log_format, flush_every=cfg.get("parameter_log_flush", 256))
+        self._completion_log = CompletionLog(
+            os.path.join(self.folder, "completed.csv"))
+        self._recorder = RunRecorder(ParameterTable(self.parameters),
+                                     self._logger, self._completion_log,
+                                     self._writer)
+        # One thread, so the writer and the logs have a single user
+        self._io = ThreadPoolExecutor(max_workers=1,
+                                      thread_name_prefix="nearfield-tee")
+
+    def _store(self, slot, indices):
+        # Runs in the tee thread; the slot is released once it is stored
+        try:
+            images = self._slots.view(slot)
+            for offset, index in enumerate(indices):
+                write_start = time.perf_counter()
+                name = self._writer.write(index, images[offset])
+                self._recorder.record(index, name,
+                                      image_checksum(images[offset]),
+                                      time.perf_counter() - write_start)
+        finally:
+            self._slots.release(slot)
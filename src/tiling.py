@@ -0,0 +1,50 @@
+# tiling.py
+
+from src.image_generator import generate_nearfield_tile
+from src.seeding import tile_rng
+
+# Tile edges must be multiples of 16 to be stored as TIFF tiles
+TILE_ALIGNMENT = 16
+
+
+def tile_windows(canvas_size, tile_size):
+    """
+    Splits a canvas into square tiles in row-major order.
+
+    Parameters:
+    - canvas_size (tuple): Size of the canvas (width, height).
+    - tile_size (int): Edge length of the tiles; edge tiles are cropped.
+
+    Returns:
+    - list of tuples: (rows, columns) slices of the (width, height) image
+    array, in the order TIFF tiles are stored.
+    """
+    if tile_size < 1 or tile_size % TILE_ALIGNMENT:
+        raise ValueError(
+            f"Expected tile_size to be a positive multiple of {TILE_ALIGNMENT}")
+    width, height = canvas_size
+    return [(slice(row, min(row + tile_size, width)),
+             slice(column, min(column + tile_size, height)))
+            for row in range(0, width, tile_size)
+            for column in range(0, height, tile_size)]
+
+
+def iter_nearfield_tiles(params, canvas_size, tile_size, run_seed, index,
+                         **options):
+    """
+    Generates the tiles of one image one after another in this process.
+
+    Parameters:
+    - params (dict): Dictionary of parameters for the Nearfield image.
+    - canvas_size (tuple): Size of the full image (width, height).
+    - tile_size (int): Edge length of the tiles.
+    - run_seed (int): Seed of the run, see `src.seeding`.
+    - index (int): Index of the image in the run.
+    - **options: Rendering options, see `generate_nearfield_tile`.
+
+    Yields:
+    - numpy array: uint16 tiles in `tile_windows` order.
+    """
+    for number, window in enumerate(tile_windows(canvas_size, tile_size)):
+        yield generate_nearfield_tile(params, canvas_size, window, **options,
+                                      rng=tile_rng(run_seed, index, number))
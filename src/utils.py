@@ -0,0 +1,111 @@
+# utils.py
+
+from collections import OrderedDict
+
+
+def nbytes_of(value):
+    """
+    Returns the memory footprint of an array or a (nested) tuple of arrays.
+
+    Parameters:
+    - value: numpy array, tuple/list of arrays, or any other object.
+
+    Returns:
+    - int: Total `nbytes` of the contained arrays (0 for other objects).
+    """
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes_of(item) for item in value)
+    return int(getattr(value, "nbytes", 0))
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by item count and/or total bytes.
+
+    Parameters:
+    - max_items (int or None): Maximum number of entries kept.
+    - max_bytes (int or None): Maximum total `nbytes_of` the values kept.
+    - on_evict (callable or None): Called with (key, value) for every entry
+    evicted to make room, e.g. to spill it to disk.
+    """
+
+    def __init__(self, max_items=None, max_bytes=None, on_evict=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for `key` and marks it as recently used.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """
+        Stores `value` under `key`, evicting the oldest entries as needed.
+        Values larger than `max_bytes` on their own are not stored.
+        """
+        size = nbytes_of(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._total_bytes -= self._sizes.pop(key)
+            del self._entries[key]
+        self._entries[key] = value
+        self._sizes[key] = size
+        self._total_bytes += size
+        self._evict()
+
+    def resize(self, max_items=None, max_bytes=None):
+        """
+        Changes the bounds of the cache, evicting entries if necessary.
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self._total_bytes = 0
+
+    def stats(self):
+        """
+        Returns hit/miss counters and current occupancy as a dict.
+        """
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": len(self._entries),
+                "bytes": self._total_bytes}
+
+    def _evict(self):
+        while self._entries and (
+                (self.max_items is not None
+                 and len(self._entries) > self.max_items)
+                or (self.max_bytes is not None
+                    and self._total_bytes > self.max_bytes)):
+            key, value = self._entries.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(key)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(key, value)
@@ -0,0 +1,68 @@
+# test_dataset.py
+
+import os
+import shutil
+import unittest
+import numpy as np
+from config import config
+from src.dataset import NearfieldDataset
+from src.image_generator import generate_nearfield_image_impl, render_options
+from src.output_manager import write_manifest, write_parameter_table
+from src.parameter_sampler import sample_parameters
+from src.seeding import image_rng, resolve_run_seed
+
+class TestNearfieldDataset(unittest.TestCase):
+
+    canvas_size = (64, 64)
+
+    def setUp(self):
+        ranges = dict(config["parameter_ranges"],
+                      major_axis=(15, 25), minor_axis=(15, 25))
+        self.param_list = sample_parameters(ranges, 4)
+        self.test_dir = "test_output_dataset"
+        os.makedirs(self.test_dir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_images_are_regenerated_exactly(self):
+        dataset = NearfieldDataset(self.param_list, 123, self.canvas_size,
+                                   cache_size=2)
+        self.assertEqual(len(dataset), 4)
+        for index, params in enumerate(self.param_list):
+            expected = generate_nearfield_image_impl(
+                params, self.canvas_size, **render_options(),
+                rng=image_rng(123, index))
+            np.testing.assert_array_equal(dataset[index], expected)
+        np.testing.assert_array_equal(dataset[-1], dataset[3])
+        with self.assertRaises(IndexError):
+            dataset[4]
+
+    def test_cache_is_bounded(self):
+        dataset = NearfieldDataset(self.param_list, 5, self.canvas_size,
+                                   cache_size=2)
+        first = dataset[0]
+        self.assertIs(dataset[0], first)
+        self.assertFalse(first.flags.writeable)
+        list(dataset)
+        info = dataset.cache_info()
+        self.assertEqual(info["entries"], 2)
+        self.assertEqual(info["hits"], 2)  # dataset[0] twice more
+
+    def test_from_folder(self):
+        run_seed = resolve_run_seed(None)
+        write_parameter_table(os.path.join(self.test_dir, "parameters.npy"),
+                              self.param_list)
+        write_manifest(self.test_dir, {
+            "seed": run_seed, "canvas_size": list(self.canvas_size),
+            "render_options": render_options(),
+            "parameter_table": "parameters.npy"})
+
+        dataset = NearfieldDataset.from_folder(self.test_dir)
+        reference = NearfieldDataset(self.param_list, run_seed,
+                                     self.canvas_size)
+        self.assertEqual(list(dataset.parameter_sets), self.param_list)
+        np.testing.assert_array_equal(dataset[2], reference[2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# test_geometry.py
+
+import unittest
+import numpy as np
+from src.geometry import (get_canvas_geometry, set_geometry_cache_size,
+                          clear_geometry_cache, geometry_cache_info,
+                          GEOMETRY_CACHE_SIZE)
+from src.image_generator import apply_asymmetry
+from src.utils import LRUCache
+
+class TestGeometryCache(unittest.TestCase):
+
+    def setUp(self):
+        clear_geometry_cache()
+
+    def tearDown(self):
+        set_geometry_cache_size(GEOMETRY_CACHE_SIZE)
+        clear_geometry_cache()
+
+    def test_geometry_is_shared_and_read_only(self):
+        first = get_canvas_geometry((64, 48))
+        second = get_canvas_geometry((64, 48))
+        self.assertIs(first, second)
+        self.assertEqual(first.x_centered.shape, (1, 64))
+        self.assertEqual(first.y_centered.shape, (48, 1))
+        for array in first:
+            self.assertFalse(array.flags.writeable)
+
+    def test_geometry_keyed_by_dtype(self):
+        geometry64 = get_canvas_geometry((32, 32), np.float64)
+        geometry32 = get_canvas_geometry((32, 32), np.float32)
+        self.assertIsNot(geometry64, geometry32)
+        self.assertEqual(geometry32.x_ramp.dtype, np.float32)
+
+    def test_cache_is_bounded(self):
+        set_geometry_cache_size(2)
+        for size in (16, 24, 32):
+            get_canvas_geometry((size, size))
+        info = geometry_cache_info()
+        self.assertEqual(info["entries"], 2)
+        self.assertEqual(info["evictions"], 1)
+
+    def test_apply_asymmetry_matches_linspace_gradients(self):
+        image = np.zeros((40, 30))
+        expected = (np.linspace(-0.3, 0.3, 40).reshape(-1, 1)
+                    + np.linspace(0.2, -0.2, 30).reshape(1, -1))
+        np.testing.assert_allclose(apply_asymmetry(image, 0.3, -0.2), expected,
+                                   atol=1e-12)
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_byte_bound_evicts_oldest(self):
+        cache = LRUCache(max_bytes=2000)
+        cache.put("a", np.zeros(100))  # 800 bytes
+        cache.put("b", np.zeros(100))
+        cache.get("a")
+        cache.put("c", np.zeros(100))
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertLessEqual(cache.total_bytes, 2000)
+
+    def test_oversized_value_not_stored(self):
+        cache = LRUCache(max_bytes=100)
+        cache.put("big", np.zeros(100))
+        self.assertEqual(len(cache), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+# test_image_generator.py
+
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from config import config
+from src.parameter_sampler import sample_parameters
+from src.scratch import (get_scratch_buffers, clear_scratch_buffers,
+                         _scratch_cache)
+from src.seeding import image_rng, image_rngs
+from src.image_generator import (create_elliptical_mask,
+                                 elliptical_signed_distance,
+                                 apply_erf_to_distance, apply_erf_rolloff,
+                                 apply_gaussian_noise,
+                                 create_elliptical_rolloff,
+                                 generate_nearfield_image_impl,
+                                 generate_nearfield_batch, pyramid_sizes,
+                                 downsample_pyramid,
+                                 generate_nearfield_pyramid, prepare_worker)
+
+class TestErfRolloff(unittest.TestCase):
+
+    canvas_size = (256, 256)
+    geometry = (90, 70, 33)
+
+    def test_signed_distance_sign_matches_mask(self):
+        mask = create_elliptical_mask(self.canvas_size, *self.geometry)
+        distance = elliptical_signed_distance(self.canvas_size, *self.geometry)
+        np.testing.assert_array_equal(distance > 0, mask > 0)
+
+    def test_signed_distance_close_to_edt(self):
+        mask = create_elliptical_mask(self.canvas_size, *self.geometry)
+        edt = distance_transform_edt(mask) - distance_transform_edt(1 - mask)
+        distance = elliptical_signed_distance(self.canvas_size, *self.geometry)
+
+        # Compare in a band around the edge, where the roll-off lives
+        edge = np.abs(edt) < 20
+        self.assertLessEqual(np.abs(distance - edt)[edge].max(), 1.0)
+
+    def test_band_matches_full_evaluation(self):
+        distance = elliptical_signed_distance(self.canvas_size, *self.geometry)
+        full = apply_erf_to_distance(distance, 0.05)
+        banded = apply_erf_to_distance(distance, 0.05, band=4.0)
+        np.testing.assert_allclose(banded, full, atol=1e-7)
+
+    def test_rolloff_methods_agree(self):
+        analytic = create_elliptical_rolloff(self.canvas_size, *self.geometry,
+                                             0.05, method="analytic")
+        edt = create_elliptical_rolloff(self.canvas_size, *self.geometry,
+                                        0.05, method="edt")
+        np.testing.assert_allclose(analytic, edt, atol=0.03)
+
+        mask = create_elliptical_mask(self.canvas_size, *self.geometry)
+        np.testing.assert_array_equal(edt, apply_erf_rolloff(mask, 0.05))
+
+    def test_float32_rolloff_stays_float32(self):
+        distance = elliptical_signed_distance(self.canvas_size, *self.geometry,
+                                              dtype=np.float32)
+        for band in (None, 4.0):
+            self.assertEqual(apply_erf_to_distance(distance, 0.05, band).dtype,
+                             np.float32)
+            for method in ("analytic", "edt"):
+                rolloff = create_elliptical_rolloff(
+                    self.canvas_size, *self.geometry, 0.05, method=method,
+                    band=band, dtype=np.float32)
+                self.assertEqual(rolloff.dtype, np.float32)
+
+    def test_unknown_rolloff_method(self):
+        with self.assertRaises(ValueError):
+            create_elliptical_rolloff(self.canvas_size, *self.geometry, 0.05,
+                                      method="unknown")
+
+class TestNearfieldBatch(unittest.TestCase):
+
+    canvas_size = (96, 96)
+
+    def setUp(self):
+        ranges = dict(config["parameter_ranges"],
+                      major_axis=(20, 40), minor_axis=(20, 40))
+        self.param_list = sample_parameters(ranges, 3)
+        # Without Gaussian noise the output is deterministic
+        for params in self.param_list:
+            params["gaussian_noise"] = 0.0
+
+    def test_batch_matches_single_images(self):
+        for method in ("analytic", "edt"):
+            batch = generate_nearfield_batch(self.param_list, self.canvas_size,
+                                             rolloff_method=method)
+            self.assertEqual(batch.shape, (3, 96, 96))
+            self.assertEqual(batch.dtype, np.uint16)
+            self.assertTrue(batch.flags.c_contiguous)
+            for image, params in zip(batch, self.param_list):
+                expected = generate_nearfield_image_impl(
+                    params, self.canvas_size, rolloff_method=method)
+                np.testing.assert_array_equal(image, expected)
+
+    def test_float32_and_fused_paths(self):
+        params = self.param_list[0]
+        expected = generate_nearfield_image_impl(params, self.canvas_size)
+        for compute_dtype in ("float64", "float32"):
+            for fused in (False, True):
+                for band in (None, 4.0):
+                    image = generate_nearfield_image_impl(
+                        params, self.canvas_size, compute_dtype=compute_dtype,
+                        fused=fused, rolloff_band=band)
+                    self.assertEqual(image.dtype, np.uint16)
+                    difference = np.abs(image.astype(int) - expected)
+                    self.assertLessEqual(difference.max(), 4)
+
+        batch = generate_nearfield_batch(self.param_list, self.canvas_size,
+                                         compute_dtype="float32")
+        self.assertLessEqual(np.abs(batch[0].astype(int) - expected).max(), 4)
+
+    def test_float32_paths_stay_float32(self):
+        # The masked image reaches the Gaussian noise stage in float32
+        with mock.patch("src.image_generator.apply_gaussian_noise",
+                        wraps=apply_gaussian_noise) as noise:
+            generate_nearfield_image_impl(self.param_list[0], self.canvas_size,
+                                          compute_dtype="float32")
+            generate_nearfield_batch(self.param_list, self.canvas_size,
+                                     compute_dtype="float32")
+        self.assertEqual([call.args[0].dtype for call in noise.call_args_list],
+                         [np.float32, np.float32])
+
+    def test_fused_batch_matches_fused_images(self):
+        for compute_dtype in ("float64", "float32"):
+            batch = generate_nearfield_batch(self.param_list, self.canvas_size,
+                                             compute_dtype=compute_dtype,
+                                             fused=True)
+            for image, params in zip(batch, self.param_list):
+                expected = generate_nearfield_image_impl(
+                    params, self.canvas_size, compute_dtype=compute_dtype,
+                    fused=True)
+                np.testing.assert_array_equal(image, expected)
+
+    def test_fused_path_reuses_scratch_and_is_seedable(self):
+        params = dict(self.param_list[0], gaussian_noise=0.04)
+        np.random.seed(3)
+        first = generate_nearfield_image_impl(params, self.canvas_size,
+                                              compute_dtype="float32",
+                                              fused=True)
+        np.random.seed(3)
+        second = generate_nearfield_image_impl(params, self.canvas_size,
+                                               compute_dtype="float32",
+                                               fused=True)
+        np.testing.assert_array_equal(first, second)
+
+        buffers = get_scratch_buffers(self.canvas_size, np.float32, 4)
+        self.assertIs(buffers, get_scratch_buffers(self.canvas_size,
+                                                   np.float32, 4))
+
+    def test_seeded_noise_independent_of_batching(self):
+        noisy = [dict(params, gaussian_noise=0.04)
+                 for params in self.param_list]
+        for compute_dtype in ("float64", "float32"):
+            plain = generate_nearfield_batch(noisy, self.canvas_size,
+                                             compute_dtype=compute_dtype,
+                                             rng=image_rngs(7, 10, 3))
+            for fused in (False, True):
+                options = {"compute_dtype": compute_dtype, "fused": fused}
+                batch = generate_nearfield_batch(noisy, self.canvas_size,
+                                                 **options,
+                                                 rng=image_rngs(7, 10, 3))
+                for offset, (image, params) in enumerate(zip(batch, noisy)):
+                    expected = generate_nearfield_image_impl(
+                        params, self.canvas_size, **options,
+                        rng=image_rng(7, 10 + offset))
+                    np.testing.assert_array_equal(image, expected)
+                # The fused path draws the same noise, too
+                difference = np.abs(batch.astype(int) - plain)
+                self.assertLessEqual(difference.max(), 1)
+
+        # Different images of a run, and different runs, get different noise
+        self.assertFalse(np.array_equal(
+            generate_nearfield_image_impl(noisy[0], self.canvas_size,
+                                          rng=image_rng(7, 10)),
+            generate_nearfield_image_impl(noisy[0], self.canvas_size,
+                                          rng=image_rng(8, 10))))
+
+    def test_empty_batch(self):
+        batch = generate_nearfield_batch([], self.canvas_size)
+        self.assertEqual(batch.shape, (0, 96, 96))
+
+class TestPyramid(unittest.TestCase):
+
+    def test_pyramid_sizes(self):
+        self.assertEqual(pyramid_sizes((512, 256), [256, (64, 32)]),
+                         [(256, 128), (64, 32)])
+        self.assertEqual(pyramid_sizes((512, 512), None), [])
+        with self.assertRaises(ValueError):
+            pyramid_sizes((512, 512), [384])
+
+    def test_levels_are_block_means(self):
+        image = np.arange(64, dtype=np.uint16).reshape(8, 8) * 1000
+        half, quarter, eighth = downsample_pyramid(image,
+                                                   [(4, 4), (2, 2), (1, 1)])
+        expected = image.reshape(4, 2, 4, 2).mean(axis=(1, 3))
+        np.testing.assert_array_equal(half, np.rint(expected))
+        np.testing.assert_array_equal(
+            quarter, np.rint(image.reshape(2, 4, 2, 4).mean(axis=(1, 3))))
+        self.assertEqual(eighth.dtype, np.uint16)
+        self.assertEqual(eighth[0, 0], round(image.mean()))
+
+    def test_generate_pyramid(self):
+        params = sample_parameters(config["parameter_ranges"], 1, seed=3)[0]
+        images = generate_nearfield_pyramid(params, (128, 128), [64, 32],
+                                            rng=image_rng(1, 0))
+        np.testing.assert_array_equal(
+            images[0], generate_nearfield_image_impl(params, (128, 128),
+                                                     rng=image_rng(1, 0)))
+        self.assertEqual([image.shape for image in images],
+                         [(128, 128), (64, 64), (32, 32)])
+
+class TestStartup(unittest.TestCase):
+
+    def test_heavy_modules_are_imported_lazily(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = ("import sys, main; print(' '.join(sorted(m for m in "
+                "('scipy.special', 'scipy.ndimage', 'scipy.stats', 'noise') "
+                "if m in sys.modules)))")
+        loaded = subprocess.run([sys.executable, "-c", code], cwd=root,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(loaded.stdout.strip(), "")
+
+    def test_prepare_worker(self):
+        options = {"compute_dtype": "float32", "fused": True,
+                   "rolloff_method": "edt"}
+        clear_scratch_buffers()
+        prepare_worker((48, 48), options)
+        self.assertIn(((48, 48), np.dtype(np.float32).str, 4), _scratch_cache)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+# test_main.py
+
+import copy
+import io
+import json
+import os
+import shutil
+import time
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+import numpy as np
+from tifffile import imread
+import main
+from config import config
+from src.output_manager import (ParameterLogger, TiffWriter, image_filename,
+                                read_completion_log, read_parameter_log)
+from src.shared_buffers import SharedImagePool
+
+
+class CountingPool(SharedImagePool):
+    """
+    Shared-memory pool that records the most slots taken at once.
+    """
+
+    peak = 0
+
+    def acquire(self):
+        slot = super().acquire()
+        CountingPool.peak = max(CountingPool.peak, len(self) - self.num_free)
+        return slot
+
+
+class ProgressLogger(ParameterLogger):
+    """
+    Parameter log that records, after each logged row, how many rows are
+    on disk.
+    """
+
+    on_disk = []
+
+    def log(self, index, filename, params):
+        super().log(index, filename, params)
+        rows = 0
+        if os.path.exists(self.path):
+            with open(self.path) as file:
+                rows = len(file.readlines()) - 1
+        ProgressLogger.on_disk.append(rows)
+
+
+def slow_write(fail_index=None):
+    """
+    Returns a TiffWriter.write that takes longer than rendering a 64 px
+    image and raises for image `fail_index`.
+    """
+    write = TiffWriter.write
+
+    def slow(writer, index, image):
+        time.sleep(0.02)
+        if index == fail_index:
+            raise OSError("No space left on device")
+        return write(writer, index, image)
+    return slow
+
+
+class TestMain(unittest.TestCase):
+
+    settings = {"canvas_size": (64, 64), "num_images": 6, "num_workers": 2,
+                "seed": 7, "batch_size": 2, "shared_slots": 2,
+                "perlin_method": "vectorized", "output_format": "tiff",
+                "tiff_stack_size": 1, "tile_size": None}
+
+    def setUp(self):
+        self.test_dir = "test_output_main"
+        self.saved_config = copy.deepcopy(config)
+        config.update(self.settings)
+        self.runs = 0
+        # Runs started within the same second would share a timestamped folder
+        patcher = mock.patch("main.create_output_folder", self.create_folder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        config.clear()
+        config.update(self.saved_config)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def create_folder(self, base_folder):
+        self.runs += 1
+        folder = os.path.join(self.test_dir, f"run_{self.runs}")
+        os.makedirs(folder)
+        return folder
+
+    def run_main(self, **overrides):
+        config.update(self.settings, **overrides)
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            return main.main([])
+
+    def read_images(self, folder):
+        return np.stack([imread(os.path.join(folder, image_filename(index)))
+                         for index in range(config["num_images"])])
+
+    def test_parent_writes_match_worker_writes(self):
+        worker = self.run_main(write_mode="worker")
+        parent = self.run_main(write_mode="parent")
+        np.testing.assert_array_equal(self.read_images(parent),
+                                      self.read_images(worker))
+        records = read_completion_log(os.path.join(parent, "completed.csv"))
+        self.assertEqual(sorted(records), list(range(6)))
+        rows = read_parameter_log(os.path.join(parent, "parameters_log.csv"))
+        self.assertEqual([row["index"] for row in rows], list(range(6)))
+
+    def test_pipelined_writes_are_bounded_by_the_slots(self):
+        worker = self.run_main(write_mode="worker")
+        parent = self.run_main(write_mode="parent")
+        CountingPool.peak = 0
+        with mock.patch("main.SharedImagePool", CountingPool), \
+             mock.patch.object(TiffWriter, "write", slow_write()):
+            pipelined = self.run_main(write_mode="pipelined", io_workers=2)
+        images = self.read_images(pipelined)
+        np.testing.assert_array_equal(images, self.read_images(worker))
+        np.testing.assert_array_equal(images, self.read_images(parent))
+        # The slow writes keep every slot taken, and never more
+        self.assertEqual(CountingPool.peak, self.settings["shared_slots"])
+
+    def test_failed_pipelined_write_is_not_completed(self):
+        with mock.patch.object(TiffWriter, "write", slow_write(3)):
+            folder = self.run_main(write_mode="pipelined", io_workers=2,
+                                   batch_size=1)
+        records = read_completion_log(os.path.join(folder, "completed.csv"))
+        self.assertEqual(sorted(records), [0, 1, 2, 4, 5])
+        rows = read_parameter_log(os.path.join(folder, "parameters_log.csv"))
+        self.assertEqual([row["index"] for row in rows], [0, 1, 2, 4, 5])
+
+    def test_parameter_log_is_written_during_cost_ordered_runs(self):
+        # Seed 5 has image 0 dispatched 15th of 16 by the cost schedule
+        ProgressLogger.on_disk = []
+        with mock.patch("main.ParameterLogger", ProgressLogger):
+            folder = self.run_main(seed=5, num_images=16, num_workers=1,
+                                   batch_size=1, write_mode="parent",
+                                   schedule="cost", parameter_log_flush=2,
+                                   parameter_log_reorder=2)
+        # At most parameter_log_reorder rows are held back, plus a partial
+        # batch, at any point of the run
+        for logged, on_disk in enumerate(ProgressLogger.on_disk, start=1):
+            self.assertGreaterEqual(on_disk, logged - 2 - 1)
+        rows = read_parameter_log(os.path.join(folder, "parameters_log.csv"))
+        self.assertEqual([row["index"] for row in rows], list(range(16)))
+    def test_tiled_profile_records_writes(self):
+        folder = self.run_main(tile_size=32, write_mode="parent",
+                               profile=True)
+        with open(os.path.join(folder, "profile.json")) as file:
+            summary = json.load(file)
+        self.assertAlmostEqual(summary["images"], 6)
+        stages = summary["stage_seconds_per_image"]
+        self.assertIn("write", stages)
+        self.assertIn("perlin", stages)
+
+if __name__ == "__main__":
+    unittest.main()
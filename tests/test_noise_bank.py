@@ -0,0 +1,88 @@
+# test_noise_bank.py
+
+import os
+import shutil
+import unittest
+import numpy as np
+from config import config
+from src.image_generator import (generate_nearfield_image_impl,
+                                 generate_nearfield_batch,
+                                 generate_nearfield_tile,
+                                 generate_perlin_noise)
+from src.noise_bank import (bank_layout, build_noise_bank, bank_noise,
+                            open_noise_bank)
+from src.parameter_sampler import sample_parameters
+from src.tiling import tile_windows
+
+class TestNoiseBank(unittest.TestCase):
+
+    canvas_size = (64, 64)
+    bins = {"perlin_scale": 2, "perlin_persistence": 2, "perlin_lacunarity": 1}
+
+    def setUp(self):
+        self.test_dir = "test_output_noise_bank"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.path = os.path.join(self.test_dir, "bank.npy")
+        self.ranges = config["parameter_ranges"]
+        build_noise_bank(self.path, self.canvas_size, self.ranges, self.bins)
+        self.options = {"perlin_method": "bank", "noise_bank": self.path}
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_layout_and_reuse(self):
+        layout = bank_layout(self.ranges, self.bins)
+        self.assertEqual(layout["perlin_octaves"], [1, 2, 3, 4, 5])
+        self.assertEqual(layout["perlin_scale"], [32.5, 77.5])
+        textures, metadata = open_noise_bank(self.path)
+        self.assertEqual(textures.shape, (20, 128, 128))
+        self.assertFalse(textures.flags.writeable)
+
+        _, built = build_noise_bank(self.path, self.canvas_size, self.ranges,
+                                    self.bins)
+        self.assertFalse(built)
+        with self.assertRaises(ValueError):
+            build_noise_bank(self.path, self.canvas_size, self.ranges,
+                             self.bins, max_bytes=20 * 64 * 64 * 4 - 1)
+
+    def test_crop_is_deterministic_and_tiles_match(self):
+        noise = bank_noise(self.path, self.canvas_size, 40.0, 3, 0.5, 2.0)
+        self.assertEqual(noise.shape, self.canvas_size)
+        np.testing.assert_array_equal(
+            noise, bank_noise(self.path, self.canvas_size, 40.0, 3, 0.5, 2.0))
+        self.assertFalse(np.array_equal(
+            noise, bank_noise(self.path, self.canvas_size, 40.1, 3, 0.5, 2.0)))
+        for window in tile_windows(self.canvas_size, 32):
+            np.testing.assert_array_equal(
+                bank_noise(self.path, self.canvas_size, 40.0, 3, 0.5, 2.0,
+                           window=window), noise[window])
+
+    def test_noise_is_scaled_by_amplitude(self):
+        unit = generate_perlin_noise(self.canvas_size, 40.0, 3, 0.5, 2.0, 1.0,
+                                     method="bank", bank=self.path)
+        half = generate_perlin_noise(self.canvas_size, 40.0, 3, 0.5, 2.0, 0.5,
+                                     method="bank", bank=self.path)
+        offset = config["DC_OFFSET"]
+        np.testing.assert_allclose(half - offset, (unit - offset) / 2)
+
+    def test_render_paths_agree(self):
+        param_list = sample_parameters(self.ranges, 3, seed=1)
+        for params in param_list:
+            params.update(major_axis=20, minor_axis=25, gaussian_noise=0.0)
+        batch = generate_nearfield_batch(param_list, self.canvas_size,
+                                         **self.options)
+        for params, image in zip(param_list, batch):
+            expected = generate_nearfield_image_impl(params, self.canvas_size,
+                                                     **self.options)
+            np.testing.assert_array_equal(image, expected)
+            fused = generate_nearfield_image_impl(params, self.canvas_size,
+                                                  fused=True, **self.options)
+            np.testing.assert_array_equal(fused, expected)
+            for window in tile_windows(self.canvas_size, 32):
+                tile = generate_nearfield_tile(params, self.canvas_size,
+                                               window, **self.options)
+                difference = np.abs(tile.astype(int) - expected[window])
+                self.assertLessEqual(difference.max(), 1)
+
+if __name__ == "__main__":
+    unittest.main()
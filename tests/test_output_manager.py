@@ -4,8 +4,15 @@ import unittest
 import os
 import numpy as np
 from datetime import datetime
-from tifffile import imread
-from src.output_manager import create_output_folder, save_image, log_parameters
+from tifffile import imread, TiffFile
+from src.image_generator import downsample_pyramid
+from src.output_manager import (create_output_folder, save_image, log_parameters,
+                                ParameterLogger, create_image_writer,
+                                open_image_store, CompletionLog,
+                                read_completion_log, verify_outputs,
+                                image_checksum, write_parameter_table,
+                                read_parameter_table, tiff_options,
+                                RunRecorder, read_parameter_log)
 
 class TestOutputManager(unittest.TestCase):
 
@@ -80,5 +87,323 @@ class TestOutputManager(unittest.TestCase):
             expected_values = [filename] + [str(v) for v in parameters.values()]
             self.assertEqual(values, expected_values)
 
+class TestParameterLogger(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = "test_output"
+        os.makedirs(cls.test_dir, exist_ok=True)
+
+    def log_out_of_order(self, logger):
+        for index in (2, 0, 3, 1):
+            logger.log(index, f"image_{index}.tiff",
+                       {"major_axis": 300 + index, "perlin_octaves": index})
+
+    def test_csv_rows_sorted_by_index(self):
+        path = os.path.join(self.test_dir, "sorted_log.csv")
+        with ParameterLogger(path, flush_every=1) as logger:
+            self.log_out_of_order(logger)
+
+        with open(path, 'r') as csv_file:
+            lines = csv_file.read().splitlines()
+        self.assertEqual(lines[0], "index,filename,major_axis,perlin_octaves")
+        self.assertEqual([line.split(',')[0] for line in lines[1:]],
+                         ["0", "1", "2", "3"])
+
+    def test_missing_indices_flushed_on_close(self):
+        path = os.path.join(self.test_dir, "gapped_log.csv")
+        with ParameterLogger(path) as logger:
+            logger.log(3, "image_3.tiff", {"major_axis": 303})
+            logger.log(1, "image_1.tiff", {"major_axis": 301})
+
+        with open(path, 'r') as csv_file:
+            lines = csv_file.read().splitlines()
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ["1", "3"])
+
+    def test_skipped_index_does_not_stall_the_log(self):
+        path = os.path.join(self.test_dir, "skipped_log.csv")
+        with ParameterLogger(path, flush_every=1) as logger:
+            logger.log(1, "image_1.tiff", {"major_axis": 301})
+            logger.log(2, "image_2.tiff", {"major_axis": 302})
+            logger.skip(0)
+            with open(path, 'r') as csv_file:
+                lines = csv_file.read().splitlines()
+            self.assertEqual([line.split(',')[0] for line in lines[1:]],
+                             ["1", "2"])
+            logger.skip(2)  # Already logged
+            logger.log(3, "image_3.tiff", {"major_axis": 303})
+
+        with open(path, 'r') as csv_file:
+            lines = csv_file.read().splitlines()
+        self.assertEqual([line.split(',')[0] for line in lines[1:]],
+                         ["1", "2", "3"])
+
+    def test_held_rows_are_capped(self):
+        path = os.path.join(self.test_dir, "capped_log.csv")
+        with ParameterLogger(path, flush_every=1, max_pending=2) as logger:
+            for index in (1, 3, 5, 6):
+                logger.log(index, f"image_{index}.tiff",
+                           {"major_axis": 300 + index})
+            # Rows 1 and 3 stopped waiting for images 0 and 2
+            with open(path, 'r') as csv_file:
+                lines = csv_file.read().splitlines()
+            self.assertEqual([line.split(',')[0] for line in lines[1:]],
+                             ["1", "3"])
+            for index in (0, 4):
+                logger.log(index, f"image_{index}.tiff",
+                           {"major_axis": 300 + index})
+
+        with open(path, 'r') as csv_file:
+            lines = csv_file.read().splitlines()
+        self.assertEqual([line.split(',')[0] for line in lines[1:]],
+                         ["1", "3", "0", "4", "5", "6"])
+        self.assertEqual([row["index"] for row in read_parameter_log(path)],
+                         [0, 1, 3, 4, 5, 6])
+
+    def test_npz_columns(self):
+        path = os.path.join(self.test_dir, "columnar_log")
+        with ParameterLogger(path, fmt="npz") as logger:
+            self.log_out_of_order(logger)
+
+        self.assertEqual(logger.path, path + ".npz")
+        columns = np.load(logger.path)
+        np.testing.assert_array_equal(columns["index"], [0, 1, 2, 3])
+        np.testing.assert_array_equal(columns["perlin_octaves"], [0, 1, 2, 3])
+        self.assertEqual(columns["filename"][2], "image_2.tiff")
+
+    def test_npy_structured_array(self):
+        path = os.path.join(self.test_dir, "structured_log")
+        with ParameterLogger(path, fmt="npy") as logger:
+            self.log_out_of_order(logger)
+
+        table = np.load(logger.path)
+        self.assertEqual(table.dtype.names,
+                         ("index", "filename", "major_axis", "perlin_octaves"))
+        np.testing.assert_array_equal(table["major_axis"], [300, 301, 302, 303])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ParameterLogger("log", fmt="xml")
+
+class TestImageWriters(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = "test_output"
+        os.makedirs(cls.test_dir, exist_ok=True)
+
+    def test_tiff_writer(self):
+        output_folder = create_output_folder(self.test_dir)
+        writer = create_image_writer("tiff", output_folder, 2, (16, 16))
+        image = np.full((16, 16), 1234, dtype=np.uint16)
+        filename = writer.write(1, image)
+        writer.close()
+
+        self.assertEqual(filename, "nearfield_image_002.tiff")
+        saved_image = imread(os.path.join(output_folder, filename))
+        np.testing.assert_array_equal(saved_image, image)
+
+    def test_memmap_writer_random_access(self):
+        output_folder = create_output_folder(self.test_dir)
+        writer = create_image_writer("memmap", output_folder, 3, (8, 8))
+        for index in (2, 0):
+            writer.write(index, np.full((8, 8), index + 1, dtype=np.uint16))
+        writer.close()
+
+        store = open_image_store(writer.path)
+        self.assertEqual(store.shape, (3, 8, 8))
+        self.assertEqual(store.dtype, np.uint16)
+        self.assertEqual(store[0, 0, 0], 1)
+        self.assertEqual(store[1, 0, 0], 0)
+        self.assertEqual(store[2, 0, 0], 3)
+
+    def test_compressed_tiled_tiff(self):
+        output_folder = os.path.join(self.test_dir, "compressed")
+        os.makedirs(output_folder, exist_ok=True)
+        options = tiff_options("zlib", predictor=True, layout="tile",
+                               tile_size=16)
+        writer = create_image_writer("tiff", output_folder, 1, (48, 40),
+                                     options=options)
+        image = np.zeros((48, 40), dtype=np.uint16)
+        image[8:40, 8:32] = 30000
+        filename = writer.write(0, image)
+
+        with TiffFile(os.path.join(output_folder, filename)) as tiff:
+            page = tiff.pages[0]
+            self.assertTrue(page.is_tiled)
+            self.assertEqual(page.compression, 8)  # Adobe deflate
+            self.assertEqual(page.predictor, 2)  # Horizontal differencing
+        np.testing.assert_array_equal(writer.read(0, filename), image)
+        self.assertLess(writer.stored_bytes(), image.nbytes)
+
+    def test_pyramid_levels(self):
+        image = np.arange(32 * 32, dtype=np.uint16).reshape(32, 32)
+        levels = [(16, 16), (8, 8)]
+        for output_format in ("tiff", "memmap"):
+            output_folder = os.path.join(self.test_dir,
+                                         f"pyramid_{output_format}")
+            os.makedirs(output_folder, exist_ok=True)
+            writer = create_image_writer(output_format, output_folder, 2,
+                                         (32, 32), levels=levels)
+            name = writer.write(1, image)
+            np.testing.assert_array_equal(writer.read(1, name), image)
+            for level, size in enumerate(levels, start=1):
+                np.testing.assert_array_equal(
+                    writer.read(1, name, level=level),
+                    downsample_pyramid(image, [size])[0])
+            writer.close()
+        with self.assertRaises(ValueError):
+            create_image_writer("tiff", self.test_dir, 2, (32, 32),
+                                stack_size=2, levels=levels)
+
+    def test_unusable_tiff_options(self):
+        with self.assertRaises(ValueError):
+            tiff_options(layout="tile", tile_size=20)
+        with self.assertRaises(ValueError):
+            tiff_options(layout="rows")
+
+    def test_tiff_stack_writer(self):
+        output_folder = os.path.join(self.test_dir, "stacks")
+        os.makedirs(output_folder, exist_ok=True)
+        writer = create_image_writer("tiff", output_folder, 5, (8, 8),
+                                     stack_size=2)
+        images = [np.full((8, 8), index, dtype=np.uint16)
+                  for index in range(5)]
+        self.assertEqual(list(writer.group(4)), [4])
+        name = writer.write(1, images[1])
+        self.assertEqual(name, "nearfield_stack_001.tiff[1]")
+        self.assertFalse(writer.durable(1))
+        writer.write(0, images[0])
+        self.assertTrue(writer.durable(1))
+        for index in (4, 2):
+            writer.write(index, images[index])
+        writer.close()  # Stack 2 is missing image 3 and is dropped
+
+        self.assertTrue(writer.durable(4))
+        self.assertFalse(writer.durable(2))
+        with TiffFile(os.path.join(output_folder, "nearfield_stack_001.tiff")
+                      ) as tiff:
+            self.assertTrue(tiff.is_bigtiff)
+            self.assertEqual(len(tiff.pages), 2)
+        np.testing.assert_array_equal(writer.read(1, name), images[1])
+        with self.assertRaises(ValueError):
+            writer.read(1, name, level=1)
+
+    def test_unknown_output_format(self):
+        with self.assertRaises(ValueError):
+            create_image_writer("gif", self.test_dir, 1, (8, 8))
+
+class TestRunState(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = "test_output"
+        os.makedirs(cls.test_dir, exist_ok=True)
+
+    def test_parameter_table_round_trip(self):
+        path = os.path.join(self.test_dir, "parameters.npy")
+        parameter_sets = [{"major_axis": 300.25 + index, "perlin_octaves": index}
+                          for index in range(3)]
+        write_parameter_table(path, parameter_sets)
+        restored = read_parameter_table(path)
+        self.assertEqual(list(restored), parameter_sets)
+        self.assertEqual(restored[1:], parameter_sets[1:])
+        self.assertIsInstance(restored[1]["perlin_octaves"], int)
+
+    def test_completion_log_survives_torn_line(self):
+        path = os.path.join(create_output_folder(self.test_dir),
+                            "completed.csv")
+        with CompletionLog(path) as log:
+            log.record(0, "a.tiff", 10, 111)
+        with open(path, "a") as file:
+            file.write("1,b.ti")  # Interrupted mid-write
+        with CompletionLog(path) as log:
+            log.record(2, "c.tiff", 30, 333)
+
+        records = read_completion_log(path)
+        self.assertEqual(sorted(records), [0, 2])
+        self.assertEqual(records[2], {"name": "c.tiff", "size": 30,
+                                      "crc32": 333})
+
+    def test_verify_outputs(self):
+        output_folder = create_output_folder(self.test_dir)
+        writer = create_image_writer("tiff", output_folder, 3, (16, 16))
+        records = {}
+        for index in range(3):
+            image = np.full((16, 16), index, dtype=np.uint16)
+            name = writer.write(index, image)
+            records[index] = {"name": name,
+                              "size": writer.stored_size(index, name),
+                              "crc32": image_checksum(image)}
+        os.remove(os.path.join(output_folder, records[0]["name"]))
+        save_image(np.full((16, 16), 9, dtype=np.uint16), records[1]["name"],
+                   output_folder)  # Same size, different pixels
+
+        self.assertEqual(verify_outputs(writer, records), {1, 2})
+        self.assertEqual(verify_outputs(writer, records, checksum=True), {2})
+
+    def test_verify_memmap_outputs(self):
+        output_folder = create_output_folder(self.test_dir)
+        writer = create_image_writer("memmap", output_folder, 3, (16, 16))
+        records = {}
+        for index in range(3):
+            image = np.full((16, 16), index, dtype=np.uint16)
+            name = writer.write(index, image)
+            records[index] = {"name": name,
+                              "size": writer.stored_size(index, name),
+                              "crc32": image_checksum(image)}
+        writer.close()
+        self.assertEqual(records[2]["size"], 16 * 16 * 2)
+        records[1]["name"] = "images.npy[0]"
+        self.assertEqual(verify_outputs(writer, records), {0, 2})
+
+        # A store reallocated at another canvas size no longer matches
+        create_image_writer("memmap", output_folder, 3, (8, 8)).close()
+        self.assertEqual(verify_outputs(writer, records), set())
+        # Nor does a truncated one
+        create_image_writer("memmap", output_folder, 3, (16, 16)).close()
+        with open(writer.path, "r+b") as file:
+            file.truncate(os.path.getsize(writer.path) - 1)
+        self.assertEqual(verify_outputs(writer, records), set())
+
+    def test_recorder_holds_images_until_stack_is_written(self):
+        output_folder = os.path.join(self.test_dir, "stack_run")
+        os.makedirs(output_folder, exist_ok=True)
+        path = os.path.join(output_folder, "completed.csv")
+        parameter_sets = [{"major_axis": 300.0 + index} for index in range(3)]
+        writer = create_image_writer("tiff", output_folder, 3, (8, 8),
+                                     stack_size=2)
+        log_path = os.path.join(output_folder, "log.csv")
+        with ParameterLogger(log_path) as logger, \
+             CompletionLog(path) as completion_log:
+            recorder = RunRecorder(parameter_sets, logger, completion_log,
+                                   writer)
+            for index in (0, 2, 1):
+                image = np.full((8, 8), index, dtype=np.uint16)
+                recorder.record(index, writer.write(index, image),
+                                image_checksum(image), write_seconds=0.5)
+                if index == 0:
+                    self.assertEqual(read_completion_log(path), {})
+
+        records = read_completion_log(path)
+        self.assertEqual(sorted(records), [0, 1, 2])
+        self.assertEqual(verify_outputs(writer, records, checksum=True),
+                         {0, 1, 2})
+        del records[1]  # A torn log line loses the whole stack
+        self.assertEqual(verify_outputs(writer, records), {2})
+
+        summary = recorder.summary(8 * 8 * 2)
+        self.assertEqual(summary["images"], 3)
+        self.assertEqual(summary["bytes_uncompressed"], 3 * 8 * 8 * 2)
+        self.assertEqual(summary["bytes_stored"], writer.stored_bytes())
+        self.assertAlmostEqual(summary["write_seconds"], 1.5)
+
+    def test_tiled_checksum_follows_tile_order(self):
+        image = np.arange(48 * 40, dtype=np.uint16).reshape(48, 40)
+        self.assertEqual(image_checksum(image),
+                         image_checksum(image, tile_size=48))
+        self.assertNotEqual(image_checksum(image),
+                            image_checksum(image, tile_size=16))
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,7 +2,11 @@
 
 import unittest
 import os
-from src.parameter_sampler import get_sampled_parameters
+import numpy as np
+from src.parameter_sampler import (get_sampled_parameters, sample_parameters,
+                                   sample_parameter_table,
+                                   iter_parameter_blocks, flatten_ranges,
+                                   ParameterTable)
 from config import config
 
 class TestParameterSampler(unittest.TestCase):
@@ -84,5 +88,47 @@ class TestParameterSampler(unittest.TestCase):
         # Check if the output file was created
         self.assertTrue(os.path.isfile(output_path), "Sampled parameters file was not created")
 
+class TestParameterTable(unittest.TestCase):
+
+    ranges = config["parameter_ranges"]
+
+    def assert_in_ranges(self, table):
+        for name, (min_val, max_val) in flatten_ranges(self.ranges).items():
+            self.assertTrue(np.all((table[name] >= min_val)
+                                   & (table[name] <= max_val)), name)
+
+    def test_methods_fill_a_structured_table(self):
+        for method in ("LHS", "random", "Sobol", "Halton", "sobol"):
+            table = sample_parameter_table(self.ranges, 100, method, seed=1)
+            self.assertEqual(len(table), 100)
+            self.assertEqual(table.dtype.names,
+                             tuple(flatten_ranges(self.ranges)))
+            self.assertEqual(table["perlin_octaves"].dtype, np.int64)
+            self.assert_in_ranges(table)
+
+        with self.assertRaises(ValueError):
+            sample_parameter_table(self.ranges, 10, "grid")
+
+    def test_seeded_sampling_is_reproducible(self):
+        first = sample_parameters(self.ranges, 8, "LHS", seed=42)
+        second = sample_parameters(self.ranges, 8, "LHS", seed=42)
+        self.assertEqual(first, second)
+        self.assertIsInstance(first[0]["perlin_octaves"], int)
+
+    def test_blocks_continue_the_sequence(self):
+        whole = sample_parameter_table(self.ranges, 96, "Halton", seed=3)
+        blocks = list(iter_parameter_blocks(self.ranges, 96, "Halton",
+                                            chunk_size=40, seed=3))
+        self.assertEqual([len(block) for block in blocks], [40, 40, 16])
+        np.testing.assert_array_equal(np.concatenate(blocks), whole)
+
+    def test_table_view(self):
+        table = sample_parameter_table(self.ranges, 5, seed=0)
+        view = ParameterTable(table)
+        self.assertEqual(len(view), 5)
+        self.assertEqual(view[2], sample_parameters(self.ranges, 5,
+                                                    seed=0)[2])
+        self.assertEqual(view[1:3], list(view)[1:3])
+
 if __name__ == "__main__":
     unittest.main()
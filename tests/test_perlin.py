@@ -0,0 +1,50 @@
+# test_perlin.py
+
+import unittest
+import numpy as np
+from noise import pnoise2
+from src.perlin import pnoise2_grid, PNOISE2_TOLERANCE
+from src.image_generator import generate_perlin_noise
+
+class TestPerlin(unittest.TestCase):
+
+    def test_matches_pnoise2_on_grid(self):
+        scale, octaves, persistence, lacunarity = 17.3, 4, 0.6, 2.3
+        size = 48
+        expected = np.array([[pnoise2(i / scale, j / scale, octaves=octaves,
+                                      persistence=persistence,
+                                      lacunarity=lacunarity)
+                              for j in range(size)] for i in range(size)])
+
+        x = (np.arange(size) / scale).reshape(-1, 1)
+        y = (np.arange(size) / scale).reshape(1, -1)
+        result = pnoise2_grid(x, y, octaves=octaves, persistence=persistence,
+                              lacunarity=lacunarity)
+
+        self.assertEqual(result.shape, (size, size))
+        np.testing.assert_allclose(result, expected, atol=PNOISE2_TOLERANCE)
+
+    def test_matches_pnoise2_on_scattered_points(self):
+        rng = np.random.default_rng(0)
+        x = rng.uniform(-3000, 3000, 200)
+        y = rng.uniform(-3000, 3000, 200)
+        expected = [pnoise2(a, b, octaves=2, lacunarity=2.5) for a, b in zip(x, y)]
+
+        result = pnoise2_grid(x, y, octaves=2, lacunarity=2.5)
+        np.testing.assert_allclose(result, expected, atol=PNOISE2_TOLERANCE)
+
+    def test_invalid_octaves(self):
+        with self.assertRaises(ValueError):
+            pnoise2_grid(0.5, 0.5, octaves=0)
+
+    def test_generate_perlin_noise_methods_agree(self):
+        args = ((40, 32), 12.0, 3, 0.5, 2.0, 0.8)
+        vectorized = generate_perlin_noise(*args, method="vectorized")
+        reference = generate_perlin_noise(*args, method="pnoise2")
+
+        self.assertEqual(vectorized.shape, reference.shape)
+        np.testing.assert_allclose(vectorized, reference,
+                                   atol=PNOISE2_TOLERANCE)
+
+if __name__ == "__main__":
+    unittest.main()
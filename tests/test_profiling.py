@@ -0,0 +1,67 @@
+# test_profiling.py
+
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+import numpy as np
+from config import config
+from src.parameter_sampler import sample_parameters
+from src.image_generator import generate_nearfield_image_impl
+from src.profiling import (make_timer, merge_records, NULL_TIMER,
+                           StageTimer, ProfileCollector)
+
+class TestProfiling(unittest.TestCase):
+
+    def test_disabled_timer_is_shared_no_op(self):
+        timer = make_timer(False)
+        self.assertIs(timer, NULL_TIMER)
+        self.assertFalse(timer.enabled)
+        with timer.stage("perlin"):
+            pass
+
+    def test_pipeline_stages_recorded(self):
+        params = sample_parameters(config["parameter_ranges"], 1)[0]
+        timer = StageTimer(trace_memory=True)
+        generate_nearfield_image_impl(params, (64, 64), timer=timer)
+        tracemalloc.stop()
+
+        record = timer.record()
+        self.assertEqual(list(record["seconds"]),
+                         ["perlin", "asymmetry", "signed_distance", "erf",
+                          "masking", "gaussian_noise", "quantize"])
+        self.assertTrue(all(seconds >= 0
+                            for seconds in record["seconds"].values()))
+        self.assertGreater(record["peak_bytes"]["perlin"], 0)
+
+    def test_collector_summary(self):
+        collector = ProfileCollector()
+        collector.add({"images": 1, "seconds": {"perlin": 0.2},
+                       "peak_bytes": {}})
+        collector.add({"images": 2, "seconds": {"perlin": 0.2},
+                       "peak_bytes": {}})
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "profile.json")
+            collector.write(path)
+            with open(path) as file:
+                summary = json.load(file)
+
+        self.assertEqual(summary["images"], 3)
+        perlin = summary["stage_seconds_per_image"]["perlin"]
+        self.assertAlmostEqual(perlin["mean"], 0.15)
+        self.assertAlmostEqual(perlin["max"], 0.2)
+        self.assertTrue(np.isfinite(summary["images_per_second"]))
+
+    def test_merge_records(self):
+        merged = merge_records([
+            {"images": 0.25, "seconds": {"perlin": 0.1}, "peak_bytes": {}},
+            {"images": 0.75, "seconds": {"perlin": 0.2, "erf": 0.1},
+             "peak_bytes": {"perlin": 64}}])
+        self.assertEqual(merged["images"], 1.0)
+        self.assertAlmostEqual(merged["seconds"]["perlin"], 0.3)
+        self.assertEqual(merged["peak_bytes"], {"perlin": 64})
+
+if __name__ == "__main__":
+    unittest.main()
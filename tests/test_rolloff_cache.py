@@ -0,0 +1,110 @@
+# test_rolloff_cache.py
+
+import os
+import shutil
+import unittest
+import numpy as np
+from config import config
+from src.image_generator import (generate_nearfield_image_impl,
+                                 generate_nearfield_batch,
+                                 generate_nearfield_tile, render_options)
+from src.parameter_sampler import sample_parameters
+from src.rolloff_cache import (RolloffCache, clear_rolloff_cache,
+                               get_rolloff_cache, quantize_geometry,
+                               rolloff_cache_info)
+from src.seeding import image_rng
+from src.tiling import tile_windows
+
+class TestRolloffCache(unittest.TestCase):
+
+    canvas_size = (64, 64)
+    quantization = {"major_axis": 2.0, "minor_axis": 2.0,
+                    "angle_rotation": 5.0, "erf_rolloff": 0.01}
+
+    def setUp(self):
+        self.test_dir = "test_output_rolloff_cache"
+        os.makedirs(self.test_dir, exist_ok=True)
+        clear_rolloff_cache()
+        self.options = render_options(dict(
+            config, rolloff_cache_bytes=1 << 20,
+            rolloff_cache_quantization=self.quantization))
+        self.params = sample_parameters(config["parameter_ranges"], 3, seed=2)
+        for params in self.params:
+            params.update(major_axis=params["major_axis"] / 16,
+                          minor_axis=params["minor_axis"] / 16)
+
+    def tearDown(self):
+        clear_rolloff_cache()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_quantize_geometry(self):
+        params = {"major_axis": 20.9, "minor_axis": 19.2,
+                  "angle_rotation": 12.4, "erf_rolloff": 0.0561}
+        self.assertEqual(quantize_geometry(params, {"major_axis": 2.0}),
+                         (20.0, 19.2, 12.4, 0.0561))
+        geometry = quantize_geometry(params, self.quantization)
+        np.testing.assert_allclose(geometry, (20.0, 20.0, 10.0, 0.06))
+
+    def test_eviction_spills_to_shared_store(self):
+        store = os.path.join(self.test_dir, "store")
+        cache = RolloffCache(2 * 8 * 64 * 64, store=store)
+        masks = [np.full((64, 64), float(n)) for n in range(3)]
+        for n, mask in enumerate(masks):
+            cache.get(n, lambda mask=mask: mask)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.counts["spills"], 1)
+        self.assertIs(cache.get(2, None), masks[2])
+        self.assertFalse(masks[2].flags.writeable)
+
+        # A second worker's cache finds the spilled mask on disk
+        other = RolloffCache(2 * 8 * 64 * 64, store=store)
+        loaded = other.get(0, None)
+        self.assertIsInstance(loaded, np.memmap)
+        np.testing.assert_array_equal(loaded, masks[0])
+        self.assertEqual(other.counts, {"hits": 0, "store_hits": 1,
+                                        "misses": 0, "spills": 0})
+
+    def test_cached_render_uses_quantized_geometry(self):
+        plain = render_options(config)
+        for index, params in enumerate(self.params):
+            quantized = dict(params, **dict(zip(
+                ("major_axis", "minor_axis", "angle_rotation", "erf_rolloff"),
+                quantize_geometry(params, self.quantization))))
+            expected = generate_nearfield_image_impl(
+                quantized, self.canvas_size, **plain, rng=image_rng(0, index))
+            for _ in range(2):
+                image = generate_nearfield_image_impl(
+                    params, self.canvas_size, **self.options,
+                    rng=image_rng(0, index))
+                np.testing.assert_array_equal(image, expected)
+        info = rolloff_cache_info()
+        self.assertEqual((info["hits"], info["misses"]), (3, 3))
+        self.assertEqual(info["hit_rate"], 0.5)
+        self.assertGreater(get_rolloff_cache(1 << 20).total_bytes, 0)
+
+    def test_render_paths_agree(self):
+        rngs = [image_rng(0, index) for index in range(3)]
+        batch = generate_nearfield_batch(self.params, self.canvas_size,
+                                         **self.options, rng=rngs)
+        for index, (params, image) in enumerate(zip(self.params, batch)):
+            expected = generate_nearfield_image_impl(
+                params, self.canvas_size, **self.options,
+                rng=image_rng(0, index))
+            np.testing.assert_array_equal(image, expected)
+            fused = generate_nearfield_image_impl(
+                params, self.canvas_size, **dict(self.options, fused=True),
+                rng=image_rng(0, index))
+            difference = np.abs(fused.astype(int) - expected)
+            self.assertLessEqual(difference.max(), 1)
+            # Tiles draw their Gaussian noise differently, but quantize the
+            # geometry like the whole image
+            params = dict(params, gaussian_noise=0.0)
+            whole = generate_nearfield_image_impl(params, self.canvas_size,
+                                                  **self.options)
+            for window in tile_windows(self.canvas_size, 32):
+                tile = generate_nearfield_tile(params, self.canvas_size,
+                                               window, **self.options)
+                np.testing.assert_array_equal(tile, whole[window])
+
+if __name__ == "__main__":
+    unittest.main()
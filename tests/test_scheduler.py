@@ -0,0 +1,81 @@
+# test_scheduler.py
+
+import unittest
+import numpy as np
+from config import config
+from src.image_generator import render_options
+from src.parameter_sampler import ParameterTable, sample_parameter_table
+from src.scheduler import (adaptive_chunks, cost_order, estimate_costs,
+                           index_chunks, plan_chunks)
+
+class TestScheduler(unittest.TestCase):
+
+    canvas_size = (256, 256)
+
+    def setUp(self):
+        table = sample_parameter_table(config["parameter_ranges"], 40, seed=3)
+        self.parameter_sets = ParameterTable(table)
+        self.options = render_options()
+
+    def test_costs_follow_octaves_and_rolloff(self):
+        base = {"major_axis": 100.0, "minor_axis": 100.0,
+                "erf_rolloff": 0.1, "perlin_octaves": 1}
+        param_list = [base, dict(base, perlin_octaves=5),
+                      dict(base, erf_rolloff=0.01)]
+        costs = estimate_costs(param_list, range(3), self.canvas_size,
+                               dict(self.options, rolloff_band=4.0))
+        self.assertGreater(costs[1], costs[0])
+        self.assertGreater(costs[2], costs[0])
+        bank = estimate_costs(param_list, range(2), self.canvas_size,
+                              dict(self.options, perlin_method="bank"))
+        self.assertAlmostEqual(bank[0], bank[1])
+        # Tables and dicts give the same estimates
+        np.testing.assert_allclose(
+            estimate_costs(self.parameter_sets, [4, 9], self.canvas_size,
+                           self.options),
+            estimate_costs(self.parameter_sets[:], [4, 9], self.canvas_size,
+                           self.options))
+
+    def test_cost_order_keeps_groups_together(self):
+        costs = np.array([1.0, 5.0, 2.0, 2.0, 4.0, 0.5])
+        self.assertEqual(cost_order(range(6), costs), [1, 4, 2, 3, 0, 5])
+
+        def stack_of_two(index):
+            start = index - index % 2
+            return range(start, start + 2)
+        self.assertEqual(cost_order(range(6), costs, group=stack_of_two),
+                         [1, 0, 4, 5, 2, 3])
+
+    def test_adaptive_chunks_shrink(self):
+        costs = {index: 1.0 for index in range(100)}
+        chunks = adaptive_chunks(list(range(100)), costs, num_workers=2,
+                                 max_chunk=16)
+        sizes = [len(chunk) for chunk in chunks]
+        self.assertEqual(sorted(sum(chunks, ())), list(range(100)))
+        self.assertEqual(sizes[0], 16)
+        self.assertEqual(sizes[-1], 1)
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertTrue(all(len(chunk) == 1 for chunk in
+                            adaptive_chunks(list(range(10)), costs, 2, 1)))
+
+    def test_plan_chunks(self):
+        indices = [0, 1, 2, 5, 6, 9]
+        self.assertEqual(index_chunks(indices, 2),
+                         [(0, 1), (2,), (5, 6), (9,)])
+        self.assertEqual(plan_chunks(self.parameter_sets, indices,
+                                     self.canvas_size, self.options, 2, 2,
+                                     schedule="index"),
+                         [(0, 1), (2,), (5, 6), (9,)])
+        chunks = plan_chunks(self.parameter_sets, list(range(40)),
+                             self.canvas_size, self.options, 2, 4)
+        order = sum(chunks, ())
+        self.assertEqual(sorted(order), list(range(40)))
+        costs = estimate_costs(self.parameter_sets, order, self.canvas_size,
+                               self.options)
+        self.assertEqual(list(costs), sorted(costs, reverse=True))
+        with self.assertRaises(ValueError):
+            plan_chunks(self.parameter_sets, indices, self.canvas_size,
+                        self.options, 2, 2, schedule="fifo")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# test_service.py
+
+import asyncio
+import io
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import numpy as np
+from config import config
+from src.image_generator import generate_nearfield_image_impl
+from src.seeding import image_rng
+from src.service import NearfieldGenerator, make_server
+
+class TestNearfieldGenerator(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.generator = NearfieldGenerator(
+            num_workers=1, max_batch=4, max_delay=0.05, seed=7,
+            canvas_size=(64, 64), perlin_method="vectorized")
+        cls.generator.warm_up()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.generator.close()
+
+    def expected(self, params, index):
+        return generate_nearfield_image_impl(
+            params, (64, 64), **self.generator.options,
+            rng=image_rng(7, index))
+
+    def test_config_is_copied(self):
+        self.assertEqual(self.generator.canvas_size, (64, 64))
+        self.assertNotEqual(config["canvas_size"], (64, 64))
+        self.assertEqual(self.generator.run_seed, 7)
+
+    def test_generate_matches_direct_render(self):
+        params = self.generator.sample_parameters(1)[0]
+        image = self.generator.generate(params, index=3)
+        self.assertEqual(image.dtype, np.uint16)
+        np.testing.assert_array_equal(image, self.expected(params, 3))
+
+    def test_concurrent_requests_are_batched(self):
+        param_list = self.generator.sample_parameters(8)
+        before = self.generator.stats()
+        with ThreadPoolExecutor(max_workers=8) as threads:
+            images = list(threads.map(self.generator.generate, param_list,
+                                      range(100, 108)))
+        after = self.generator.stats()
+        self.assertEqual(after["requests"] - before["requests"], 8)
+        self.assertLess(after["batches"] - before["batches"], 8)
+        for offset, (params, image) in enumerate(zip(param_list, images)):
+            np.testing.assert_array_equal(
+                image, self.expected(params, 100 + offset))
+        self.assertIn("p99", after["latency_ms"])
+
+    def test_cancelled_request_does_not_stall_its_batch(self):
+        param_list = self.generator.sample_parameters(3)
+        futures = [self.generator.submit(params, index)
+                   for index, params in enumerate(param_list, start=150)]
+        futures[1].cancel()
+        for offset in (0, 2):
+            np.testing.assert_array_equal(
+                futures[offset].result(timeout=30),
+                self.expected(param_list[offset], 150 + offset))
+
+    def test_asyncio_api(self):
+        param_list = self.generator.sample_parameters(3)
+
+        async def request_all():
+            return await asyncio.gather(*(
+                self.generator.agenerate(params, index)
+                for index, params in enumerate(param_list, start=200)))
+
+        images = asyncio.run(request_all())
+        for offset, (params, image) in enumerate(zip(param_list, images)):
+            np.testing.assert_array_equal(
+                image, self.expected(params, 200 + offset))
+
+    def test_http_front_end(self):
+        server = make_server(self.generator, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            request = urllib.request.Request(
+                f"{url}/generate", data=json.dumps({"index": 300}).encode(),
+                method="POST")
+            with urllib.request.urlopen(request) as response:
+                image = np.load(io.BytesIO(response.read()))
+                params = json.loads(response.headers["X-Nearfield-Params"])
+                self.assertEqual(response.headers["X-Nearfield-Index"], "300")
+            np.testing.assert_array_equal(image, self.expected(params, 300))
+            with urllib.request.urlopen(f"{url}/stats") as response:
+                stats = json.load(response)
+            self.assertGreater(stats["requests"], 0)
+
+            # Rendering failures other than bad requests are server errors
+            with mock.patch.object(self.generator, "generate",
+                                   side_effect=RuntimeError("pool broken")):
+                with self.assertRaises(urllib.error.HTTPError) as raised:
+                    urllib.request.urlopen(request)
+            self.assertEqual(raised.exception.code, 500)
+            raised.exception.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+# test_shared_buffers.py
+
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from src.shared_buffers import SharedImagePool, attach_slot
+
+
+def fill_slot(name, shape, value):
+    attach_slot(name, shape)[...] = value
+    return value
+
+class TestSharedImagePool(unittest.TestCase):
+
+    def test_slots_are_bounded_and_recycled(self):
+        with SharedImagePool(2, (4, 4)) as pool:
+            first, second = pool.acquire(), pool.acquire()
+            self.assertIsNone(pool.acquire())
+            pool.release(first)
+            self.assertEqual(pool.acquire(), first)
+            self.assertNotEqual(first, second)
+
+    def test_attach_slot_shares_memory(self):
+        with SharedImagePool(1, (3, 5)) as pool:
+            slot = pool.acquire()
+            attach_slot(pool.name(slot), (3, 5))[...] = 7
+            view = pool.view(slot)
+            self.assertEqual(view.dtype, np.uint16)
+            self.assertTrue(np.all(view == 7))
+            del view
+
+    def test_workers_render_into_slots(self):
+        shape = (2, 8, 8)
+        with SharedImagePool(3, shape) as pool, \
+             ProcessPoolExecutor(max_workers=2) as executor:
+            slots = [pool.acquire() for _ in range(3)]
+            futures = [executor.submit(fill_slot, pool.name(slot), shape,
+                                       slot + 1) for slot in slots]
+            for future in futures:
+                future.result()
+            for slot in slots:
+                self.assertTrue(np.all(pool.view(slot) == slot + 1))
+
+    def test_invalid_slot_count(self):
+        with self.assertRaises(ValueError):
+            SharedImagePool(0, (4, 4))
+
+if __name__ == "__main__":
+    unittest.main()
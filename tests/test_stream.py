@@ -0,0 +1,94 @@
+# test_stream.py
+
+import os
+import shutil
+import unittest
+from unittest import mock
+import numpy as np
+from tifffile import imread
+from src.dataset import NearfieldDataset
+from src.image_generator import generate_nearfield_image_impl
+from src.output_manager import image_filename, read_completion_log
+from src.seeding import image_rng
+from src.shared_buffers import SharedImagePool, attach_slot
+from src.stream import NearfieldStream
+
+
+class RecordingPool(SharedImagePool):
+    """
+    Shared-memory pool that keeps track of its instances.
+    """
+
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        RecordingPool.instances.append(self)
+
+
+class TestNearfieldStream(unittest.TestCase):
+
+    settings = {"canvas_size": (32, 32), "num_workers": 1, "seed": 11}
+
+    def setUp(self):
+        self.test_dir = "test_output_stream"
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_batches_match_direct_render(self):
+        for compute_dtype in ("float64", "float32"):
+            with NearfieldStream(batch_size=3, num_images=7, prefetch=2,
+                                 compute_dtype=compute_dtype,
+                                 **self.settings) as stream:
+                self.assertEqual(len(stream), 3)
+                batches = list(stream)
+            self.assertEqual(stream.options["compute_dtype"], compute_dtype)
+            self.assertEqual([len(images) for images, _ in batches],
+                             [3, 3, 1])
+            images = np.concatenate([images for images, _ in batches])
+            params = np.concatenate([params for _, params in batches])
+            np.testing.assert_array_equal(params, stream.parameters)
+            for index in (0, 4, 6):
+                row = dict(zip(params.dtype.names, params[index].tolist()))
+                expected = generate_nearfield_image_impl(
+                    row, (32, 32), **stream.options,
+                    rng=image_rng(11, index))
+                np.testing.assert_array_equal(images[index], expected)
+
+    def test_close_early_releases_resources(self):
+        RecordingPool.instances = []
+        with mock.patch("src.stream.SharedImagePool", RecordingPool):
+            stream = NearfieldStream(batch_size=2, num_images=20, prefetch=3,
+                                     **self.settings)
+        [pool] = RecordingPool.instances
+        names = [pool.name(slot) for slot in range(len(pool))]
+        images, params = next(stream)
+        self.assertEqual(images.shape, (2, 32, 32))
+        self.assertEqual(len(params), 2)
+        stream.close()
+        stream.close()
+        self.assertEqual(list(stream), [])
+        self.assertEqual(pool.num_free, 0)
+        for name in names:
+            with self.assertRaises(FileNotFoundError):
+                attach_slot(name, (2, 32, 32))
+
+    def test_tee_stores_a_run_folder(self):
+        base = os.path.join(self.test_dir, "images")
+        with NearfieldStream(batch_size=2, num_images=5, prefetch=2,
+                             tee=base, **self.settings) as stream:
+            images = np.concatenate([images for images, _ in stream])
+        dataset = NearfieldDataset.from_folder(stream.folder)
+        self.assertEqual(len(dataset), 5)
+        for index in range(5):
+            np.testing.assert_array_equal(dataset[index], images[index])
+            stored = imread(os.path.join(stream.folder,
+                                         image_filename(index)))
+            np.testing.assert_array_equal(stored, images[index])
+        records = read_completion_log(os.path.join(stream.folder,
+                                                   "completed.csv"))
+        self.assertEqual(sorted(records), list(range(5)))
+
+if __name__ == "__main__":
+    unittest.main()
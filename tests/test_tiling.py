@@ -0,0 +1,70 @@
+# test_tiling.py
+
+import os
+import shutil
+import unittest
+import numpy as np
+from tifffile import imread
+from config import config
+from src.image_generator import (generate_nearfield_image_impl,
+                                 generate_nearfield_tile)
+from src.output_manager import create_image_writer
+from src.parameter_sampler import sample_parameters
+from src.tiling import tile_windows, iter_nearfield_tiles
+
+class TestTiling(unittest.TestCase):
+
+    canvas_size = (160, 160)
+
+    def setUp(self):
+        ranges = dict(config["parameter_ranges"],
+                      major_axis=(40, 60), minor_axis=(40, 60),
+                      erf_rolloff=(0.2, 0.3))
+        self.params = sample_parameters(ranges, 1)[0]
+        self.test_dir = "test_output_tiling"
+        os.makedirs(self.test_dir, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_tile_windows_cover_canvas(self):
+        covered = np.zeros(self.canvas_size, dtype=int)
+        for window in tile_windows(self.canvas_size, 64):
+            covered[window] += 1
+        np.testing.assert_array_equal(covered, 1)
+        with self.assertRaises(ValueError):
+            tile_windows(self.canvas_size, 50)
+
+    def test_tiles_match_whole_image(self):
+        params = dict(self.params, gaussian_noise=0.0)
+        for method in ("analytic", "edt"):
+            expected = generate_nearfield_image_impl(
+                params, self.canvas_size, rolloff_method=method,
+                rolloff_band=4.0)
+            for window in tile_windows(self.canvas_size, 48):
+                tile = generate_nearfield_tile(params, self.canvas_size,
+                                               window, rolloff_method=method,
+                                               rolloff_band=4.0)
+                difference = np.abs(tile.astype(int) - expected[window])
+                self.assertLessEqual(difference.max(), 1)
+
+    def test_tiled_writers(self):
+        tiles = list(iter_nearfield_tiles(self.params, self.canvas_size, 64,
+                                          run_seed=1, index=0))
+        expected = np.empty(self.canvas_size, dtype=np.uint16)
+        for window, tile in zip(tile_windows(self.canvas_size, 64), tiles):
+            expected[window] = tile
+
+        for output_format in ("tiff", "memmap"):
+            writer = create_image_writer(output_format, self.test_dir, 1,
+                                         self.canvas_size)
+            name = writer.write_tiles(0, iter(tiles), self.canvas_size, 64)
+            writer.close()
+            if output_format == "tiff":
+                stored = imread(os.path.join(self.test_dir, name))
+            else:
+                stored = np.load(os.path.join(self.test_dir, "images.npy"))[0]
+            np.testing.assert_array_equal(stored, expected)
+
+if __name__ == "__main__":
+    unittest.main()